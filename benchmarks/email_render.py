@@ -0,0 +1,65 @@
+"""
+Render cost per email of the account and password emails, for mass notifications.
+
+Compares reading and compiling the template for every email, as the email
+helpers used to, with rendering through the precompiled template registry.
+
+    python benchmarks/email_render.py --emails 5000
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+from jinja2 import Environment
+
+from blooddonor.core.config import settings
+from blooddonor.helper.email_templates import EmailTemplates
+
+TEMPLATES = ("account_verification.html", "reset_password.html")
+
+
+def context(i: int) -> dict[str, str | int]:
+    return {
+        "project_name": settings.PROJECT_NAME,
+        "username": f"Donor {i}",
+        "email": f"donor{i}@example.com",
+        "valid_hours": settings.EMAIL_RESET_TOKEN_EXPIRE_HOURS,
+        "link": f"{settings.FRONTEND_HOST}reset-password?token={i:032x}",
+    }
+
+
+def compile_per_email(emails: int) -> float:
+    start = time.perf_counter()
+    for i in range(emails):
+        name = TEMPLATES[i % len(TEMPLATES)]
+        with open(Path(settings.EMAIL_TEMPLATES_DIR) / name) as f:
+            template_str = f.read()
+        Environment().from_string(template_str).render(**context(i))
+    return time.perf_counter() - start
+
+
+def registry(emails: int, *, auto_reload: bool) -> float:
+    templates = EmailTemplates(settings.EMAIL_TEMPLATES_DIR, auto_reload=auto_reload)
+    templates.load()
+    start = time.perf_counter()
+    for i in range(emails):
+        templates.render(TEMPLATES[i % len(TEMPLATES)], **context(i))
+    return time.perf_counter() - start
+
+
+def main(args: argparse.Namespace) -> None:
+    results = {
+        "read and compile per email": compile_per_email(args.emails),
+        "registry": registry(args.emails, auto_reload=False),
+        "registry, auto reload": registry(args.emails, auto_reload=True),
+    }
+    print(f"emails: {args.emails}")
+    for name, seconds in results.items():
+        print(f"{name}: {seconds * 1e6 / args.emails:.1f} us per email")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--emails", type=int, default=5000)
+    main(parser.parse_args())
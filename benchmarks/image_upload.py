@@ -0,0 +1,100 @@
+"""
+Event loop latency while profile images are being uploaded concurrently.
+
+Start the server, then run the benchmark against it, e.g.
+
+    IMAGE_PROCESS_WORKERS=0 uvicorn main:app  # images resized on the event loop
+    IMAGE_PROCESS_WORKERS=2 uvicorn main:app  # images resized in worker processes
+
+    python benchmarks/image_upload.py --url http://localhost:8000/api/v1 \\
+        --username admin@example.com --password admin
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from io import BytesIO
+
+import httpx
+from PIL import Image
+
+
+def percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * pct / 100), len(values) - 1)]
+
+
+def phone_photo(width: int, height: int) -> bytes:
+    # noise doesn't compress, like the detail of a real photo
+    img = Image.frombytes("RGB", (width, height), os.urandom(width * height * 3))
+    output = BytesIO()
+    img.save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+
+async def upload_loop(
+    client: httpx.AsyncClient, headers: dict, photo: bytes, stop: asyncio.Event
+) -> int:
+    uploads = 0
+    while not stop.is_set():
+        files = {"file": ("photo.jpeg", photo, "image/jpeg")}
+        r = await client.post("/users/upload_profile_img", files=files, headers=headers)
+        r.raise_for_status()
+        uploads += 1
+    return uploads
+
+
+async def ping_loop(
+    client: httpx.AsyncClient, requests: int, interval: float
+) -> list[float]:
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await client.get("/utils/health-check/")
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def main(args: argparse.Namespace) -> None:
+    photo = phone_photo(args.width, args.height)
+    limits = httpx.Limits(max_connections=args.uploads + 1)
+    async with httpx.AsyncClient(
+        base_url=args.url, limits=limits, timeout=120
+    ) as client:
+        r = await client.post(
+            "/login/access-token",
+            data={"username": args.username, "password": args.password},
+        )
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+        stop = asyncio.Event()
+        upload_tasks = [
+            asyncio.create_task(upload_loop(client, headers, photo, stop))
+            for _ in range(args.uploads)
+        ]
+        latencies = await ping_loop(client, args.requests, args.interval)
+        stop.set()
+        uploads = sum(await asyncio.gather(*upload_tasks))
+
+    print(f"photo: {args.width}x{args.height} ({len(photo) / 1e6:.1f} MB)")
+    print(f"concurrent uploads: {args.uploads} ({uploads} done)")
+    print(f"health-check requests: {len(latencies)}")
+    print(f"p50: {statistics.median(latencies):.1f} ms")
+    print(f"p99: {percentile(latencies, 99):.1f} ms")
+    print(f"max: {max(latencies):.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000/api/v1")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--uploads", type=int, default=4)
+    parser.add_argument("--width", type=int, default=3000)
+    parser.add_argument("--height", type=int, default=2250)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.01)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,79 @@
+"""
+Latency of `/search/filter_donors` while a burst of logins hashes passwords.
+
+Start the server, then run the benchmark against it, e.g.
+
+    PASSWORD_HASH_WORKERS=0 uvicorn main:app  # bcrypt on the event loop
+    PASSWORD_HASH_WORKERS=4 uvicorn main:app  # bcrypt in the worker pool
+
+    python benchmarks/login_burst.py --url http://localhost:8000/api/v1 \\
+        --username admin@example.com --password admin
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * pct / 100), len(values) - 1)]
+
+
+async def login_loop(
+    client: httpx.AsyncClient, username: str, password: str, stop: asyncio.Event
+) -> int:
+    logins = 0
+    while not stop.is_set():
+        await client.post(
+            "/login/access-token", data={"username": username, "password": password}
+        )
+        logins += 1
+    return logins
+
+
+async def search_loop(
+    client: httpx.AsyncClient, requests: int, interval: float
+) -> list[float]:
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await client.get("/search/filter_donors")
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def main(args: argparse.Namespace) -> None:
+    limits = httpx.Limits(max_connections=args.logins + 1)
+    async with httpx.AsyncClient(
+        base_url=args.url, limits=limits, timeout=60
+    ) as client:
+        stop = asyncio.Event()
+        login_tasks = [
+            asyncio.create_task(login_loop(client, args.username, args.password, stop))
+            for _ in range(args.logins)
+        ]
+        latencies = await search_loop(client, args.requests, args.interval)
+        stop.set()
+        logins = sum(await asyncio.gather(*login_tasks))
+
+    print(f"concurrent logins: {args.logins} ({logins} done)")
+    print(f"filter_donors requests: {len(latencies)}")
+    print(f"p50: {statistics.median(latencies):.1f} ms")
+    print(f"p99: {percentile(latencies, 99):.1f} ms")
+    print(f"max: {max(latencies):.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000/api/v1")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--logins", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.01)
+    asyncio.run(main(parser.parse_args()))
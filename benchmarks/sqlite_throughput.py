@@ -0,0 +1,148 @@
+"""
+Throughput of concurrent donor searches and registrations on SQLite.
+
+Start the server on a fresh database, then run the benchmark against it, e.g.
+
+    SQLITE_JOURNAL_MODE=delete SQLITE_SYNCHRONOUS=full uvicorn main:app
+    SQLITE_JOURNAL_MODE=wal SQLITE_SYNCHRONOUS=normal uvicorn main:app
+
+    python benchmarks/sqlite_throughput.py --url http://localhost:8000/api/v1
+
+Run the server with SEARCH_CACHE_ENABLED=False to measure the database rather
+than the search cache.
+"""
+
+import argparse
+import asyncio
+import itertools
+import random
+import statistics
+import time
+import uuid
+from collections import Counter
+
+import httpx
+
+DISTRICTS = ["dhaka", "rajshahi", "khulna", "bagerhat", "sylhet"]
+BLOOD_GROUPS = ["a+", "a-", "b+", "b-", "ab+", "ab-", "o+", "o-"]
+DEPARTMENTS = ["101", "102", "103", "104", "105", "204"]
+ACADEMIC_YEARS = ["2019-2020", "2020-2021", "2021-2022"]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * pct / 100), len(values) - 1)]
+
+
+def registrations():
+    """
+    Valid registrations with unique student ids, mobiles and emails.
+    """
+    for year, department, serial in itertools.product(
+        ACADEMIC_YEARS, DEPARTMENTS, range(1, 151)
+    ):
+        yield {
+            "full_name": "Benchmark Donor",
+            "email": f"bench-{uuid.uuid4().hex[:12]}@example.com",
+            "mobile": f"019{random.randrange(10**8):08d}",
+            "department": department,
+            "student_id": f"{year[-2:]}{department}{serial:03d}",
+            "gender": "male",
+            "district": random.choice(DISTRICTS),
+            "blood_group": random.choice(BLOOD_GROUPS),
+            "academic_year": year,
+            "password": "benchmark",
+        }
+
+
+async def search_loop(
+    client: httpx.AsyncClient,
+    latencies: list[float],
+    statuses: Counter,
+    stop: asyncio.Event,
+) -> None:
+    while not stop.is_set():
+        params = {
+            "district": random.choice(DISTRICTS),
+            "blood_group": random.choice(BLOOD_GROUPS),
+        }
+        start = time.perf_counter()
+        r = await client.get("/search/filter_donors", params=params)
+        latencies.append((time.perf_counter() - start) * 1000)
+        statuses[r.status_code] += 1
+
+
+async def register_loop(
+    client: httpx.AsyncClient,
+    users,
+    latencies: list[float],
+    statuses: Counter,
+    stop: asyncio.Event,
+) -> None:
+    while not stop.is_set():
+        user = next(users, None)
+        if user is None:
+            return
+        start = time.perf_counter()
+        r = await client.post("/users/create_user", json=user)
+        latencies.append((time.perf_counter() - start) * 1000)
+        statuses[r.status_code] += 1
+
+
+def report(name: str, latencies: list[float], statuses: Counter, duration: float):
+    ok = sum(count for status, count in statuses.items() if status < 400)
+    print(f"{name}: {ok / duration:.1f}/s ({dict(sorted(statuses.items()))})")
+    if latencies:
+        print(f"  p50: {statistics.median(latencies):.1f} ms")
+        print(f"  p99: {percentile(latencies, 99):.1f} ms")
+        print(f"  max: {max(latencies):.1f} ms")
+
+
+async def main(args: argparse.Namespace) -> None:
+    users = registrations()
+    limits = httpx.Limits(max_connections=args.searches + args.registrations)
+    async with httpx.AsyncClient(
+        base_url=args.url, limits=limits, timeout=60
+    ) as client:
+        stop = asyncio.Event()
+        search_latencies: list[float] = []
+        register_latencies: list[float] = []
+        search_statuses: Counter = Counter()
+        register_statuses: Counter = Counter()
+        tasks = [
+            *(
+                asyncio.create_task(
+                    search_loop(client, search_latencies, search_statuses, stop)
+                )
+                for _ in range(args.searches)
+            ),
+            *(
+                asyncio.create_task(
+                    register_loop(
+                        client, users, register_latencies, register_statuses, stop
+                    )
+                )
+                for _ in range(args.registrations)
+            ),
+        ]
+        start = time.perf_counter()
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await asyncio.gather(*tasks)
+        duration = time.perf_counter() - start
+
+    print(
+        f"concurrent searches: {args.searches}, "
+        f"registrations: {args.registrations}, duration: {duration:.1f} s"
+    )
+    report("filter_donors", search_latencies, search_statuses, duration)
+    report("create_user", register_latencies, register_statuses, duration)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000/api/v1")
+    parser.add_argument("--searches", type=int, default=16)
+    parser.add_argument("--registrations", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,67 @@
+"""Donor name search
+
+Revision ID: 3373e300148f
+Revises: d2a099c6f0de
+Create Date: 2026-10-18 10:41:03.518224
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3373e300148f'
+down_revision: Union[str, None] = 'd2a099c6f0de'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    dialect_name = op.get_bind().dialect.name
+    if dialect_name == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS donor_name_fts "
+            "USING fts5(full_name, donor_id UNINDEXED, tokenize='trigram')"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS donormodel_name_fts_insert "
+            "AFTER INSERT ON donormodel BEGIN "
+            "INSERT INTO donor_name_fts (full_name, donor_id) VALUES (new.full_name, new.id); "
+            "END"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS donormodel_name_fts_delete "
+            "AFTER DELETE ON donormodel BEGIN "
+            "DELETE FROM donor_name_fts WHERE donor_id = old.id; "
+            "END"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS donormodel_name_fts_update "
+            "AFTER UPDATE OF full_name ON donormodel BEGIN "
+            "UPDATE donor_name_fts SET full_name = new.full_name WHERE donor_id = old.id; "
+            "END"
+        )
+        # backfill the existing donors
+        op.execute(
+            "INSERT INTO donor_name_fts (full_name, donor_id) "
+            "SELECT full_name, id FROM donormodel"
+        )
+    elif dialect_name == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_donormodel_full_name_trgm "
+            "ON donormodel USING gin (full_name gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    dialect_name = op.get_bind().dialect.name
+    if dialect_name == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS donormodel_name_fts_update")
+        op.execute("DROP TRIGGER IF EXISTS donormodel_name_fts_delete")
+        op.execute("DROP TRIGGER IF EXISTS donormodel_name_fts_insert")
+        op.execute("DROP TABLE IF EXISTS donor_name_fts")
+    elif dialect_name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_donormodel_full_name_trgm")
@@ -0,0 +1,74 @@
+"""Donor change log
+
+Revision ID: c5e1a7f9d302
+Revises: 4a6e1f8c2d90
+Create Date: 2026-10-18 21:14:37.604518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e1a7f9d302'
+down_revision: Union[str, None] = '4a6e1f8c2d90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXED_COLUMNS = "is_available, gender, district, blood_group, academic_year, department"
+
+TRIM = "DELETE FROM donorchangemodel WHERE seq <= (SELECT max(seq) FROM donorchangemodel) - 10000;"
+
+
+def upgrade() -> None:
+    op.create_table('donorchangemodel',
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('donor_id', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('seq'),
+    sqlite_autoincrement=True
+    )
+    dialect_name = op.get_bind().dialect.name
+    if dialect_name == 'sqlite':
+        for name, event, donor in (
+            ('insert', 'INSERT', 'new'),
+            ('delete', 'DELETE', 'old'),
+            ('update', f'UPDATE OF {INDEXED_COLUMNS}', 'new'),
+        ):
+            op.execute(
+                f"CREATE TRIGGER IF NOT EXISTS donormodel_change_{name} "
+                f"AFTER {event} ON donormodel BEGIN "
+                f"INSERT INTO donorchangemodel (donor_id) VALUES ({donor}.id); "
+                f"{TRIM} "
+                "END"
+            )
+    elif dialect_name == 'postgresql':
+        op.execute(
+            "CREATE OR REPLACE FUNCTION donormodel_log_change() RETURNS trigger AS $$ "
+            "BEGIN "
+            "PERFORM pg_advisory_xact_lock(hashtext('donorchangemodel')); "
+            "INSERT INTO donorchangemodel (donor_id) "
+            "VALUES (CASE TG_OP WHEN 'DELETE' THEN OLD.id ELSE NEW.id END); "
+            f"{TRIM} "
+            "RETURN NULL; "
+            "END "
+            "$$ LANGUAGE plpgsql"
+        )
+        op.execute(
+            "CREATE OR REPLACE TRIGGER donormodel_log_change "
+            f"AFTER INSERT OR DELETE OR UPDATE OF {INDEXED_COLUMNS} ON donormodel "
+            "FOR EACH ROW EXECUTE FUNCTION donormodel_log_change()"
+        )
+
+
+def downgrade() -> None:
+    dialect_name = op.get_bind().dialect.name
+    if dialect_name == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS donormodel_change_update")
+        op.execute("DROP TRIGGER IF EXISTS donormodel_change_delete")
+        op.execute("DROP TRIGGER IF EXISTS donormodel_change_insert")
+    elif dialect_name == 'postgresql':
+        op.execute("DROP TRIGGER IF EXISTS donormodel_log_change ON donormodel")
+        op.execute("DROP FUNCTION IF EXISTS donormodel_log_change()")
+    op.drop_table('donorchangemodel')
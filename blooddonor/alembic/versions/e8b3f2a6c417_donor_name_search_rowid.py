@@ -0,0 +1,97 @@
+"""Donor name search keyed by rowid
+
+Revision ID: e8b3f2a6c417
+Revises: c5e1a7f9d302
+Create Date: 2026-10-18 23:02:19.481207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b3f2a6c417'
+down_revision: Union[str, None] = 'c5e1a7f9d302'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRIGGERS = (
+    "donormodel_name_fts_insert",
+    "donormodel_name_fts_delete",
+    "donormodel_name_fts_update",
+)
+
+
+def _drop_fts() -> None:
+    for trigger in reversed(TRIGGERS):
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.execute("DROP TABLE IF EXISTS donor_name_fts")
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    _drop_fts()
+    # external content table sharing the donor rowids, the triggers address
+    # the entries of a donor by rowid instead of scanning for its id
+    op.execute(
+        "CREATE VIRTUAL TABLE donor_name_fts USING fts5("
+        "full_name, content='donormodel', content_rowid='rowid', tokenize='trigram')"
+    )
+    op.execute(
+        "CREATE TRIGGER donormodel_name_fts_insert "
+        "AFTER INSERT ON donormodel BEGIN "
+        "INSERT INTO donor_name_fts (rowid, full_name) VALUES (new.rowid, new.full_name); "
+        "END"
+    )
+    op.execute(
+        "CREATE TRIGGER donormodel_name_fts_delete "
+        "AFTER DELETE ON donormodel BEGIN "
+        "INSERT INTO donor_name_fts (donor_name_fts, rowid, full_name) "
+        "VALUES ('delete', old.rowid, old.full_name); "
+        "END"
+    )
+    op.execute(
+        "CREATE TRIGGER donormodel_name_fts_update "
+        "AFTER UPDATE OF full_name ON donormodel BEGIN "
+        "INSERT INTO donor_name_fts (donor_name_fts, rowid, full_name) "
+        "VALUES ('delete', old.rowid, old.full_name); "
+        "INSERT INTO donor_name_fts (rowid, full_name) VALUES (new.rowid, new.full_name); "
+        "END"
+    )
+    # index the existing donors
+    op.execute("INSERT INTO donor_name_fts (donor_name_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    _drop_fts()
+    op.execute(
+        "CREATE VIRTUAL TABLE donor_name_fts "
+        "USING fts5(full_name, donor_id UNINDEXED, tokenize='trigram')"
+    )
+    op.execute(
+        "CREATE TRIGGER donormodel_name_fts_insert "
+        "AFTER INSERT ON donormodel BEGIN "
+        "INSERT INTO donor_name_fts (full_name, donor_id) VALUES (new.full_name, new.id); "
+        "END"
+    )
+    op.execute(
+        "CREATE TRIGGER donormodel_name_fts_delete "
+        "AFTER DELETE ON donormodel BEGIN "
+        "DELETE FROM donor_name_fts WHERE donor_id = old.id; "
+        "END"
+    )
+    op.execute(
+        "CREATE TRIGGER donormodel_name_fts_update "
+        "AFTER UPDATE OF full_name ON donormodel BEGIN "
+        "UPDATE donor_name_fts SET full_name = new.full_name WHERE donor_id = old.id; "
+        "END"
+    )
+    op.execute(
+        "INSERT INTO donor_name_fts (full_name, donor_id) "
+        "SELECT full_name, id FROM donormodel"
+    )
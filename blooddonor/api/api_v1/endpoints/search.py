@@ -1,58 +1,127 @@
 from typing import Any
 
-from fastapi import APIRouter, Depends
-from sqlalchemy import and_
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession as Session
-from sqlalchemy.future import select
 
 from blooddonor.api import deps
-from blooddonor.models.usermodel import DonorModel
+from blooddonor.core.config import settings
+from blooddonor.crud.crud_utility import user
+from blooddonor.helper.cache import search_cache
+from blooddonor.helper.compatibility import COMPATIBLE_DONORS
+from blooddonor.helper.export import export_media_type, stream_rows
+from blooddonor.helper.pagination import InvalidCursorError
 from blooddonor.schemas.user import (
+    USER_LIST_COLUMNS,
+    BloodGroupEnum,
     DonorFilterSchema,
-    UserApi,
+    DonorPage,
+    UserListApi,
 )
 
 router = APIRouter()
 
+users_adapter = TypeAdapter(list[UserListApi])
 
-@router.get("/filter_donors", response_model=list[UserApi])
-async def filter_donors(
-    filters: DonorFilterSchema = Depends(), db: Session = Depends(deps.get_db)
-) -> Any:
-    # Start with a base select query
-    query = select(DonorModel)
-
-    # Dynamically apply filters using where conditions
-    conditions = []
-
-    if filters.full_name:
-        conditions.append(DonorModel.full_name.ilike(f"%{filters.full_name}%"))
-
-    if filters.student_id:
-        conditions.append(DonorModel.student_id.in_([filters.student_id]))
-
-    if filters.gender:
-        conditions.append(DonorModel.gender.in_([filters.gender.value]))
-
-    if filters.district:
-        conditions.append(DonorModel.district.in_([filters.district.value]))
 
-    if filters.blood_group:
-        conditions.append(DonorModel.blood_group.in_([filters.blood_group.value]))
+def _dump_users(users: Any) -> bytes:
+    return users_adapter.dump_json(
+        users_adapter.validate_python(users, from_attributes=True)
+    )
 
-    if filters.academic_year:
-        conditions.append(DonorModel.academic_year.in_([filters.academic_year.value]))
 
-    if filters.department:
-        conditions.append(DonorModel.department.in_([filters.department.value]))
-
-    # Add the conditions to the query if any exist
-    if conditions:
-        query = query.where(and_(*conditions))
-
-    # Execute the query asynchronously
-    result = await db.execute(query)
-
-    # Fetch all the matching rows
-    users = result.scalars().all()
-    return users
+@router.get("/filter_donors", response_model=list[UserListApi])
+async def filter_donors(
+    filters: DonorFilterSchema = Depends(),
+    accept: str | None = Header(default=None),
+    db: Session = Depends(deps.get_db),
+) -> Any:
+    """
+    Filter donors.
+    With `Accept: application/x-ndjson` or `text/csv` the donors are streamed in
+    that format instead, without the fuzzy name fallback.
+    """
+    media_type = export_media_type(accept)
+    if media_type:
+        query = user.search_query(
+            filters, db.bind.dialect.name, columns=USER_LIST_COLUMNS
+        )
+        return StreamingResponse(
+            stream_rows(db.bind, query, UserListApi, media_type), media_type=media_type
+        )
+
+    async def build() -> bytes:
+        return _dump_users(await user.search(db, filters, columns=USER_LIST_COLUMNS))
+
+    key = search_cache.key("filter_donors", filters)
+    body = await search_cache.get_or_build(key, build)
+    return Response(content=body, media_type="application/json")
+
+
+@router.get("/filter_donors_paginated", response_model=DonorPage)
+async def filter_donors_paginated(
+    filters: DonorFilterSchema = Depends(),
+    cursor: str | None = None,
+    page_size: int = Query(
+        default=settings.SEARCH_PAGE_SIZE, ge=1, le=settings.SEARCH_MAX_PAGE_SIZE
+    ),
+    db: Session = Depends(deps.get_db),
+) -> Any:
+    """
+    Filter donors page by page, newest first.
+    Pass the returned `next_cursor` as `cursor` to fetch the following page.
+    """
+
+    async def build() -> bytes:
+        try:
+            users, next_cursor = await user.search_page(
+                db, filters, cursor=cursor, limit=page_size, columns=USER_LIST_COLUMNS
+            )
+        except InvalidCursorError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        page = DonorPage(
+            items=users_adapter.validate_python(users, from_attributes=True),
+            next_cursor=next_cursor,
+        )
+        return page.model_dump_json().encode()
+
+    key = search_cache.key(
+        "filter_donors_paginated", filters, cursor=cursor, page_size=page_size
+    )
+    body = await search_cache.get_or_build(key, build)
+    return Response(content=body, media_type="application/json")
+
+
+@router.get("/compatible_donors", response_model=list[UserListApi])
+async def compatible_donors(
+    recipient: BloodGroupEnum,
+    filters: DonorFilterSchema = Depends(),
+    limit: int = Query(
+        default=settings.SEARCH_PAGE_SIZE, ge=1, le=settings.SEARCH_MAX_PAGE_SIZE
+    ),
+    db: Session = Depends(deps.get_db),
+) -> Any:
+    """
+    Available donors who can give blood to the `recipient` blood group.
+    Exact blood group matches come first and o- donors last.
+    The other filters narrow the donors down as in `filter_donors`.
+    """
+
+    async def build() -> bytes:
+        return _dump_users(
+            await user.search_compatible(
+                db, recipient, filters, limit=limit, columns=USER_LIST_COLUMNS
+            )
+        )
+
+    # any write to a donor of a compatible group may change the result
+    key = search_cache.key(
+        "compatible_donors",
+        filters,
+        dependencies=[("blood_group", group) for group in COMPATIBLE_DONORS[recipient]],
+        recipient=recipient,
+        limit=limit,
+    )
+    body = await search_cache.get_or_build(key, build)
+    return Response(content=body, media_type="application/json")
@@ -1,428 +1,588 @@
-import datetime
-import os
-from typing import Any
-
-from fastapi import (
-    APIRouter,
-    BackgroundTasks,
-    Body,
-    Depends,
-    HTTPException,
-    UploadFile,
-    status,
-)
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import FileResponse
-from pydantic.networks import EmailStr
-from sqlalchemy.ext.asyncio import AsyncSession as Session
-
-from blooddonor.api import deps
-from blooddonor.core.config import settings
-from blooddonor.core.security import verify_password
-from blooddonor.crud.crud_utility import profile, user
-from blooddonor.helper.email import (
-    generate_password_reset_token,
-    send_new_account_email,
-    verify_password_reset_token,
-)
-from blooddonor.helper.image import save_image
-from blooddonor.models.usermodel import DonorModel
-from blooddonor.schemas.msg import Msg
-from blooddonor.schemas.token import AccountVerifyToken
-from blooddonor.schemas.user import (
-    AcademicYearEnum,
-    BloodGroupEnum,
-    DepartmentsEnum,
-    DistrictEnum,
-    GenderEnum,
-    ProfileResponse,
-    UpdateBySuperUser,
-    UpdateProfile,
-    UserApi,
-    UserCreateBase,
-    UserUpdateBase,
-)
-
-router = APIRouter()
-
-
-@router.get("/read_users", response_model=list[UserApi])
-async def read_users(
-    db: Session = Depends(deps.get_db),
-    skip: int = 0,
-    limit: int = 100,
-) -> Any:
-    """
-    Retrieve users.
-    """
-    users = await user.get_multi(db, skip=skip, limit=limit, order_by="created_on desc")
-    return users
-
-
-@router.post(
-    "/create_user_by_superuser",
-    response_model=UserApi,
-    dependencies=[Depends(deps.get_current_active_superuser)],
-)
-async def create_user_by_superuser(
-    *,
-    db: Session = Depends(deps.get_db),
-    user_in: UserCreateBase,
-) -> Any:
-    """
-    Create new user (Need Super User privilege).
-    """
-    users = (
-        await user.get_by_mobile(db, mobile=user_in.mobile)
-        or await user.get_by_email(db, email=user_in.email)
-        or await user.get_by_student_id(db, student_id=user_in.student_id)
-    )
-    if users:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="The user with this mobile, email or student_id already exists in the system.",
-        )
-    users = await user.create(db, obj_in=user_in)
-    return users
-
-
-@router.delete("/delete_user/{email}", response_model=Msg)
-async def delete_user(
-    *,
-    email: EmailStr,
-    db: Session = Depends(deps.get_db),
-    current_user: DonorModel = Depends(deps.get_current_active_superuser),
-):
-    """Delete a user/donor by email (Need Super User privilege)"""
-    donor = await user.get_by_email(db, email=email)
-    if donor == current_user:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Super users are not allowed to delete themselves",
-        )
-    if donor:
-        await user.remove(db, id=donor.id)
-        return Msg(msg="The user has been removed!")
-    raise HTTPException(
-        status_code=status.HTTP_404_NOT_FOUND,
-        detail="There is no user with this email!",
-    )
-
-
-@router.patch("/update/me", response_model=UserApi)
-async def update_user_me(
-    *,
-    db: Session = Depends(deps.get_db),
-    user_in: UserUpdateBase,
-    current_user: DonorModel = Depends(deps.get_current_active_user),
-) -> Any:
-    """
-    Update thyself.
-    """
-    if user_in.password and await verify_password(
-        user_in.password, current_user.hashed_password
-    ):
-        users = await user.update(db, db_obj=current_user, obj_in=user_in)
-        return users
-    raise HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED, detail="Password doesn't match!"
-    )
-
-
-@router.get("/me", response_model=UserApi)
-async def read_user_me(
-    current_user: DonorModel = Depends(deps.get_current_user),
-) -> Any:
-    """
-    Get current user.
-    """
-    return current_user
-
-
-@router.get("/read_profile/{user_id}", response_model=ProfileResponse)
-async def read_profile(
-    user_id: str,
-    db: Session = Depends(deps.get_db),
-) -> Any:
-    """
-    Read current user/donor profile.
-    """
-    donor_profile = await profile.get(db, donor_id=user_id)
-    if not donor_profile:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="No profile found with this user id.",
-        )
-    return donor_profile
-
-
-@router.patch("/update_profile/me", response_model=ProfileResponse)
-async def update_profile(
-    user_in: UpdateProfile,
-    db: Session = Depends(deps.get_db),
-    current_user: DonorModel = Depends(deps.get_current_active_user),
-) -> Any:
-    """
-    Read current user/donor profile.
-    """
-    donor_profile = await profile.get(db, donor_id=current_user.id)
-    if not donor_profile:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="No profile found with this user id.",
-        )
-    await profile.update(db, db_obj=donor_profile, obj_in=user_in)
-    return donor_profile
-
-
-@router.post(
-    "/create_user",
-    response_model=Msg,
-)
-async def create_user(
-    *,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(deps.get_db),
-    full_name: str = Body(...),
-    email: EmailStr = Body(...),
-    mobile: str = Body(...),
-    department: DepartmentsEnum = Body(...),
-    student_id: str = Body(...),
-    gender: GenderEnum = Body(...),
-    district: DistrictEnum = Body(...),
-    blood_group: BloodGroupEnum = Body(...),
-    academic_year: AcademicYearEnum = Body(...),
-    password: str = Body(...),
-) -> Any:
-    """
-    Create new user without the need to be logged in.
-    department_code (str): A string representing the department code. The available department codes are:
-
-    - Faculty of Arts and Humanities:
-        * "101" - Bangla
-        * "102" - English
-        * "103" - History
-        * "104" - Islamic History and Culture
-        * "105" - Philosophy
-        * "106" - Fine Arts
-        * "107" - Arabic
-        * "108" - Pali
-        * "110" - Islamic Studies
-        * "111" - Dramatics
-        * "112" - Persian Language and Literature
-        * "113" - Education and Research
-        * "114" - Modern Languages
-        * "115" - Sanskrit
-        * "116" - Music
-        * "117" - Bangladesh Studies
-
-    - Faculty of Science:
-        * "201" - Physics
-        * "202" - Chemistry
-        * "203" - Mathematics
-        * "204" - Statistics
-        * "208" - Forestry and Environmental Sciences
-        * "209" - Applied Chemistry and Chemical Engineering
-
-    - Faculty of Business Administration:
-        * "301" - Accounting
-        * "302" - Management
-        * "303" - Finance
-        * "304" - Marketing
-        * "305" - Human Resource Management
-        * "306" - Banking and Insurance
-
-    - Faculty of Social Sciences:
-        * "401" - Economics
-        * "402" - Political Science
-        * "403" - Sociology
-        * "404" - Public Administration
-        * "405" - Anthropology
-        * "406" - International Relations
-        * "407" - Communication and Journalism
-        * "408" - Development Studies
-        * "409" - Criminology and Police Science
-
-    - Faculty of Law:
-        * "501" - Law
-
-    - Faculty of Biological Sciences:
-        * "601" - Zoology
-        * "602" - Botany
-        * "603" - Geography and Environmental Studies
-        * "604" - Biochemistry and Molecular Biology
-        * "605" - Microbiology
-        * "606" - Soil Science
-        * "607" - Genetic Engineering and Biotechnology
-        * "608" - Psychology
-        * "609" - Pharmacy
-
-    - Faculty of Engineering:
-        * "701" - Computer Science and Engineering
-        * "702" - Electrical and Electronic Engineering
-
-    - Faculty of Education:
-        * "801" - Physical Education and Sports Science
-
-    - Faculty of Marine Sciences and Fisheries:
-        * "901" - Marine Sciences
-        * "902" - Oceanography
-        * "903" - Fisheries
-    """
-    if not settings.USERS_OPEN_REGISTRATION:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Open user registration is forbidden on this server",
-        )
-    user_in = UserCreateBase(
-        full_name=full_name,
-        email=email,
-        mobile=mobile,
-        department=department,
-        student_id=student_id,
-        gender=gender,
-        district=district,
-        blood_group=blood_group,
-        academic_year=academic_year,
-        password=password,
-    )
-    users = (
-        await user.get_by_mobile(db, mobile=mobile)
-        or await user.get_by_email(db, email=email)
-        or await user.get_by_student_id(db, student_id=student_id)
-    )
-    if users:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="The user with this mobile, email or student_id already exists in the system",
-        )
-
-    if settings.EMAILS_ENABLED and user_in.email:
-        user_in.is_active = False
-        # email will be sent in the background
-        password_reset_token = await generate_password_reset_token(email=email)
-        background_tasks.add_task(
-            send_new_account_email,
-            username=user_in.full_name,
-            email=user_in.email,
-            token=password_reset_token,
-        )
-    users = await user.create(db, obj_in=user_in)
-    return Msg(msg="Account has been created")
-
-
-@router.post("/verify-account")
-async def verify_account(
-    body: AccountVerifyToken, db: Session = Depends(deps.get_db)
-) -> Any:
-    email = await verify_password_reset_token(token=body.token)
-    if not email:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid token"
-        )
-    donor = await user.get_by_email(db, email=email)
-    if not donor:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="The user does not exist in the system.",
-        )
-    donor.is_active = True
-    db.add(donor)
-    await db.commit()
-    return Msg(msg="Account verification successful.")
-
-
-@router.get("/read_user/{user_email}", response_model=UserApi)
-async def read_user_by_email(
-    user_email: EmailStr,
-    db: Session = Depends(deps.get_db),
-) -> Any:
-    """
-    Get a specific user by email.
-    """
-    users = await user.get_by_email(db, email=user_email)
-    if users:
-        return users
-    else:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="User not found!"
-        )
-
-
-@router.patch(
-    "/update/{user_email}",
-    response_model=UserApi,
-    dependencies=[Depends(deps.get_current_active_superuser)],
-)
-async def update_user_by_email(
-    *,
-    db: Session = Depends(deps.get_db),
-    user_email: EmailStr,
-    user_in: UpdateBySuperUser,
-) -> Any:
-    """
-    Update a user (Super User Privilege needed).
-    """
-    user_ = await user.get_by_email(db, email=user_email)
-    if not user_in:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="The user does not exist in the system",
-        )
-    users = await user.update(db, db_obj=user_, obj_in=user_in)
-    return users
-
-
-@router.post("/upload_profile_img")
-async def upload_profile_img(
-    file: UploadFile,
-    db: Session = Depends(deps.get_db),
-    current_user: DonorModel = Depends(deps.get_current_active_user),
-):
-    try:
-        await save_image(file, current_user.id)
-        profile_data = await profile.get(db, donor_id=current_user.id)
-        profile_data.profile_img = f"{current_user.id}.png"
-        await profile.update(
-            db, db_obj=profile_data, obj_in=jsonable_encoder(profile_data)
-        )
-    except HTTPException:
-        raise HTTPException(
-            status_code=status.WS_1011_INTERNAL_ERROR,
-            detail="There is an error in the server. Pls try again.",
-        )
-    return Msg(msg="Profile image upload successful.")
-
-
-@router.patch("/change_availability", response_model=Msg)
-async def change_availability(
-    db: Session = Depends(deps.get_db),
-    current_user: DonorModel = Depends(deps.get_current_active_user),
-) -> Msg:
-    if current_user.is_available:
-        current_user.is_available = False
-    else:
-        current_user.is_available = True
-    # update the donated_on field
-    current_user.donated_on = datetime.datetime.now(datetime.UTC)
-    user_in = jsonable_encoder(current_user)
-    await user.update(db, db_obj=current_user, obj_in=UserUpdateBase(**user_in))
-    return Msg(
-        msg=f"Availability status has been changed. Now {'available' if current_user.is_available else 'unavailable'}"
-    )
-
-
-@router.get("/get_profile_img/{user_id}", response_class=FileResponse)
-async def get_profile_img(user_id: str) -> str:
-    static_dir = "./blooddonor/static/images"
-    img_path = f"{static_dir}/{user_id}.png"
-    if os.path.isfile(img_path):
-        return img_path
-    else:
-        return f"{static_dir}/profile_img.png"
-
-
-@router.get("/counts")
-async def get_total_users(db: Session = Depends(deps.get_db)) -> dict:
-    donors_count: dict = await user.get_user_count(db)
-    return donors_count
+import datetime
+from typing import Any
+
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Response,
+    UploadFile,
+    status,
+)
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic.networks import EmailStr
+from sqlalchemy.ext.asyncio import AsyncSession as Session
+
+from blooddonor.api import deps
+from blooddonor.core.config import settings
+from blooddonor.core.security import verify_password
+from blooddonor.crud.crud_utility import DuplicateUserError, profile, user
+from blooddonor.helper.bulk_import import (
+    UnsupportedImportError,
+    import_donors,
+    import_format,
+    read_rows,
+)
+from blooddonor.helper.donor_stats import donor_stats
+from blooddonor.helper.eligibility import DONATION_INTERVAL, eligibility_scheduler
+from blooddonor.helper.email import (
+    generate_password_reset_token,
+    send_new_account_email,
+    verify_password_reset_token,
+)
+from blooddonor.helper.export import export_media_type, stream_rows
+from blooddonor.helper.http_cache import (
+    IMMUTABLE,
+    REVALIDATE,
+    ProfileValidator,
+    content_etag,
+    etag_matches,
+    not_modified,
+    profile_validators,
+)
+from blooddonor.helper.image import (
+    DEFAULT_PROFILE_IMG,
+    STATIC_DIR,
+    ImageTooLargeError,
+    InvalidImageError,
+    find_profile_image,
+    image_storage,
+    profile_image_variants,
+    save_image,
+    stored_image_response,
+)
+from blooddonor.models.usermodel import DonorModel, ProfileModel
+from blooddonor.schemas.bulk_import import ImportReport
+from blooddonor.schemas.msg import Msg
+from blooddonor.schemas.token import AccountVerifyToken
+from blooddonor.schemas.user import (
+    USER_LIST_COLUMNS,
+    AcademicYearEnum,
+    BloodGroupEnum,
+    DepartmentsEnum,
+    DistrictEnum,
+    GenderEnum,
+    ProfileResponse,
+    UpdateBySuperUser,
+    UpdateProfile,
+    UserApi,
+    UserCreateBase,
+    UserListApi,
+    UserUpdateBase,
+)
+
+router = APIRouter()
+
+
+@router.get("/read_users", response_model=list[UserListApi])
+async def read_users(
+    db: Session = Depends(deps.get_db),
+    skip: int = 0,
+    limit: int = 100,
+    accept: str | None = Header(default=None),
+) -> Any:
+    """
+    Retrieve users.
+    Streamed as NDJSON or CSV when asked for with the `Accept` header.
+    """
+    media_type = export_media_type(accept)
+    if media_type:
+        query = user.get_multi_query(
+            skip=skip,
+            limit=limit,
+            order_by="created_on desc",
+            columns=USER_LIST_COLUMNS,
+        )
+        return StreamingResponse(
+            stream_rows(db.bind, query, UserListApi, media_type),
+            media_type=media_type,
+        )
+    users = await user.get_multi(
+        db,
+        skip=skip,
+        limit=limit,
+        order_by="created_on desc",
+        columns=USER_LIST_COLUMNS,
+    )
+    return users
+
+
+@router.post(
+    "/create_user_by_superuser",
+    response_model=UserApi,
+    dependencies=[Depends(deps.get_current_active_superuser)],
+)
+async def create_user_by_superuser(
+    *,
+    db: Session = Depends(deps.get_db),
+    user_in: UserCreateBase,
+) -> Any:
+    """
+    Create new user (Need Super User privilege).
+    """
+    try:
+        users = await user.create(db, obj_in=user_in)
+    except DuplicateUserError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return users
+
+
+@router.post(
+    "/import_donors",
+    response_model=ImportReport,
+    dependencies=[Depends(deps.get_current_active_superuser)],
+)
+async def import_donors_by_superuser(
+    *,
+    db: Session = Depends(deps.get_db),
+    file: UploadFile,
+) -> Any:
+    """
+    Create donors in bulk from a .csv, .xlsx or .ndjson file (Need Super User privilege).
+    Columns are the fields of create_user_by_superuser. Rows that fail validation
+    or already exist are skipped and reported back, the others are imported.
+    """
+    try:
+        rows = read_rows(file.file, import_format(file.filename))
+        return await import_donors(db, rows)
+    except UnsupportedImportError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.delete("/delete_user/{email}", response_model=Msg)
+async def delete_user(
+    *,
+    email: EmailStr,
+    db: Session = Depends(deps.get_db),
+    current_user: DonorModel = Depends(deps.get_current_active_superuser),
+):
+    """Delete a user/donor by email (Need Super User privilege)"""
+    donor = await user.get_by_email(db, email=email)
+    if donor == current_user:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Super users are not allowed to delete themselves",
+        )
+    if donor:
+        await user.remove(db, id=donor.id)
+        return Msg(msg="The user has been removed!")
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="There is no user with this email!",
+    )
+
+
+@router.patch("/update/me", response_model=UserApi)
+async def update_user_me(
+    *,
+    db: Session = Depends(deps.get_db),
+    user_in: UserUpdateBase,
+    current_user: DonorModel = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Update thyself.
+    """
+    if user_in.password and await verify_password(
+        user_in.password, current_user.hashed_password
+    ):
+        users = await user.update(db, db_obj=current_user, obj_in=user_in)
+        return users
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED, detail="Password doesn't match!"
+    )
+
+
+@router.get("/me", response_model=UserApi)
+async def read_user_me(
+    current_user: DonorModel = Depends(deps.get_current_user),
+) -> Any:
+    """
+    Get current user.
+    """
+    return current_user
+
+
+@router.get("/read_profile/{user_id}", response_model=ProfileResponse)
+async def read_profile(
+    user_id: str,
+    if_none_match: str | None = Header(default=None),
+    db: Session = Depends(deps.get_db),
+) -> Any:
+    """
+    Read current user/donor profile.
+    Answers `304 Not Modified` when `If-None-Match` holds the profile's ETag.
+    """
+    validator = profile_validators.get(user_id)
+    if validator and etag_matches(if_none_match, validator.etag):
+        return not_modified(validator.etag, REVALIDATE)
+
+    version = profile_validators.version(user_id)
+    donor_profile = await profile.get(db, donor_id=user_id)
+    if not donor_profile:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No profile found with this user id.",
+        )
+    validator = _profile_validator(user_id, version, donor_profile)
+    if etag_matches(if_none_match, validator.etag):
+        return not_modified(validator.etag, REVALIDATE)
+    return Response(
+        content=ProfileResponse.model_validate(donor_profile).model_dump_json(),
+        media_type="application/json",
+        headers={"ETag": validator.etag, "Cache-Control": REVALIDATE},
+    )
+
+
+def _profile_validator(
+    user_id: str, version: int, donor_profile: ProfileModel
+) -> ProfileValidator:
+    body = ProfileResponse.model_validate(donor_profile).model_dump_json().encode()
+    validator = ProfileValidator(content_etag(body), donor_profile.profile_img)
+    profile_validators.set(user_id, version, validator)
+    return validator
+
+
+@router.patch("/update_profile/me", response_model=ProfileResponse)
+async def update_profile(
+    user_in: UpdateProfile,
+    db: Session = Depends(deps.get_db),
+    current_user: DonorModel = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Read current user/donor profile.
+    """
+    donor_profile = await profile.get(db, donor_id=current_user.id)
+    if not donor_profile:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No profile found with this user id.",
+        )
+    await profile.update(db, db_obj=donor_profile, obj_in=user_in)
+    return donor_profile
+
+
+@router.post(
+    "/create_user",
+    response_model=Msg,
+)
+async def create_user(
+    *,
+    db: Session = Depends(deps.get_db),
+    full_name: str = Body(...),
+    email: EmailStr = Body(...),
+    mobile: str = Body(...),
+    department: DepartmentsEnum = Body(...),
+    student_id: str = Body(...),
+    gender: GenderEnum = Body(...),
+    district: DistrictEnum = Body(...),
+    blood_group: BloodGroupEnum = Body(...),
+    academic_year: AcademicYearEnum = Body(...),
+    password: str = Body(...),
+) -> Any:
+    """
+    Create new user without the need to be logged in.
+    department_code (str): A string representing the department code. The available department codes are:
+
+    - Faculty of Arts and Humanities:
+        * "101" - Bangla
+        * "102" - English
+        * "103" - History
+        * "104" - Islamic History and Culture
+        * "105" - Philosophy
+        * "106" - Fine Arts
+        * "107" - Arabic
+        * "108" - Pali
+        * "110" - Islamic Studies
+        * "111" - Dramatics
+        * "112" - Persian Language and Literature
+        * "113" - Education and Research
+        * "114" - Modern Languages
+        * "115" - Sanskrit
+        * "116" - Music
+        * "117" - Bangladesh Studies
+
+    - Faculty of Science:
+        * "201" - Physics
+        * "202" - Chemistry
+        * "203" - Mathematics
+        * "204" - Statistics
+        * "208" - Forestry and Environmental Sciences
+        * "209" - Applied Chemistry and Chemical Engineering
+
+    - Faculty of Business Administration:
+        * "301" - Accounting
+        * "302" - Management
+        * "303" - Finance
+        * "304" - Marketing
+        * "305" - Human Resource Management
+        * "306" - Banking and Insurance
+
+    - Faculty of Social Sciences:
+        * "401" - Economics
+        * "402" - Political Science
+        * "403" - Sociology
+        * "404" - Public Administration
+        * "405" - Anthropology
+        * "406" - International Relations
+        * "407" - Communication and Journalism
+        * "408" - Development Studies
+        * "409" - Criminology and Police Science
+
+    - Faculty of Law:
+        * "501" - Law
+
+    - Faculty of Biological Sciences:
+        * "601" - Zoology
+        * "602" - Botany
+        * "603" - Geography and Environmental Studies
+        * "604" - Biochemistry and Molecular Biology
+        * "605" - Microbiology
+        * "606" - Soil Science
+        * "607" - Genetic Engineering and Biotechnology
+        * "608" - Psychology
+        * "609" - Pharmacy
+
+    - Faculty of Engineering:
+        * "701" - Computer Science and Engineering
+        * "702" - Electrical and Electronic Engineering
+
+    - Faculty of Education:
+        * "801" - Physical Education and Sports Science
+
+    - Faculty of Marine Sciences and Fisheries:
+        * "901" - Marine Sciences
+        * "902" - Oceanography
+        * "903" - Fisheries
+    """
+    if not settings.USERS_OPEN_REGISTRATION:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Open user registration is forbidden on this server",
+        )
+    user_in = UserCreateBase(
+        full_name=full_name,
+        email=email,
+        mobile=mobile,
+        department=department,
+        student_id=student_id,
+        gender=gender,
+        district=district,
+        blood_group=blood_group,
+        academic_year=academic_year,
+        password=password,
+    )
+    verify_email = settings.EMAILS_ENABLED and user_in.email
+    if verify_email:
+        user_in.is_active = False
+    try:
+        await user.create(db, obj_in=user_in)
+    except DuplicateUserError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if verify_email:
+        # the outbox worker sends the email in the background
+        password_reset_token = await generate_password_reset_token(email=email)
+        await send_new_account_email(
+            db,
+            username=user_in.full_name,
+            email=user_in.email,
+            token=password_reset_token,
+        )
+    return Msg(msg="Account has been created")
+
+
+@router.post("/verify-account")
+async def verify_account(
+    body: AccountVerifyToken, db: Session = Depends(deps.get_db)
+) -> Any:
+    email = await verify_password_reset_token(token=body.token)
+    if not email:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid token"
+        )
+    donor = await user.get_by_email(db, email=email)
+    if not donor:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="The user does not exist in the system.",
+        )
+    await user.update(db, db_obj=donor, obj_in={"is_active": True})
+    return Msg(msg="Account verification successful.")
+
+
+@router.get("/read_user/{user_email}", response_model=UserApi)
+async def read_user_by_email(
+    user_email: EmailStr,
+    db: Session = Depends(deps.get_db),
+) -> Any:
+    """
+    Get a specific user by email.
+    """
+    users = await user.get_by_email(db, email=user_email)
+    if users:
+        return users
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="User not found!"
+        )
+
+
+@router.patch(
+    "/update/{user_email}",
+    response_model=UserApi,
+    dependencies=[Depends(deps.get_current_active_superuser)],
+)
+async def update_user_by_email(
+    *,
+    db: Session = Depends(deps.get_db),
+    user_email: EmailStr,
+    user_in: UpdateBySuperUser,
+) -> Any:
+    """
+    Update a user (Super User Privilege needed).
+    """
+    user_ = await user.get_by_email(db, email=user_email)
+    if not user_in:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="The user does not exist in the system",
+        )
+    users = await user.update(db, db_obj=user_, obj_in=user_in)
+    return users
+
+
+@router.post("/upload_profile_img")
+async def upload_profile_img(
+    file: UploadFile,
+    db: Session = Depends(deps.get_db),
+    current_user: DonorModel = Depends(deps.get_current_active_user),
+):
+    try:
+        img_hash = await save_image(file)
+    except ImageTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE, detail=str(e)
+        )
+    except InvalidImageError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    try:
+        profile_data = await profile.get(db, donor_id=current_user.id)
+        profile_data.profile_img = img_hash
+        await profile.update(
+            db, db_obj=profile_data, obj_in=jsonable_encoder(profile_data)
+        )
+    except HTTPException:
+        raise HTTPException(
+            status_code=status.WS_1011_INTERNAL_ERROR,
+            detail="There is an error in the server. Pls try again.",
+        )
+    return Msg(msg="Profile image upload successful.")
+
+
+@router.patch("/change_availability", response_model=Msg)
+async def change_availability(
+    db: Session = Depends(deps.get_db),
+    current_user: DonorModel = Depends(deps.get_current_active_user),
+) -> Msg:
+    # passed to the update rather than set on the donor, the update hooks compare
+    # the donor before and after it
+    user_in = {
+        "is_available": not current_user.is_available,
+        "donated_on": datetime.datetime.now(datetime.UTC),
+    }
+    # staged in the session, committed along with the donor by the update
+    if user_in["is_available"]:
+        await eligibility_scheduler.cancel(db, current_user.id)
+    else:
+        await eligibility_scheduler.schedule(
+            db, current_user.id, user_in["donated_on"] + DONATION_INTERVAL
+        )
+    await user.update(db, db_obj=current_user, obj_in=user_in)
+    return Msg(
+        msg=f"Availability status has been changed. Now {'available' if current_user.is_available else 'unavailable'}"
+    )
+
+
+@router.get("/get_profile_img/{user_id}", response_class=FileResponse)
+async def get_profile_img(
+    user_id: str,
+    size: int = Query(default=150, ge=1),
+    accept: str | None = Header(default=None),
+    if_none_match: str | None = Header(default=None),
+    db: Session = Depends(deps.get_db),
+) -> Response:
+    """
+    The donor's profile image variant closest to `size` pixels, as WebP when the
+    `Accept` header allows it and as PNG otherwise.
+    Prefer `profile_img/{img_hash}` when the image hash is known, its responses
+    are cached for good.
+    """
+    validator = profile_validators.get(user_id)
+    if validator and if_none_match:
+        for name, _ in profile_image_variants(validator.img_hash, size, accept):
+            if etag_matches(if_none_match, f'"{name}"'):
+                return not_modified(f'"{name}"', REVALIDATE, Vary="Accept")
+
+    version = profile_validators.version(user_id)
+    profile_data = await profile.get(db, donor_id=user_id)
+    img_hash = None
+    if profile_data:
+        img_hash = _profile_validator(user_id, version, profile_data).img_hash
+    variant = await find_profile_image(img_hash, size, accept)
+    if variant:
+        name, media_type = variant
+        if etag_matches(if_none_match, f'"{name}"'):
+            return not_modified(f'"{name}"', REVALIDATE, Vary="Accept")
+        return stored_image_response(
+            name,
+            media_type,
+            headers={
+                "ETag": f'"{name}"',
+                "Cache-Control": REVALIDATE,
+                "Vary": "Accept",
+            },
+        )
+
+    # uploaded before the images were stored by content hash
+    legacy_name = f"{user_id}.png"
+    if profile_data and await image_storage.exists(legacy_name):
+        return stored_image_response(legacy_name, "image/png")
+    else:
+        return FileResponse(f"{STATIC_DIR}/images/{DEFAULT_PROFILE_IMG}")
+
+
+@router.get("/profile_img/{img_hash}", response_class=FileResponse)
+async def get_profile_img_by_hash(
+    img_hash: str,
+    size: int = Query(default=150, ge=1),
+    accept: str | None = Header(default=None),
+    if_none_match: str | None = Header(default=None),
+) -> Response:
+    """
+    A profile image variant by the content hash in `profile_img` of the profile.
+    The URL changes along with the image, so responses may be cached for good.
+    """
+    for name, _ in profile_image_variants(img_hash, size, accept):
+        if etag_matches(if_none_match, f'"{name}"'):
+            return not_modified(f'"{name}"', IMMUTABLE, Vary="Accept")
+    variant = await find_profile_image(img_hash, size, accept)
+    if not variant:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No profile image found with this hash.",
+        )
+    name, media_type = variant
+    return stored_image_response(
+        name,
+        media_type,
+        headers={"ETag": f'"{name}"', "Cache-Control": IMMUTABLE, "Vary": "Accept"},
+    )
+
+
+@router.get("/counts")
+async def get_total_users(db: Session = Depends(deps.get_db)) -> dict:
+    donors_count: dict = await donor_stats.counts(db)
+    return donors_count
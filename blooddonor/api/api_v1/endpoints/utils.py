@@ -1,4 +1,18 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession as Session
+
+from blooddonor.api import deps
+from blooddonor.core.config import settings
+from blooddonor.core.security import password_hash_pool
+from blooddonor.helper.cache import search_cache
+from blooddonor.helper.eligibility import eligibility_scheduler
+from blooddonor.helper.health import readiness_probe
+from blooddonor.helper.image import image_process_pool
+from blooddonor.helper.metrics import CONTENT_TYPE, registry
+from blooddonor.helper.outbox import outbox_worker
+from blooddonor.helper.scheduler import run_donor_availability, scheduler_history
+from blooddonor.schemas.health import Readiness
+from blooddonor.schemas.scheduler import SchedulerRun, SchedulerStats
 
 router = APIRouter()
 
@@ -6,3 +20,105 @@ router = APIRouter()
 @router.get("/health-check/")
 async def health_check() -> bool:
     return True
+
+
+@router.get("/liveness/")
+async def liveness() -> dict[str, str]:
+    """
+    Whether the process is up, without checking its dependencies. A failing
+    liveness probe should restart the instance.
+    """
+    return {"status": "alive"}
+
+
+@router.get("/readiness/", response_model=Readiness)
+async def readiness(
+    request: Request, response: Response, db: Session = Depends(deps.get_db)
+) -> Readiness:
+    """
+    Whether the instance can serve requests, with the latency of every dependency
+    checked. Answers 503 when a check fails, load balancers should route elsewhere
+    until it passes again.
+    """
+    result = await readiness_probe.check(
+        db, getattr(request.app.state, "scheduler", None)
+    )
+    if not result.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return result
+
+
+@router.get("/metrics", response_class=Response)
+async def metrics() -> Response:
+    """
+    The metrics of the app in the Prometheus text format, of all the app
+    processes when `METRICS_MULTIPROC_DIR` is set.
+    """
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Metrics are disabled."
+        )
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
+@router.get(
+    "/search-cache-stats/",
+    dependencies=[Depends(deps.get_current_active_superuser)],
+)
+async def search_cache_stats() -> dict[str, int]:
+    return search_cache.stats()
+
+
+@router.get(
+    "/password-hash-stats/",
+    dependencies=[Depends(deps.get_current_active_superuser)],
+)
+async def password_hash_stats() -> dict[str, int]:
+    return password_hash_pool.stats()
+
+
+@router.get(
+    "/image-process-stats/",
+    dependencies=[Depends(deps.get_current_active_superuser)],
+)
+async def image_process_stats() -> dict[str, int]:
+    return image_process_pool.stats()
+
+
+@router.get(
+    "/email-outbox-stats/",
+    dependencies=[Depends(deps.get_current_active_superuser)],
+)
+async def email_outbox_stats() -> dict[str, int]:
+    return outbox_worker.stats()
+
+
+@router.get(
+    "/eligibility-stats/",
+    dependencies=[Depends(deps.get_current_active_superuser)],
+)
+async def eligibility_stats() -> dict[str, int | str | None]:
+    return eligibility_scheduler.stats()
+
+
+@router.get(
+    "/scheduler-stats/",
+    response_model=SchedulerStats,
+    dependencies=[Depends(deps.get_current_active_superuser)],
+)
+async def scheduler_stats() -> SchedulerStats:
+    return scheduler_history.stats()
+
+
+@router.post(
+    "/run-donor-availability/",
+    response_model=SchedulerRun,
+    dependencies=[Depends(deps.get_current_active_superuser)],
+)
+async def run_donor_availability_now(
+    db: Session = Depends(deps.get_db),
+) -> SchedulerRun:
+    """
+    Run the donor availability update now instead of waiting for the scheduler.
+    """
+    return await run_donor_availability(db, trigger="manual")
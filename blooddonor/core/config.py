@@ -1,5 +1,5 @@
 import secrets
-from typing import Any
+from typing import Any, Literal
 
 from pydantic import (
     AnyHttpUrl,
@@ -43,6 +43,21 @@ class Settings(BaseSettings):
     PROJECT_NAME: str
 
     SQLALCHEMY_DATABASE_URI: str | None = None
+    # Connection pool of the database engine, not used by in-memory SQLite
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30
+    # Reconnect connections older than this, -1 keeps them open
+    DB_POOL_RECYCLE_SECONDS: int = -1
+    # Test every connection before use, for servers dropping idle connections
+    DB_POOL_PRE_PING: bool = False
+    # Pragmas applied to every SQLite connection, cache_size is in pages or,
+    # when negative, in KiB
+    SQLITE_JOURNAL_MODE: Literal["wal", "delete", "truncate", "persist"] = "wal"
+    SQLITE_SYNCHRONOUS: Literal["off", "normal", "full", "extra"] = "normal"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE: int = -64 * 1024
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
 
     SMTP_TLS: bool = False
     SMTP_PORT: int | None = None
@@ -53,7 +68,21 @@ class Settings(BaseSettings):
     EMAILS_FROM_NAME: str | None = None
     EMAIL_RESET_TOKEN_EXPIRE_HOURS: int = 48
     EMAIL_TEMPLATES_DIR: str = "./blooddonor/email_templates"
+    # Recompile email templates changed on disk, for development
+    EMAIL_TEMPLATES_AUTO_RELOAD: bool = False
     EMAILS_ENABLED: bool = False
+    # Persistent SMTP connections of the email outbox worker
+    SMTP_POOL_SIZE: int = 2
+    SMTP_TIMEOUT_SECONDS: float = 30
+    # Close pooled SMTP connections idle for longer than this
+    SMTP_IDLE_TIMEOUT_SECONDS: float = 60
+    # Emails claimed and delivered together by the outbox worker
+    EMAIL_OUTBOX_BATCH_SIZE: int = 50
+    # Check the outbox for due retries and emails queued by other processes
+    EMAIL_OUTBOX_POLL_SECONDS: float = 30
+    # Failed deliveries are retried after 30s, 60s, 120s, ...
+    EMAIL_OUTBOX_RETRY_SECONDS: float = 30
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = 5
 
     @model_validator(mode="after")
     def set_default_emails_from(self):
@@ -84,9 +113,90 @@ class Settings(BaseSettings):
     FIRST_SUPERUSER_BLOOD_GROUP: str
     FIRST_SUPERUSER_ACADEMIC_YEAR: str
     USERS_OPEN_REGISTRATION: bool = True
+    # Threads hashing passwords off the event loop, 0 hashes inline
+    PASSWORD_HASH_WORKERS: int = 4
+    # Processes resizing uploaded images off the event loop, 0 resizes inline
+    IMAGE_PROCESS_WORKERS: int = 2
+    # Uploaded images over these limits are refused before being decoded
+    IMAGE_MAX_UPLOAD_BYTES: int = 10 * 1024 * 1024
+    IMAGE_MAX_PIXELS: int = 40_000_000
+    # Profile images are stored bounded to each of these sizes, in these formats
+    # ("avif", "webp" or "png") and always in PNG for the other clients
+    PROFILE_IMG_SIZES: list[int] = [64, 150, 300]
+    PROFILE_IMG_FORMATS: list[str] = ["webp", "png"]
+    # Where the profile images are stored: "local" (in IMAGE_STORAGE_DIR), "memory"
+    # (for tests) or "s3" (a bucket of Amazon S3 or an S3 compatible service)
+    IMAGE_STORAGE_BACKEND: str = "local"
+    IMAGE_STORAGE_DIR: str = "./blooddonor/static/images"
+    # Base URL the stored images are public under, e.g. of a CDN
+    IMAGE_STORAGE_PUBLIC_URL: str | None = None
+    # Redirect image requests to the storage instead of sending the images, to a
+    # presigned URL valid for IMAGE_STORAGE_URL_EXPIRE_SECONDS without a public URL
+    IMAGE_STORAGE_REDIRECT: bool = False
+    IMAGE_STORAGE_URL_EXPIRE_SECONDS: int = 3600
+    S3_ENDPOINT_URL: str = "https://s3.amazonaws.com"
+    S3_BUCKET: str | None = None
+    S3_REGION: str = "us-east-1"
+    S3_ACCESS_KEY_ID: str | None = None
+    S3_SECRET_ACCESS_KEY: str | None = None
+    # Address the bucket as <bucket>.<endpoint host> instead of <endpoint>/<bucket>
+    S3_VIRTUAL_HOST_STYLE: bool = False
+    # Validators of the donor profiles answering conditional requests with 304
+    PROFILE_VALIDATOR_TTL_SECONDS: float = 30
+    PROFILE_VALIDATOR_MAX_ENTRIES: int = 4096
+    # Cache of the donors authenticated by access tokens
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 30
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 4096
+
+    # Report the SQL statements of every request in a Server-Timing header
+    SERVER_TIMING_ENABLED: bool = True
+    # Statements running at least this long are logged with their route
+    SLOW_QUERY_THRESHOLD_MS: float = 200
+
+    # Serve the Prometheus metrics at /utils/metrics
+    METRICS_ENABLED: bool = True
+    # Directory of the metric files shared by several app processes, e.g. uvicorn
+    # --workers. serve.py empties it before starting the workers, empty it by hand
+    # when starting them another way. Unset for a single process
+    METRICS_MULTIPROC_DIR: str | None = None
+    # Interval the pool and cache stats are copied into the shared metric files
+    METRICS_SAMPLE_SECONDS: float = 5
+
+    # Readiness probe: timeout of its SELECT 1, reuse of its result and the disk
+    # space the local image storage needs
+    READINESS_DB_TIMEOUT_SECONDS: float = 0.5
+    READINESS_CACHE_SECONDS: float = 1
+    READINESS_MIN_FREE_DISK_BYTES: int = 100 * 1024 * 1024
+
+    # Page size of the cursor paginated donor search
+    SEARCH_PAGE_SIZE: int = 50
+    SEARCH_MAX_PAGE_SIZE: int = 500
+    # Fall back to trigram similarity when a name search finds nothing
+    NAME_SEARCH_FUZZY: bool = True
+    NAME_SEARCH_SIMILARITY: float = 0.3
+    # best ranked fuzzy matches compared for similarity, the rest aren't loaded
+    NAME_SEARCH_FUZZY_CANDIDATES: int = 100
+    # Cache of serialised search responses
+    SEARCH_CACHE_ENABLED: bool = True
+    SEARCH_CACHE_TTL_SECONDS: float = 30
+    SEARCH_CACHE_MAX_ENTRIES: int = 1024
+    # Answer enum only searches from an in-process bitmap index
+    SEARCH_BITMAP_INDEX_ENABLED: bool = False
+    # Rows fetched per server side cursor batch of streamed exports
+    EXPORT_BATCH_SIZE: int = 1000
+    # Rows validated and inserted together by the bulk donor import
+    IMPORT_CHUNK_SIZE: int = 500
+    # Reload the /users/counts counters from the database after this long
+    DONOR_STATS_MAX_AGE_SECONDS: float = 300
 
     # Scheduler rerun time in hours
     SCHEDULER_RERUN_TIME_IN_HOURS: float = 3
+    # Random delay added to every run, spreads the runs of several processes
+    SCHEDULER_JITTER_SECONDS: int = 300
+    # Runs kept in the scheduler run history
+    SCHEDULER_HISTORY_SIZE: int = 50
+    # Donors updated per transaction by the availability job
+    SCHEDULER_BATCH_SIZE: int = 500
 
     # Automatics Documentations UI
     DOCS_URL: str | None = "/docs"
@@ -1,34 +1,84 @@
-import datetime
-from typing import Any
-
-from jose import jwt
-from passlib.context import CryptContext
-
-from blooddonor.core.config import settings
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
-ALGORITHM = "HS256"
-
-
-async def create_access_token(
-    subject: str | Any, expires_delta: datetime.timedelta = None
-) -> str:
-    if expires_delta:
-        expire = datetime.datetime.now(datetime.UTC) + expires_delta
-    else:
-        expire = datetime.datetime.now(datetime.UTC) + datetime.timedelta(
-            minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
-        )
-    to_encode = {"exp": expire, "sub": str(subject)}
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
-
-
-async def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
-
-
-async def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+import asyncio
+import datetime
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from jose import jwt
+from passlib.context import CryptContext
+
+from blooddonor.core.config import settings
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class PasswordHashPool:
+    """
+    Worker threads running bcrypt, so a hash or verify (hundreds of milliseconds
+    of CPU) doesn't block the event loop. bcrypt releases the GIL while hashing.
+    At most `workers` hashes run at once, the others wait in the executor queue.
+    With 0 workers hashing runs inline on the event loop.
+    """
+
+    def __init__(self, workers: int) -> None:
+        self.workers = workers
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._executor = (
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+            if workers > 0
+            else None
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        return max(self.in_flight - self.workers, 0)
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self._executor is None:
+            return func(*args)
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "peak_in_flight": self.peak_in_flight,
+        }
+
+
+password_hash_pool = PasswordHashPool(settings.PASSWORD_HASH_WORKERS)
+
+
+ALGORITHM = "HS256"
+
+
+async def create_access_token(
+    subject: str | Any, expires_delta: datetime.timedelta = None
+) -> str:
+    if expires_delta:
+        expire = datetime.datetime.now(datetime.UTC) + expires_delta
+    else:
+        expire = datetime.datetime.now(datetime.UTC) + datetime.timedelta(
+            minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
+        )
+    to_encode = {"exp": expire, "sub": str(subject)}
+    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
+    return encoded_jwt
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_hash_pool.run(
+        pwd_context.verify, plain_password, hashed_password
+    )
+
+
+async def get_password_hash(password: str) -> str:
+    return await password_hash_pool.run(pwd_context.hash, password)
@@ -1,93 +1,127 @@
-import uuid
-from collections.abc import Sequence
-from typing import Any
-
-from fastapi.encoders import jsonable_encoder
-from sqlalchemy import Row, RowMapping, asc, desc, select
-from sqlalchemy.ext.asyncio import AsyncSession as Session
-from sqlalchemy.orm import joinedload
-
-
-class CRUDBase[ModelType, CreateSchemaType, UpdateSchemaType]:
-    def __init__(self, model: type[ModelType]):
-        """
-        CRUD object with default methods to Create, Read, Update, Delete (CRUD).
-        **Parameters**
-        * `model`: A SQLAlchemy model class
-        * `schema`: A Pydantic model (schema) class
-        """
-        self.model = model
-
-    async def get(self, db: Session, id: uuid.UUID) -> ModelType | None:
-        query = (
-            select(self.model)
-            .options(joinedload(self.model.profile))
-            .where(self.model.id == id)
-        )
-        result = await db.execute(query)
-        return result.scalars().first()
-
-    async def get_multi(
-        self,
-        db: Session,
-        *,
-        skip: int = 0,
-        limit: int = 100,
-        order_by: str = "created_on desc",
-    ) -> Sequence[Row[Any] | RowMapping | Any]:
-        order_column_name, order_direction = order_by.split()
-        order_column = getattr(self.model, order_column_name)
-        order_expression = (
-            desc(order_column)
-            if order_direction.lower() == "desc"
-            else asc(order_column)
-        )
-        query = (
-            select(self.model)
-            .options(joinedload(self.model.profile))
-            .order_by(order_expression)
-            .where(self.model.is_available == True)  # noqa
-            .offset(skip)
-            .limit(limit)
-        )
-        result = await db.execute(query)
-        return result.scalars().all()
-
-    async def create(self, db: Session, *, obj_in: CreateSchemaType) -> ModelType:
-        obj_in_data = jsonable_encoder(obj_in)
-        db_obj = self.model(**obj_in_data)
-        db.add(db_obj)
-        await db.commit()
-        await db.refresh(db_obj)
-        return db_obj
-
-    async def update(
-        self,
-        db: Session,
-        *,
-        db_obj: ModelType,
-        obj_in: UpdateSchemaType | dict[str, Any],
-    ) -> ModelType:
-        obj_data = jsonable_encoder(db_obj)
-        if isinstance(obj_in, dict):
-            update_data = obj_in
-        else:
-            update_data = obj_in.model_dump(exclude_unset=True)
-        for field in obj_data:
-            if field in update_data:
-                if hasattr(db_obj, field) and isinstance(update_data[field], dict):
-                    profile_obj = getattr(db_obj, field)
-                    for pk, pv in update_data[field].items():
-                        setattr(profile_obj, pk, pv)
-                else:
-                    setattr(db_obj, field, update_data[field])
-        db.add(db_obj)
-        await db.commit()
-        await db.refresh(db_obj)
-        return db_obj
-
-    async def remove(self, db: Session, *, id: uuid.UUID) -> ModelType:
-        query = await self.get(db, id)
-        await db.delete(query)
-        await db.commit()
-        return query
+import uuid
+from collections.abc import Sequence
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import Result, Row, RowMapping, Select, asc, desc, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession as Session
+from sqlalchemy.orm import joinedload
+
+
+class CRUDBase[ModelType, CreateSchemaType, UpdateSchemaType]:
+    def __init__(self, model: type[ModelType]):
+        """
+        CRUD object with default methods to Create, Read, Update, Delete (CRUD).
+        **Parameters**
+        * `model`: A SQLAlchemy model class
+        * `schema`: A Pydantic model (schema) class
+        """
+        self.model = model
+
+    async def get(self, db: Session, id: uuid.UUID) -> ModelType | None:
+        query = (
+            select(self.model)
+            .options(joinedload(self.model.profile))
+            .where(self.model.id == id)
+        )
+        result = await db.execute(query)
+        return result.scalars().first()
+
+    def select_columns(self, columns: Sequence[str] | None = None) -> Select:
+        """
+        Select of whole models, or only of `columns` when given. Rows of a column
+        select skip the identity map and the relationship loaders.
+        """
+        if columns is None:
+            return select(self.model)
+        return select(*(getattr(self.model, column) for column in columns))
+
+    @staticmethod
+    def all_rows(
+        result: Result[Any], columns: Sequence[str] | None = None
+    ) -> Sequence[Row[Any] | Any]:
+        return result.scalars().all() if columns is None else result.all()
+
+    async def get_multi(
+        self,
+        db: Session,
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        order_by: str = "created_on desc",
+        columns: Sequence[str] | None = None,
+    ) -> Sequence[Row[Any] | RowMapping | Any]:
+        query = self.get_multi_query(
+            skip=skip, limit=limit, order_by=order_by, columns=columns
+        )
+        result = await db.execute(query)
+        return self.all_rows(result, columns)
+
+    def get_multi_query(
+        self,
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        order_by: str = "created_on desc",
+        columns: Sequence[str] | None = None,
+    ) -> Select:
+        """
+        Whole models come with their profile joined, `columns` only selects those.
+        """
+        order_column_name, order_direction = order_by.split()
+        order_column = getattr(self.model, order_column_name)
+        order_expression = (
+            desc(order_column)
+            if order_direction.lower() == "desc"
+            else asc(order_column)
+        )
+        query = self.select_columns(columns)
+        if columns is None:
+            query = query.options(joinedload(self.model.profile))
+        query = (
+            query.order_by(order_expression)
+            .where(self.model.is_available == True)  # noqa
+            .offset(skip)
+            .limit(limit)
+        )
+        return query
+
+    async def create(self, db: Session, *, obj_in: CreateSchemaType) -> ModelType:
+        obj_in_data = jsonable_encoder(obj_in)
+        db_obj = self.model(**obj_in_data)
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+
+    async def update(
+        self,
+        db: Session,
+        *,
+        db_obj: ModelType,
+        obj_in: UpdateSchemaType | dict[str, Any],
+    ) -> ModelType:
+        # mapped attribute names, encoding the object would follow back references
+        obj_data = inspect(db_obj).mapper.attrs.keys()
+        if isinstance(obj_in, dict):
+            update_data = obj_in
+        else:
+            update_data = obj_in.model_dump(exclude_unset=True)
+        for field in obj_data:
+            if field in update_data:
+                if hasattr(db_obj, field) and isinstance(update_data[field], dict):
+                    profile_obj = getattr(db_obj, field)
+                    for pk, pv in update_data[field].items():
+                        setattr(profile_obj, pk, pv)
+                else:
+                    setattr(db_obj, field, update_data[field])
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+
+    async def remove(self, db: Session, *, id: uuid.UUID) -> ModelType:
+        query = await self.get(db, id)
+        await db.delete(query)
+        await db.commit()
+        return query
@@ -1,151 +1,523 @@
-import datetime
-import uuid
-from typing import Any, override
-
-from pydantic import EmailStr
-from sqlalchemy import func, select
-from sqlalchemy.ext.asyncio import AsyncSession as Session
-
-from blooddonor.core import security
-from blooddonor.models.usermodel import DonorModel, ProfileModel
-from blooddonor.schemas.user import (
-    UpdateProfile,
-    UserCreateBase,
-    UserProfile,
-    UserUpdateBase,
-)
-
-from .base import CRUDBase
-
-
-# CRUD functionalities for Normal User models
-class CRUDUser(CRUDBase[DonorModel, UserCreateBase, UserUpdateBase]):
-    async def get_by_mobile(self, db: Session, mobile: str) -> DonorModel | None:
-        query = select(DonorModel).where(DonorModel.mobile == mobile)
-        result = await db.execute(query)
-        return result.scalars().first()
-
-    async def get_by_student_id(
-        self, db: Session, student_id: str
-    ) -> DonorModel | None:
-        query = select(DonorModel).where(DonorModel.student_id == student_id)
-        result = await db.execute(query)
-        return result.scalars().first()
-
-    async def get_by_email(self, db: Session, email: str) -> DonorModel | None:
-        query = select(DonorModel).where(DonorModel.email == email)
-        result = await db.execute(query)
-        return result.scalars().first()
-
-    async def get_user_count(self, db: Session) -> dict | None:
-        # Query for total users
-        total_query = select(func.count(DonorModel.id))
-        total_result = await db.execute(total_query)
-        total_count = total_result.scalar()
-
-        # Query for active users
-        active_query = select(func.count(DonorModel.id)).where(
-            DonorModel.is_available == True  # noqa
-        )
-        active_result = await db.execute(active_query)
-        active_count = active_result.scalar()
-
-        # new donors this month
-        this_month = datetime.datetime.now(datetime.UTC).replace(
-            day=1, hour=0, minute=0, second=0, microsecond=0
-        )
-        new_reg_query = select(func.count(DonorModel.id)).where(
-            DonorModel.created_on >= this_month
-        )
-        new_donors_result = await db.execute(new_reg_query)
-        new_donors_count = new_donors_result.scalar()
-
-        # Calculate the percentage of each blood group
-        blood_group_query = select(
-            DonorModel.blood_group, func.count(DonorModel.id)
-        ).group_by(DonorModel.blood_group)
-        blood_group_result = await db.execute(blood_group_query)
-        blood_group_data = blood_group_result.all()
-
-        blood_group_percentages = {
-            blood_group: round((count / total_count), 2) * 100 if total_count > 0 else 0
-            for blood_group, count in blood_group_data
-        }
-
-        # Return both counts in a dictionary
-        return {
-            "total_user_count": total_count,
-            "active_user_count": active_count,
-            "new_donors_this_month": new_donors_count,
-            "blood_group_percentages": blood_group_percentages,
-        }
-
-    @override
-    async def create(self, db: Session, obj_in: UserCreateBase) -> DonorModel | None:
-        db_obj: DonorModel = DonorModel(**obj_in.model_dump(exclude_unset=True))  # noqa
-        hashed_password = await security.get_password_hash(obj_in.password)
-        db_obj.hashed_password = hashed_password
-        # profile data
-        profile_obj = ProfileModel(donor=db_obj)  # noqa
-        db.add(profile_obj)
-        # adding user to database
-        db.add(db_obj)
-        await db.commit()
-        await db.refresh(db_obj)
-        return db_obj
-
-    @override
-    async def update(
-        self,
-        db: Session,
-        db_obj: DonorModel,
-        obj_in: UserUpdateBase | dict[str, Any],
-    ) -> DonorModel:
-        if isinstance(obj_in, dict):
-            user_data = obj_in
-        else:
-            user_data = obj_in.model_dump(exclude_unset=True)
-        if obj_in.password:
-            hashed_password = await security.get_password_hash(obj_in.password)
-            user_data["hashed_password"] = hashed_password
-        if "profile" in user_data and isinstance(user_data["profile"], dict):
-            profile_data = {key: str(val) for key, val in user_data["profile"].items()}
-            profile_data = UserProfile(**profile_data)
-            user_data["profile"] = profile_data.model_dump(exclude_unset=True)
-        return await super().update(db, db_obj=db_obj, obj_in=user_data)
-
-    async def authenticate(
-        self, db: Session, *, mobile: str = None, email: EmailStr = None, password: str
-    ) -> DonorModel | None:
-        if mobile:
-            users = await self.get_by_mobile(db, mobile=mobile)
-        else:
-            users = await self.get_by_email(db, email=email)
-
-        if not users:
-            return None
-
-        if not await security.verify_password(password, users.hashed_password):
-            return None
-        return users
-
-    async def is_active(self, user: DonorModel) -> bool:
-        return user.is_active
-
-    async def is_superuser(self, user: DonorModel) -> bool:
-        return user.is_superuser
-
-    async def is_admin(self, user: DonorModel) -> bool:
-        return user.is_admin
-
-
-class CRUDProfile(CRUDBase[ProfileModel, UserProfile, UpdateProfile]):
-    @override
-    async def get(self, db: Session, donor_id: uuid.UUID) -> ProfileModel | None:
-        query = select(self.model).where(self.model.donor_id == donor_id)
-        result = await db.execute(query)
-        return result.scalars().first()
-
-
-user = CRUDUser(DonorModel)
-profile = CRUDProfile(ProfileModel)
+import asyncio
+import datetime
+import uuid
+from collections.abc import Sequence
+from types import SimpleNamespace
+from typing import Any, override
+
+from pydantic import EmailStr
+from sqlalchemy import ColumnElement, Row, Select, and_, case, insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession as Session
+
+from blooddonor.core import security
+from blooddonor.core.config import settings
+from blooddonor.helper.bitmap_index import donor_index
+from blooddonor.helper.cache import facets_of, search_cache
+from blooddonor.helper.compatibility import COMPATIBLE_DONORS
+from blooddonor.helper.donor_stats import donor_stats
+from blooddonor.helper.http_cache import profile_validators
+from blooddonor.helper.name_search import (
+    filter_similar,
+    name_condition,
+    ranked_name_search,
+)
+from blooddonor.helper.pagination import decode_cursor, encode_cursor
+from blooddonor.helper.principal_cache import principal_cache
+from blooddonor.models.usermodel import DonorModel, ProfileModel
+from blooddonor.schemas.user import (
+    BloodGroupEnum,
+    DonorFilterSchema,
+    UpdateProfile,
+    UserCreateBase,
+    UserProfile,
+    UserUpdateBase,
+)
+
+from .base import CRUDBase
+
+# CRUD functionalities for Normal User models
+# donor fields with a unique constraint, in the order duplicates are reported
+UNIQUE_FIELDS = ("mobile", "email", "student_id")
+
+# donors loaded per query from ids found by the bitmap index
+INDEX_LOAD_BATCH_SIZE = 500
+
+
+class DuplicateUserError(ValueError):
+    def __init__(self, field: str) -> None:
+        self.field = field
+        super().__init__(f"The user with this {field} already exists in the system")
+
+
+class CRUDUser(CRUDBase[DonorModel, UserCreateBase, UserUpdateBase]):
+    async def get_by_mobile(self, db: Session, mobile: str) -> DonorModel | None:
+        query = select(DonorModel).where(DonorModel.mobile == mobile)
+        result = await db.execute(query)
+        return result.scalars().first()
+
+    async def get_by_student_id(
+        self, db: Session, student_id: str
+    ) -> DonorModel | None:
+        query = select(DonorModel).where(DonorModel.student_id == student_id)
+        result = await db.execute(query)
+        return result.scalars().first()
+
+    async def get_by_email(self, db: Session, email: str) -> DonorModel | None:
+        query = select(DonorModel).where(DonorModel.email == email)
+        result = await db.execute(query)
+        return result.scalars().first()
+
+    @staticmethod
+    def search_conditions(
+        filters: DonorFilterSchema, dialect_name: str, *, with_name: bool = True
+    ) -> list[ColumnElement[bool]]:
+        conditions = []
+
+        if filters.full_name and with_name:
+            conditions.append(name_condition(dialect_name, filters.full_name))
+
+        if filters.student_id:
+            conditions.append(DonorModel.student_id.in_([filters.student_id]))
+
+        if filters.gender:
+            conditions.append(DonorModel.gender.in_([filters.gender.value]))
+
+        if filters.district:
+            conditions.append(DonorModel.district.in_([filters.district.value]))
+
+        if filters.blood_group:
+            conditions.append(DonorModel.blood_group.in_([filters.blood_group.value]))
+
+        if filters.academic_year:
+            conditions.append(
+                DonorModel.academic_year.in_([filters.academic_year.value])
+            )
+
+        if filters.department:
+            conditions.append(DonorModel.department.in_([filters.department.value]))
+
+        return conditions
+
+    async def search(
+        self,
+        db: Session,
+        filters: DonorFilterSchema,
+        *,
+        columns: Sequence[str] | None = None,
+    ) -> Sequence[DonorModel | Row[Any]]:
+        """
+        Unpaginated search, newest donors first. Name searches are ranked by
+        relevance instead and fall back to fuzzy matching when nothing matches
+        the name.
+        The search methods return rows of only `columns` when given.
+        """
+        if await self._use_index(filters):
+            ids = donor_index.ids(donor_index.match(filters))
+            return await self._load_indexed(db, filters, ids, columns=columns)
+
+        dialect_name = db.bind.dialect.name
+        query = self.search_query(filters, dialect_name, columns=columns)
+        result = await db.execute(query)
+        donors = self.all_rows(result, columns)
+        if donors or not filters.full_name or not settings.NAME_SEARCH_FUZZY:
+            return donors
+
+        query = self.search_query(filters, dialect_name, fuzzy=True, columns=columns)
+        result = await db.execute(query)
+        return filter_similar(self.all_rows(result, columns), filters.full_name)
+
+    def search_query(
+        self,
+        filters: DonorFilterSchema,
+        dialect_name: str,
+        *,
+        fuzzy: bool = False,
+        columns: Sequence[str] | None = None,
+    ) -> Select:
+        """
+        Select of the donors matching `filters`, newest first or name matches
+        ranked by relevance.
+        """
+        conditions = self.search_conditions(filters, dialect_name, with_name=False)
+        query = self.select_columns(columns).where(*conditions)
+        if not filters.full_name:
+            return query.order_by(DonorModel.created_on.desc(), DonorModel.id.desc())
+        return ranked_name_search(query, dialect_name, filters.full_name, fuzzy=fuzzy)
+
+    async def search_page(
+        self,
+        db: Session,
+        filters: DonorFilterSchema,
+        *,
+        cursor: str | None = None,
+        limit: int = 50,
+        columns: Sequence[str] | None = None,
+    ) -> tuple[Sequence[DonorModel | Row[Any]], str | None]:
+        """
+        Keyset paginated search, newest donors first.
+        Returns the page and the cursor of the next page (None on the last page).
+        `columns` must include `id` and `created_on` for the cursor.
+        """
+        if await self._use_index(filters):
+            page = await self._search_page_indexed(
+                db, filters, cursor=cursor, limit=limit, columns=columns
+            )
+            if page is not None:
+                return page
+
+        conditions = self.search_conditions(filters, db.bind.dialect.name)
+        if cursor:
+            created_on, donor_id = decode_cursor(cursor)
+            conditions.append(
+                or_(
+                    DonorModel.created_on < created_on,
+                    and_(
+                        DonorModel.created_on == created_on,
+                        DonorModel.id < donor_id,
+                    ),
+                )
+            )
+        query = (
+            self.select_columns(columns)
+            .order_by(DonorModel.created_on.desc(), DonorModel.id.desc())
+            .limit(limit + 1)
+        )
+        if conditions:
+            query = query.where(and_(*conditions))
+        result = await db.execute(query)
+        donors = self.all_rows(result, columns)
+
+        # one extra row is fetched only to know whether another page exists
+        if len(donors) <= limit:
+            return donors, None
+        donors = donors[:limit]
+        last = donors[-1]
+        return donors, encode_cursor(last.created_on, last.id)
+
+    @staticmethod
+    async def _use_index(filters: DonorFilterSchema) -> bool:
+        """
+        Whether the bitmap index answers `filters`, it first catches up with the
+        donor writes of all the app processes.
+        """
+        if not (
+            settings.SEARCH_BITMAP_INDEX_ENABLED
+            and donor_index.ready
+            and donor_index.supports(filters)
+        ):
+            return False
+        await donor_index.sync()
+        return True
+
+    async def _load_indexed(
+        self,
+        db: Session,
+        filters: DonorFilterSchema,
+        ids: Sequence[str],
+        *,
+        columns: Sequence[str] | None = None,
+    ) -> list[DonorModel | Row[Any]]:
+        """
+        The donors of `ids` in that order, `INDEX_LOAD_BATCH_SIZE` per query.
+        """
+        # conditions are re-checked so a stale index never returns wrong donors
+        conditions = self.search_conditions(filters, db.bind.dialect.name)
+        donors = []
+        for start in range(0, len(ids), INDEX_LOAD_BATCH_SIZE):
+            batch = ids[start : start + INDEX_LOAD_BATCH_SIZE]
+            query = self.select_columns(columns).where(
+                DonorModel.id.in_(batch), *conditions
+            )
+            result = await db.execute(query)
+            found = {str(donor.id): donor for donor in self.all_rows(result, columns)}
+            donors.extend(found[i] for i in batch if i in found)
+        return donors
+
+    async def _search_page_indexed(
+        self,
+        db: Session,
+        filters: DonorFilterSchema,
+        *,
+        cursor: str | None,
+        limit: int,
+        columns: Sequence[str] | None = None,
+    ) -> tuple[Sequence[DonorModel | Row[Any]], str | None] | None:
+        """
+        Answer the page from the bitmap index and only load the page rows.
+        Returns None when the index can't serve the request.
+        """
+        donor_id = decode_cursor(cursor)[1] if cursor else None
+        donors = []
+        # rows the database no longer matches are dropped, so read on until the
+        # page is full or the index has no more ids
+        while len(donors) < limit:
+            before = None
+            if donor_id is not None:
+                # looked up again after every load, the index may be rebuilt meanwhile
+                before = donor_index.ordinal_of(donor_id)
+                if before is None:
+                    return None
+            ids, has_more = donor_index.page(
+                donor_index.match(filters), limit=limit - len(donors), before=before
+            )
+            if ids:
+                donors.extend(
+                    await self._load_indexed(db, filters, ids, columns=columns)
+                )
+            if not has_more:
+                return donors, None
+            donor_id = ids[-1]
+
+        last = donors[-1]
+        return donors, encode_cursor(last.created_on, last.id)
+
+    async def search_compatible(
+        self,
+        db: Session,
+        recipient: BloodGroupEnum,
+        filters: DonorFilterSchema,
+        *,
+        limit: int = 50,
+        columns: Sequence[str] | None = None,
+    ) -> Sequence[DonorModel | Row[Any]]:
+        """
+        Available donors who can give blood to the recipient blood group,
+        the most preferred donor blood groups first.
+        """
+        groups = COMPATIBLE_DONORS[recipient]
+        if filters.blood_group:
+            groups = tuple(group for group in groups if group == filters.blood_group)
+        if not groups:
+            return []
+        filters = filters.model_copy(update={"blood_group": None})
+
+        if await self._use_index(filters):
+            ids = []
+            for group in groups:
+                bitmap = donor_index.match(
+                    filters.model_copy(update={"blood_group": group}),
+                    only_available=True,
+                )
+                group_ids, _ = donor_index.page(bitmap, limit=limit - len(ids))
+                ids.extend(group_ids)
+                if len(ids) >= limit:
+                    break
+            query = self.select_columns(columns).where(DonorModel.id.in_(ids))
+        else:
+            query = self.select_columns(columns).limit(limit)
+
+        preference = case(
+            *(
+                (DonorModel.blood_group == group, rank)
+                for rank, group in enumerate(groups)
+            )
+        )
+        query = query.where(
+            DonorModel.blood_group.in_(groups),
+            DonorModel.is_available == True,  # noqa
+            *self.search_conditions(filters, db.bind.dialect.name),
+        ).order_by(preference, DonorModel.created_on.desc(), DonorModel.id.desc())
+        result = await db.execute(query)
+        return self.all_rows(result, columns)
+
+    async def get_user_count(self, db: Session) -> dict | None:
+        """
+        Donor counts straight from the database, also refreshing `donor_stats`.
+        """
+        await donor_stats.reload(db)
+        return donor_stats.as_dict()
+
+    async def get_duplicate_field(
+        self, db: Session, obj_in: UserCreateBase
+    ) -> str | None:
+        """
+        The first of `UNIQUE_FIELDS` another donor already holds, in a single query.
+        """
+        query = select(*(getattr(DonorModel, field) for field in UNIQUE_FIELDS)).where(
+            or_(
+                *(
+                    getattr(DonorModel, field) == getattr(obj_in, field)
+                    for field in UNIQUE_FIELDS
+                )
+            )
+        )
+        rows = (await db.execute(query)).all()
+        for field in UNIQUE_FIELDS:
+            if any(getattr(row, field) == getattr(obj_in, field) for row in rows):
+                return field
+        return None
+
+    async def get_existing_unique_values(
+        self, db: Session, objs_in: Sequence[UserCreateBase]
+    ) -> dict[str, set[str]]:
+        """
+        Values of `UNIQUE_FIELDS` among `objs_in` other donors already hold,
+        in a single query.
+        """
+        existing: dict[str, set[str]] = {field: set() for field in UNIQUE_FIELDS}
+        if not objs_in:
+            return existing
+        query = select(*(getattr(DonorModel, field) for field in UNIQUE_FIELDS)).where(
+            or_(
+                *(
+                    getattr(DonorModel, field).in_(
+                        {getattr(obj_in, field) for obj_in in objs_in}
+                    )
+                    for field in UNIQUE_FIELDS
+                )
+            )
+        )
+        for row in await db.execute(query):
+            for field in UNIQUE_FIELDS:
+                existing[field].add(getattr(row, field))
+        return existing
+
+    async def create_many(
+        self, db: Session, objs_in: Sequence[UserCreateBase]
+    ) -> list[str]:
+        """
+        Insert donors and their profiles with one executemany each, hashing the
+        passwords concurrently. Returns the ids of the new donors.
+        """
+        hashed_passwords = await asyncio.gather(
+            *(security.get_password_hash(obj_in.password) for obj_in in objs_in)
+        )
+        now = datetime.datetime.now(datetime.UTC)
+        donors = [
+            {
+                **obj_in.model_dump(exclude_none=True, exclude={"password", "profile"}),
+                "id": str(uuid.uuid4()),
+                "hashed_password": hashed_password,
+                "created_on": obj_in.created_on or now,
+            }
+            for obj_in, hashed_password in zip(objs_in, hashed_passwords, strict=True)
+        ]
+        if not donors:
+            return []
+        await db.execute(insert(DonorModel), donors)
+        await db.execute(
+            insert(ProfileModel), [{"donor_id": donor["id"]} for donor in donors]
+        )
+        await db.commit()
+
+        for donor in donors:
+            inserted = SimpleNamespace(**donor)
+            donor_index.add(inserted)
+            donor_stats.add(inserted)
+        search_cache.invalidate(*donors)
+        return [donor["id"] for donor in donors]
+
+    @override
+    async def create(self, db: Session, obj_in: UserCreateBase) -> DonorModel | None:
+        db_obj: DonorModel = DonorModel(**obj_in.model_dump(exclude_unset=True))  # noqa
+        hashed_password = await security.get_password_hash(obj_in.password)
+        db_obj.hashed_password = hashed_password
+        # profile data
+        profile_obj = ProfileModel(donor=db_obj)  # noqa
+        db.add(profile_obj)
+        # adding user to database, the unique constraints catch duplicates
+        db.add(db_obj)
+        try:
+            await db.commit()
+        except IntegrityError as e:
+            await db.rollback()
+            field = await self.get_duplicate_field(db, obj_in)
+            if field is None:
+                raise
+            raise DuplicateUserError(field) from e
+        donor_index.add(db_obj)
+        search_cache.invalidate(facets_of(db_obj))
+        donor_stats.add(db_obj)
+        return db_obj
+
+    @override
+    async def update(
+        self,
+        db: Session,
+        db_obj: DonorModel,
+        obj_in: UserUpdateBase | dict[str, Any],
+    ) -> DonorModel:
+        if isinstance(obj_in, dict):
+            user_data = obj_in
+            password = user_data.pop("password", None)
+        else:
+            user_data = obj_in.model_dump(exclude_unset=True)
+            password = obj_in.password
+        if password:
+            hashed_password = await security.get_password_hash(password)
+            user_data["hashed_password"] = hashed_password
+        if "profile" in user_data and isinstance(user_data["profile"], dict):
+            profile_data = {key: str(val) for key, val in user_data["profile"].items()}
+            profile_data = UserProfile(**profile_data)
+            user_data["profile"] = profile_data.model_dump(exclude_unset=True)
+        facets_before = facets_of(db_obj)
+        stats_before = donor_stats.snapshot(db_obj)
+        db_obj = await super().update(db, db_obj=db_obj, obj_in=user_data)
+        donor_index.update(db_obj)
+        search_cache.invalidate(facets_before, facets_of(db_obj))
+        donor_stats.update(stats_before, db_obj)
+        principal_cache.invalidate(db_obj.id)
+        # the profile may be written along with the donor
+        profile_validators.invalidate(db_obj.id)
+        return db_obj
+
+    @override
+    async def remove(self, db: Session, *, id: uuid.UUID) -> DonorModel:
+        db_obj = await super().remove(db, id=id)
+        donor_index.remove(id)
+        search_cache.invalidate(facets_of(db_obj))
+        donor_stats.remove(db_obj)
+        principal_cache.invalidate(id)
+        profile_validators.invalidate(id)
+        return db_obj
+
+    async def authenticate(
+        self, db: Session, *, mobile: str = None, email: EmailStr = None, password: str
+    ) -> DonorModel | None:
+        if mobile:
+            users = await self.get_by_mobile(db, mobile=mobile)
+        else:
+            users = await self.get_by_email(db, email=email)
+
+        if not users:
+            return None
+
+        if not await security.verify_password(password, users.hashed_password):
+            return None
+        return users
+
+    async def is_active(self, user: DonorModel) -> bool:
+        return user.is_active
+
+    async def is_superuser(self, user: DonorModel) -> bool:
+        return user.is_superuser
+
+    async def is_admin(self, user: DonorModel) -> bool:
+        return user.is_admin
+
+
+class CRUDProfile(CRUDBase[ProfileModel, UserProfile, UpdateProfile]):
+    @override
+    async def get(self, db: Session, donor_id: uuid.UUID) -> ProfileModel | None:
+        query = select(self.model).where(self.model.donor_id == donor_id)
+        result = await db.execute(query)
+        return result.scalars().first()
+
+    @override
+    async def update(
+        self,
+        db: Session,
+        *,
+        db_obj: ProfileModel,
+        obj_in: UpdateProfile | dict[str, Any],
+    ) -> ProfileModel:
+        db_obj = await super().update(db, db_obj=db_obj, obj_in=obj_in)
+        # authenticated donors are cached along with their profile
+        principal_cache.invalidate(db_obj.donor_id)
+        profile_validators.invalidate(db_obj.donor_id)
+        return db_obj
+
+
+user = CRUDUser(DonorModel)
+profile = CRUDProfile(ProfileModel)
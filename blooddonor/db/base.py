@@ -1,4 +1,13 @@
-# Import all the models, so that Base has them before being
-# imported by Alembic
-from blooddonor.db.base_class import Base  # noqa
-from blooddonor.models.usermodel import DonorModel, ProfileModel  # noqa
+# Import all the models, so that Base has them before being
+# imported by Alembic
+from blooddonor.db.base_class import Base  # noqa
+from blooddonor.models.outboxmodel import EmailOutboxModel  # noqa
+from blooddonor.models.schedulermodel import (  # noqa
+    DonorEligibilityModel,
+    SchedulerLockModel,
+)
+from blooddonor.models.usermodel import (  # noqa
+    DonorChangeModel,
+    DonorModel,
+    ProfileModel,
+)
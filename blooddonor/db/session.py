@@ -1,6 +1,59 @@
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-
-from blooddonor.core.config import settings
-
-engine = create_async_engine(settings.SQLALCHEMY_DATABASE_URI)
-SessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from blooddonor.core.config import settings
+from blooddonor.helper.query_timing import instrument_engine
+
+
+def set_sqlite_pragmas(dbapi_connection: Any, connection_record: Any) -> None:  # noqa: ARG001
+    """
+    Tune every new SQLite connection. In WAL mode, the default, readers and the
+    writer don't block each other, and `synchronous=NORMAL` only syncs the WAL
+    on checkpoints, which keeps the database consistent on a crash.
+    """
+    cursor = dbapi_connection.cursor()
+    for pragma in (
+        f"journal_mode={settings.SQLITE_JOURNAL_MODE}",
+        f"synchronous={settings.SQLITE_SYNCHRONOUS}",
+        f"busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}",
+        f"cache_size={settings.SQLITE_CACHE_SIZE}",
+        f"mmap_size={settings.SQLITE_MMAP_SIZE}",
+        "temp_store=memory",
+    ):
+        cursor.execute(f"PRAGMA {pragma}")
+    cursor.close()
+
+
+def engine_options(url: str) -> dict[str, Any]:
+    """
+    The pool options of `Settings` for an engine of `url`. In-memory SQLite
+    databases keep their single connection in a StaticPool, which has no size.
+    """
+    options: dict[str, Any] = {"pool_pre_ping": settings.DB_POOL_PRE_PING}
+    db_url = make_url(url)
+    if db_url.get_backend_name() == "sqlite" and db_url.database in (
+        None,
+        "",
+        ":memory:",
+    ):
+        return options
+    return {
+        **options,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+    }
+
+
+engine = create_async_engine(
+    settings.SQLALCHEMY_DATABASE_URI,
+    **engine_options(settings.SQLALCHEMY_DATABASE_URI),
+)
+if engine.dialect.name == "sqlite":
+    event.listen(engine.sync_engine, "connect", set_sqlite_pragmas)
+instrument_engine(engine)
+SessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
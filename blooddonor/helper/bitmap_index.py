@@ -0,0 +1,236 @@
+import asyncio
+import logging
+from collections import defaultdict
+from collections.abc import Iterable
+from typing import Any
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession as Session
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from blooddonor.db.session import SessionLocal
+from blooddonor.models.usermodel import DonorChangeModel, DonorModel
+from blooddonor.schemas.user import DonorFilterSchema
+
+logger = logging.getLogger(__name__)
+
+# low cardinality enum columns of DonorFilterSchema answered from bitmaps
+FACETS = ("gender", "district", "blood_group", "academic_year", "department")
+
+# changes replayed one by one, a process further behind rebuilds its index
+MAX_REPLAY = 1000
+
+
+def _value(val: Any) -> str:
+    return getattr(val, "value", val)
+
+
+class DonorBitmapIndex:
+    """
+    In-process bitmap index over donor row ordinals.
+
+    Every donor gets an ordinal in (created_on, id) order and every enum value of
+    `FACETS` keeps a bitmap of the ordinals holding it. Python ints are used as the
+    bitmaps, so AND/OR run word-wise in C and the population count is `int.bit_count`.
+    Ordinals of removed donors are simply dropped from the `live` bitmap.
+
+    Writes of this process are applied at once by the CRUDUser hooks. The database
+    also records every donor write of any app process in `DonorChangeModel`, and
+    `sync` replays the ones since `seq` before the index is used, so it never
+    misses donors written by another worker.
+    """
+
+    # sessions of the catch up, which outlives the request that started it
+    session_factory: async_sessionmaker[Session] = SessionLocal
+
+    def __init__(self) -> None:
+        self.ready = False
+        # the last change log entry applied
+        self.seq = 0
+        self._syncing: asyncio.Task | None = None
+        self._ordinals: dict[str, int] = {}
+        self._ids: list[str] = []
+        self._rows: list[tuple[str, ...]] = []
+        self._bitmaps: dict[tuple[str, str], int] = defaultdict(int)
+        self._live = 0
+        self._available = 0
+
+    @staticmethod
+    def supports(filters: DonorFilterSchema) -> bool:
+        return not filters.full_name and not filters.student_id
+
+    async def rebuild(self, db: Session) -> None:
+        # read first, changes made while loading the donors are replayed later
+        seq = await db.scalar(select(func.max(DonorChangeModel.seq)))
+        query = select(
+            DonorModel.id,
+            DonorModel.is_available,
+            *(getattr(DonorModel, facet) for facet in FACETS),
+        ).order_by(DonorModel.created_on, DonorModel.id)
+        result = await db.execute(query)
+
+        index = DonorBitmapIndex()
+        for row in result:
+            index._insert(str(row[0]), row[2:], row[1])
+        index.ready = True
+        index.seq = seq or 0
+        index._syncing = self._syncing
+        # swap in the finished index at once
+        self.__dict__.update(index.__dict__)
+        logger.info(f"Donor bitmap index built with {len(self._ids)} donors.")
+
+    async def sync(self) -> None:
+        """
+        Catch up with the donor writes of all the app processes. Concurrent
+        callers wait for the same catch up, run in a session of its own.
+        """
+        if self._syncing is None:
+            self._syncing = asyncio.create_task(self._sync())
+        syncing = self._syncing
+        try:
+            await asyncio.shield(syncing)
+        finally:
+            if self._syncing is syncing and syncing.done():
+                self._syncing = None
+
+    async def _sync(self) -> None:
+        async with self.session_factory() as db:
+            await self._replay(db)
+
+    async def _replay(self, db: Session) -> None:
+        seq = DonorChangeModel.seq
+        first, last = (await db.execute(select(func.min(seq), func.max(seq)))).one()
+        if last is None or last <= self.seq:
+            return
+        # entries this process hasn't seen were trimmed from the log
+        if first > self.seq + 1 or last - self.seq > MAX_REPLAY:
+            await self.rebuild(db)
+            return
+
+        donor_ids = set(
+            await db.scalars(
+                select(DonorChangeModel.donor_id).where(seq > self.seq, seq <= last)
+            )
+        )
+        result = await db.execute(
+            select(
+                DonorModel.id,
+                DonorModel.is_available,
+                *(getattr(DonorModel, facet) for facet in FACETS),
+            ).where(DonorModel.id.in_(donor_ids))
+        )
+        donors = {str(donor.id): donor for donor in result}
+        for donor_id in donor_ids:
+            if donor_id in donors:
+                self.update(donors[donor_id])
+            else:
+                self.remove(donor_id)
+        self.seq = last
+
+    def add(self, donor: DonorModel) -> None:
+        if not self.ready:
+            return
+        donor_id = str(donor.id)
+        if donor_id in self._ordinals:
+            self.update(donor)
+            return
+        values = [getattr(donor, facet) for facet in FACETS]
+        self._insert(donor_id, values, donor.is_available)
+
+    def update(self, donor: DonorModel) -> None:
+        if not self.ready:
+            return
+        ordinal = self._ordinals.get(str(donor.id))
+        if ordinal is None:
+            self.add(donor)
+            return
+        bit = 1 << ordinal
+        old = self._rows[ordinal]
+        new = tuple(_value(getattr(donor, facet)) for facet in FACETS)
+        for facet, old_val, new_val in zip(FACETS, old, new, strict=True):
+            if old_val != new_val:
+                self._bitmaps[(facet, old_val)] &= ~bit
+                self._bitmaps[(facet, new_val)] |= bit
+        self._rows[ordinal] = new
+        self._set_available(ordinal, donor.is_available)
+
+    def remove(self, donor_id: str) -> None:
+        if not self.ready:
+            return
+        ordinal = self._ordinals.pop(str(donor_id), None)
+        if ordinal is None:
+            return
+        bit = 1 << ordinal
+        for facet, val in zip(FACETS, self._rows[ordinal], strict=True):
+            self._bitmaps[(facet, val)] &= ~bit
+        self._live &= ~bit
+        self._available &= ~bit
+
+    def mark_available(self, donor_ids: Iterable[str], is_available: bool) -> None:
+        if not self.ready:
+            return
+        for donor_id in donor_ids:
+            ordinal = self._ordinals.get(str(donor_id))
+            if ordinal is not None:
+                self._set_available(ordinal, is_available)
+
+    def ordinal_of(self, donor_id: str) -> int | None:
+        return self._ordinals.get(str(donor_id))
+
+    def match(self, filters: DonorFilterSchema, *, only_available: bool = False) -> int:
+        bitmap = self._available if only_available else self._live
+        for facet in FACETS:
+            val = getattr(filters, facet)
+            if val is not None:
+                bitmap &= self._bitmaps.get((facet, _value(val)), 0)
+        return bitmap
+
+    def page(
+        self, bitmap: int, *, limit: int, before: int | None = None
+    ) -> tuple[list[str], bool]:
+        """
+        Donor ids of the `limit` highest ordinals (newest donors) of the bitmap,
+        optionally below the ordinal `before`, and whether more ids remain.
+        """
+        if before is not None:
+            bitmap &= (1 << before) - 1
+        ids = []
+        while bitmap and len(ids) < limit:
+            ordinal = bitmap.bit_length() - 1
+            bitmap ^= 1 << ordinal
+            ids.append(self._ids[ordinal])
+        return ids, bitmap != 0
+
+    def ids(self, bitmap: int) -> list[str]:
+        """
+        Donor ids of all the ordinals of the bitmap, newest first.
+        """
+        # the binary digits run from the highest ordinal down
+        digits = bin(bitmap)[2:]
+        top = len(digits) - 1
+        return [self._ids[top - i] for i, digit in enumerate(digits) if digit == "1"]
+
+    def count(self, bitmap: int) -> int:
+        return bitmap.bit_count()
+
+    def _insert(self, donor_id: str, values: Iterable[Any], is_available: bool) -> None:
+        ordinal = len(self._ids)
+        bit = 1 << ordinal
+        row = tuple(_value(val) for val in values)
+        self._ordinals[donor_id] = ordinal
+        self._ids.append(donor_id)
+        self._rows.append(row)
+        for facet, val in zip(FACETS, row, strict=True):
+            self._bitmaps[(facet, val)] |= bit
+        self._live |= bit
+        if is_available:
+            self._available |= bit
+
+    def _set_available(self, ordinal: int, is_available: bool) -> None:
+        if is_available:
+            self._available |= 1 << ordinal
+        else:
+            self._available &= ~(1 << ordinal)
+
+
+donor_index = DonorBitmapIndex()
@@ -0,0 +1,191 @@
+import asyncio
+import csv
+import io
+import json
+import zipfile
+from collections.abc import Iterable, Iterator
+from itertools import islice
+from pathlib import PurePath
+from typing import IO, Any
+
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession as Session
+
+from blooddonor.core.config import settings
+from blooddonor.crud.crud_utility import UNIQUE_FIELDS, user
+from blooddonor.schemas.bulk_import import ImportReport, ImportRowError
+from blooddonor.schemas.user import UserCreateBase
+
+IMPORT_FORMATS = {
+    ".csv": "csv",
+    ".xlsx": "xlsx",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+}
+
+
+class UnsupportedImportError(ValueError):
+    pass
+
+
+def import_format(filename: str | None) -> str:
+    suffix = PurePath(filename or "").suffix.lower()
+    if suffix not in IMPORT_FORMATS:
+        raise UnsupportedImportError(
+            f"Unsupported file type, expected one of {', '.join(IMPORT_FORMATS)}"
+        )
+    return IMPORT_FORMATS[suffix]
+
+
+def _clean(row: dict[Any, Any]) -> dict[str, Any]:
+    # blank cells are missing values, spreadsheets store codes and numbers as numbers
+    return {
+        str(key).strip(): val if isinstance(val, bool) else str(val).strip()
+        for key, val in row.items()
+        if key is not None and val is not None and str(val).strip() != ""
+    }
+
+
+def _numbered(
+    header: Iterable[Any], records: Iterable[Iterable[Any]]
+) -> Iterator[tuple[int, dict[str, Any]]]:
+    for number, values in enumerate(records, start=1):
+        # spreadsheets often carry formatted but empty rows, they keep their number
+        if row := _clean(dict(zip(header, values, strict=False))):
+            yield number, row
+
+
+def _read_xlsx(file: IO[bytes]) -> Iterator[tuple[int, dict[str, Any]]]:
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        yield from _numbered(next(rows, ()), rows)
+    finally:
+        workbook.close()
+
+
+def read_rows(file: IO[bytes], fmt: str) -> Iterator[tuple[int, dict[str, Any]]]:
+    """
+    Donor rows of an uploaded file with their row numbers, blank rows counted but
+    left out. Read lazily so the whole file never sits in memory at once.
+    """
+    if fmt == "xlsx":
+        yield from _read_xlsx(file)
+        return
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        if fmt == "csv":
+            records = csv.reader(text)
+            yield from _numbered(next(records, ()), records)
+        else:
+            for number, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield number, json.loads(line)
+                except json.JSONDecodeError:
+                    # reported as an invalid row by import_donors
+                    yield number, line
+    finally:
+        # leave the underlying file open for its owner
+        text.detach()
+
+
+def _chunks(
+    rows: Iterable[tuple[int, dict[str, Any]]], size: int
+) -> Iterator[list[tuple[int, dict[str, Any]]]]:
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def _validation_errors(e: ValidationError) -> list[str]:
+    return [
+        f"{'.'.join(str(loc) for loc in error['loc']) or 'row'}: {error['msg']}"
+        for error in e.errors()
+    ]
+
+
+async def import_donors(
+    db: Session,
+    rows: Iterable[tuple[int, dict[str, Any]]],
+    *,
+    chunk_size: int | None = None,
+) -> ImportReport:
+    """
+    Validate and insert donors chunk by chunk, reporting the rows that failed.
+    Each chunk costs one duplicate lookup and one insert per table. The rows are
+    read in a worker thread, parsing a large file would hold the event loop.
+    """
+    report = ImportReport()
+    seen: dict[str, set[str]] = {field: set() for field in UNIQUE_FIELDS}
+
+    def fail(number: int, errors: list[str]) -> None:
+        report.failed += 1
+        report.errors.append(ImportRowError(row=number, errors=errors))
+
+    try:
+        chunks = _chunks(rows, chunk_size or settings.IMPORT_CHUNK_SIZE)
+        while chunk := await asyncio.to_thread(next, chunks, []):
+            valid: list[tuple[int, UserCreateBase]] = []
+            for number, row in chunk:
+                try:
+                    donor = UserCreateBase(**row)
+                except ValidationError as e:
+                    fail(number, _validation_errors(e))
+                    continue
+                except TypeError:
+                    fail(number, ["row: expected a JSON object of donor fields"])
+                    continue
+                duplicate = next(
+                    (f for f in UNIQUE_FIELDS if getattr(donor, f) in seen[f]), None
+                )
+                if duplicate:
+                    fail(number, [f"{duplicate}: appears more than once in the file"])
+                    continue
+                for field in UNIQUE_FIELDS:
+                    seen[field].add(getattr(donor, field))
+                valid.append((number, donor))
+
+            existing = await user.get_existing_unique_values(
+                db, [donor for _, donor in valid]
+            )
+            donors = []
+            for number, donor in valid:
+                duplicate = next(
+                    (f for f in UNIQUE_FIELDS if getattr(donor, f) in existing[f]), None
+                )
+                if duplicate:
+                    fail(
+                        number,
+                        [
+                            f"The user with this {duplicate} already exists in the system"
+                        ],
+                    )
+                else:
+                    donors.append((number, donor))
+
+            try:
+                await user.create_many(db, [donor for _, donor in donors])
+            except IntegrityError:
+                # a donor registered concurrently, the chunk is rolled back as a whole
+                await db.rollback()
+                for number, _ in donors:
+                    fail(number, ["Conflicts with a donor registered meanwhile"])
+            else:
+                report.imported += len(donors)
+    except (
+        UnicodeDecodeError,
+        csv.Error,
+        zipfile.BadZipFile,
+        InvalidFileException,
+    ) as e:
+        raise UnsupportedImportError(
+            f"Could not read the file after importing {report.imported} donors: {e}"
+        )
+
+    report.errors.sort(key=lambda error: error.row)
+    return report
@@ -0,0 +1,156 @@
+import time
+from collections import OrderedDict, defaultdict
+from collections.abc import Awaitable, Callable, Iterable, Mapping
+from typing import Any, NamedTuple
+
+from blooddonor.core.config import settings
+from blooddonor.helper.bitmap_index import FACETS
+from blooddonor.schemas.user import DonorFilterSchema
+
+# generation bumped by every donor write, for searches without any facet
+ANY_DONOR = ("*", "*")
+
+
+def _value(val: Any) -> Any:
+    return getattr(val, "value", val)
+
+
+class TTLCache:
+    """
+    Least recently used cache whose entries also expire after `ttl` seconds.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Any) -> Any | None:
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Any, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Any) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
+
+
+class SearchKey(NamedTuple):
+    endpoint: str
+    params: tuple[tuple[str, Any], ...]
+    # facet values every donor matched by the search holds
+    dependencies: tuple[tuple[str, Any], ...]
+
+
+class SearchCache:
+    """
+    Serialised search responses keyed on the normalised filters.
+
+    Instead of flushing everything on a write, every facet value (e.g.
+    `("blood_group", "a+")`) has a generation counter which donor writes bump for
+    the old and new values of the donor. An entry stays valid while the generations
+    of the facet values it depends on are unchanged.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self._cache = TTLCache(maxsize, ttl)
+        self._generations: defaultdict[tuple[str, Any], int] = defaultdict(int)
+
+    @staticmethod
+    def key(
+        endpoint: str,
+        filters: DonorFilterSchema,
+        *,
+        dependencies: Iterable[tuple[str, Any]] = (),
+        **params: Any,
+    ) -> SearchKey:
+        values = filters.model_dump(mode="json", exclude_none=True)
+        if "full_name" in values:
+            values["full_name"] = values["full_name"].strip().lower()
+        values.update({k: _value(v) for k, v in params.items() if v is not None})
+
+        dependencies = {(facet, _value(val)) for facet, val in dependencies}
+        dependencies |= {(facet, values[facet]) for facet in FACETS if facet in values}
+        return SearchKey(
+            endpoint,
+            tuple(sorted(values.items())),
+            tuple(sorted(dependencies)) or (ANY_DONOR,),
+        )
+
+    async def get_or_build(
+        self, key: SearchKey, build: Callable[[], Awaitable[bytes]]
+    ) -> bytes:
+        if not settings.SEARCH_CACHE_ENABLED:
+            return await build()
+        entry = self._cache.get(key)
+        if entry is not None:
+            generations, body = entry
+            if generations == self._snapshot(key):
+                return body
+            self._cache.pop(key)
+
+        # taken before the query, a write racing with it leaves the entry stale
+        generations = self._snapshot(key)
+        body = await build()
+        self._cache.set(key, (generations, body))
+        return body
+
+    def invalidate(self, *donors: Mapping[str, Any] | None) -> None:
+        """
+        Invalidate the searches a donor write may change.
+        Pass the facet values of the donor before and/or after the write.
+        """
+        self._generations[ANY_DONOR] += 1
+        for donor in donors:
+            if donor is None:
+                continue
+            for facet in FACETS:
+                if facet in donor:
+                    self._generations[(facet, _value(donor[facet]))] += 1
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict[str, int]:
+        return self._cache.stats()
+
+    def _snapshot(self, key: SearchKey) -> tuple[int, ...]:
+        return tuple(self._generations[dep] for dep in key.dependencies)
+
+
+def facets_of(donor: Any) -> dict[str, Any]:
+    return {facet: _value(getattr(donor, facet)) for facet in FACETS}
+
+
+search_cache = SearchCache(
+    maxsize=settings.SEARCH_CACHE_MAX_ENTRIES, ttl=settings.SEARCH_CACHE_TTL_SECONDS
+)
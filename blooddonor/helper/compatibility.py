@@ -0,0 +1,38 @@
+from blooddonor.schemas.user import BloodGroupEnum
+
+
+def _antigens(group: BloodGroupEnum) -> frozenset[str]:
+    """
+    ABO antigens and Rh factor carried by the red cells of a blood group.
+    """
+    abo, rh = group.value[:-1], group.value[-1]
+    antigens = set(abo) - {"o"}
+    if rh == "+":
+        antigens.add("rh")
+    return frozenset(antigens)
+
+
+_ANTIGENS = {group: _antigens(group) for group in BloodGroupEnum}
+
+
+def _compatible_donors(recipient: BloodGroupEnum) -> tuple[BloodGroupEnum, ...]:
+    """
+    Donor groups whose red cells carry no antigen the recipient lacks, ordered by
+    preference: the exact group first, then the closest groups, o- last so the
+    universal donors are kept for those who can't receive anything else.
+    """
+    donors = [
+        group for group in BloodGroupEnum if _ANTIGENS[group] <= _ANTIGENS[recipient]
+    ]
+    return tuple(
+        sorted(
+            donors,
+            key=lambda group: (group != recipient, -len(_ANTIGENS[group])),
+        )
+    )
+
+
+# recipient blood group -> compatible donor blood groups, most preferred first
+COMPATIBLE_DONORS: dict[BloodGroupEnum, tuple[BloodGroupEnum, ...]] = {
+    recipient: _compatible_donors(recipient) for recipient in BloodGroupEnum
+}
@@ -0,0 +1,128 @@
+import datetime
+import time
+from collections import Counter
+from typing import Any
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession as Session
+
+from blooddonor.core.config import settings
+from blooddonor.models.usermodel import DonorModel
+from blooddonor.schemas.user import BloodGroupEnum
+
+
+def _month_start(now: datetime.datetime | None = None) -> datetime.datetime:
+    now = now or datetime.datetime.now(datetime.UTC)
+    return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _aware(value: datetime.datetime | None) -> datetime.datetime | None:
+    # SQLite hands datetimes back without the timezone they were stored in
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=datetime.UTC)
+    return value
+
+
+class DonorStats:
+    """
+    Donor counters served by `/users/counts`.
+
+    Loaded with a single aggregate query, then kept up to date by the CRUDUser
+    write hooks and the scheduler. The counters are reloaded when the month
+    changes, when they are older than `DONOR_STATS_MAX_AGE_SECONDS` (writes of other
+    worker processes aren't seen here) and by every scheduler run.
+    """
+
+    def __init__(self) -> None:
+        self.ready = False
+        self.loaded_at = 0.0
+        self.month = _month_start()
+        self.total = 0
+        self.available = 0
+        self.new_this_month = 0
+        self.blood_groups: Counter[str] = Counter()
+
+    async def reload(self, db: Session) -> None:
+        month = _month_start()
+        count = func.count(DonorModel.id)
+        query = select(
+            count,
+            count.filter(DonorModel.is_available == True),  # noqa
+            count.filter(DonorModel.created_on >= month),
+            *(
+                count.filter(DonorModel.blood_group == group)
+                for group in BloodGroupEnum
+            ),
+        )
+        total, available, new_this_month, *groups = (await db.execute(query)).one()
+
+        self.month = month
+        self.total = total
+        self.available = available
+        self.new_this_month = new_this_month
+        self.blood_groups = Counter(
+            {group.value: n for group, n in zip(BloodGroupEnum, groups, strict=True)}
+        )
+        self.loaded_at = time.monotonic()
+        self.ready = True
+
+    async def counts(self, db: Session) -> dict[str, Any]:
+        stale = time.monotonic() - self.loaded_at > settings.DONOR_STATS_MAX_AGE_SECONDS
+        if not self.ready or stale or self.month != _month_start():
+            await self.reload(db)
+        return self.as_dict()
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "total_user_count": self.total,
+            "active_user_count": self.available,
+            "new_donors_this_month": self.new_this_month,
+            "blood_group_percentages": {
+                group: round((count / self.total), 2) * 100
+                for group, count in self.blood_groups.items()
+                if count
+            },
+        }
+
+    @staticmethod
+    def snapshot(donor: DonorModel) -> tuple[bool, str, datetime.datetime | None]:
+        """
+        The donor fields the counters depend on, taken before an update.
+        """
+        return (
+            donor.is_available,
+            getattr(donor.blood_group, "value", donor.blood_group),
+            _aware(donor.created_on),
+        )
+
+    def add(self, donor: DonorModel) -> None:
+        self._apply(self.snapshot(donor), 1)
+
+    def remove(self, donor: DonorModel) -> None:
+        self._apply(self.snapshot(donor), -1)
+
+    def update(
+        self, before: tuple[bool, str, datetime.datetime | None], donor: DonorModel
+    ) -> None:
+        self._apply(before, -1)
+        self._apply(self.snapshot(donor), 1)
+
+    def made_available(self, count: int) -> None:
+        if self.ready:
+            self.available += count
+
+    def _apply(
+        self, fields: tuple[bool, str, datetime.datetime | None], sign: int
+    ) -> None:
+        if not self.ready:
+            return
+        is_available, blood_group, created_on = fields
+        self.total += sign
+        self.blood_groups[blood_group] += sign
+        if is_available:
+            self.available += sign
+        if created_on is not None and created_on >= self.month:
+            self.new_this_month += sign
+
+
+donor_stats = DonorStats()
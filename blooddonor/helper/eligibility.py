@@ -0,0 +1,188 @@
+import asyncio
+import datetime
+import heapq
+import logging
+
+from sqlalchemy import ColumnElement, delete, false, select, update
+from sqlalchemy.ext.asyncio import AsyncSession as Session
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from blooddonor.helper.bitmap_index import FACETS, donor_index
+from blooddonor.helper.cache import facets_of, search_cache
+from blooddonor.helper.donor_stats import donor_stats
+from blooddonor.helper.principal_cache import principal_cache
+from blooddonor.models.schedulermodel import DonorEligibilityModel
+from blooddonor.models.usermodel import DonorModel
+
+logger = logging.getLogger(__name__)
+
+# time between two donations
+DONATION_INTERVAL = datetime.timedelta(days=90)
+
+# donors falling due within this long of each other are enabled together
+BATCH_WINDOW = datetime.timedelta(seconds=1)
+
+# wait after a failed run before trying again
+RETRY_DELAY_SECONDS = 5
+
+
+def _aware(value: datetime.datetime) -> datetime.datetime:
+    # SQLite hands datetimes back without the timezone they were stored in
+    if value.tzinfo is None:
+        return value.replace(tzinfo=datetime.UTC)
+    return value
+
+
+async def enable_donors(db: Session, *where: ColumnElement[bool]) -> int:
+    """
+    Make the unavailable donors matching `where` available and commit.
+    Returns the number of donors updated.
+    """
+    result = await db.execute(
+        update(DonorModel)
+        .where(DonorModel.is_available == false(), *where)
+        .values(is_available=True)
+        .returning(DonorModel.id, *(getattr(DonorModel, facet) for facet in FACETS))
+        .execution_options(synchronize_session=False)
+    )
+    updated = result.all()
+    await db.commit()
+
+    donor_index.mark_available((row.id for row in updated), True)
+    search_cache.invalidate(*(facets_of(row) for row in updated))
+    principal_cache.invalidate(*(row.id for row in updated))
+    donor_stats.made_available(len(updated))
+    return len(updated)
+
+
+class EligibilityScheduler:
+    """
+    Makes donors available again the moment their donation interval ends.
+
+    The eligibility times live in `DonorEligibilityModel`, which stays the source
+    of truth. This process keeps them in a min-heap as well and sleeps until the
+    earliest one is due. Heap entries are never removed on cancel or reschedule,
+    a stale entry only wakes the scheduler up to find nothing due in the table.
+
+    `schedule` and `cancel` leave committing to the caller, so the eligibility
+    time is stored in the same transaction as the donor's availability.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = 0
+        self.wakeups = 0
+        self._heap: list[tuple[datetime.datetime, str]] = []
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    async def load(self, db: Session) -> None:
+        rows = await db.execute(
+            select(DonorEligibilityModel.eligible_at, DonorEligibilityModel.donor_id)
+        )
+        # kept alongside the entries scheduled meanwhile, duplicates are harmless
+        self._heap.extend(
+            (_aware(eligible_at), donor_id) for eligible_at, donor_id in rows
+        )
+        heapq.heapify(self._heap)
+        self._wake()
+
+    async def schedule(
+        self, db: Session, donor_id: str, eligible_at: datetime.datetime
+    ) -> None:
+        eligible_at = _aware(eligible_at)
+        await db.merge(
+            DonorEligibilityModel(donor_id=donor_id, eligible_at=eligible_at)
+        )
+        heapq.heappush(self._heap, (eligible_at, donor_id))
+        if self._heap[0] == (eligible_at, donor_id):
+            self._wake()
+
+    async def cancel(self, db: Session, donor_id: str) -> None:
+        await db.execute(
+            delete(DonorEligibilityModel).where(
+                DonorEligibilityModel.donor_id == donor_id
+            )
+        )
+
+    def next_due(self) -> datetime.datetime | None:
+        return self._heap[0][0] if self._heap else None
+
+    async def run_due(self, db: Session) -> int:
+        """
+        Enable the donors due now or within `BATCH_WINDOW`, returns how many.
+        """
+        cutoff = datetime.datetime.now(datetime.UTC) + BATCH_WINDOW
+        due = DonorEligibilityModel.eligible_at <= cutoff
+        donor_ids = (
+            await db.scalars(select(DonorEligibilityModel.donor_id).where(due))
+        ).all()
+        enabled = 0
+        if donor_ids:
+            await db.execute(
+                delete(DonorEligibilityModel).where(
+                    DonorEligibilityModel.donor_id.in_(donor_ids), due
+                )
+            )
+            enabled = await enable_donors(db, DonorModel.id.in_(donor_ids))
+            self.enabled += enabled
+            logger.info(f"Donor eligibility enabled {enabled} donors.")
+        while self._heap and self._heap[0][0] <= cutoff:
+            heapq.heappop(self._heap)
+        return enabled
+
+    def start(self, session_factory: async_sessionmaker[Session]) -> None:
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(session_factory))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict[str, int | str | None]:
+        next_due = self.next_due()
+        return {
+            "pending": len(self._heap),
+            "enabled": self.enabled,
+            "wakeups": self.wakeups,
+            "next_due": next_due.isoformat() if next_due else None,
+        }
+
+    def _wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self, session_factory: async_sessionmaker[Session]) -> None:
+        try:
+            async with session_factory() as db:
+                await self.load(db)
+        except Exception as e:
+            # the periodic availability job still covers the donors
+            logger.error(f"Error loading donor eligibility: {str(e)}")
+        while True:
+            self._wakeup.clear()
+            next_due = self.next_due()
+            delay = None
+            if next_due is not None:
+                delay = (next_due - datetime.datetime.now(datetime.UTC)).total_seconds()
+            if delay is None or delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except TimeoutError:
+                    pass
+                continue
+
+            self.wakeups += 1
+            try:
+                async with session_factory() as db:
+                    await self.run_due(db)
+            except Exception as e:
+                logger.error(f"Error enabling eligible donors: {str(e)}")
+                await asyncio.sleep(RETRY_DELAY_SECONDS)
+
+
+eligibility_scheduler = EligibilityScheduler()
@@ -1,52 +1,54 @@
 import datetime
 import logging
-from pathlib import Path
 from typing import Any
 
-import emails
-from emails.template import JinjaTemplate
 from jose import JWTError, jwt
+from sqlalchemy.ext.asyncio import AsyncSession as Session
 
 from blooddonor.core.config import settings
+from blooddonor.helper.email_templates import email_templates
+from blooddonor.helper.outbox import outbox_worker
+from blooddonor.models.outboxmodel import EmailOutboxModel
 
 
 async def send_email(
+    db: Session,
     email_to: str,
-    subject_template: str = "",
-    html_template: str = "",
+    subject: str = "",
+    template_name: str = "",
     environment: dict[str, Any] = {},  # noqa
 ) -> None:
-    assert settings.EMAILS_ENABLED, "no provided configuration for email variables"
-
-    message = emails.Message(
-        subject=JinjaTemplate(subject_template),
-        html=JinjaTemplate(html_template),
-        mail_from=(settings.EMAILS_FROM_NAME, settings.EMAILS_FROM_EMAIL),
+    """
+    Render the email and queue it in the outbox, the outbox worker delivers it.
+    """
+    if not settings.EMAILS_ENABLED:
+        logging.warning(f"Emails are not configured, not sending email to {email_to}")
+        return
+
+    db.add(
+        EmailOutboxModel(
+            email_to=email_to,
+            subject=subject,
+            html=email_templates.render(template_name, **environment),
+        )
     )
-
-    smtp_options = {"host": settings.SMTP_HOST, "port": settings.SMTP_PORT}
-    if settings.SMTP_TLS:
-        smtp_options["tls"] = True
-    if settings.SMTP_USER:
-        smtp_options["user"] = settings.SMTP_USER
-    if settings.SMTP_PASSWORD:
-        smtp_options["password"] = settings.SMTP_PASSWORD
-    response = message.send(to=email_to, render=environment, smtp=smtp_options)
-    logging.info(f"send email result: {response}")
+    await db.commit()
+    outbox_worker.wake()
 
 
-async def send_reset_password_email(username: str, email: str, token: str) -> None:
+async def send_reset_password_email(
+    db: Session, username: str, email: str, token: str
+) -> None:
     project_name = settings.PROJECT_NAME
     subject = f"{project_name} - Password recovery for user {email}"
-    with open(Path(settings.EMAIL_TEMPLATES_DIR) / "reset_password.html") as f:
-        template_str = f.read()
 
     server_host = settings.FRONTEND_HOST
     link = f"{server_host}{settings.API_V1_STR[1:]}/reset-password?token={token}"
     await send_email(
+        db,
         email_to=email,
-        subject_template=subject,
-        html_template=template_str,
+        subject=subject,
+        template_name="reset_password.html",
         environment={
             "project_name": settings.PROJECT_NAME,
             "username": username,
@@ -57,18 +59,19 @@ async def send_reset_password_email(username: str, email: str, token: str) -> No
     )
 
 
-async def send_new_account_email(username: str, email: str, token: str) -> None:
+async def send_new_account_email(
+    db: Session, username: str, email: str, token: str
+) -> None:
     project_name = settings.PROJECT_NAME
     subject = f"{project_name} - Account Activation for user {email}"
-    with open(Path(settings.EMAIL_TEMPLATES_DIR) / "account_verification.html") as f:
-        template_str = f.read()
 
     server_host = settings.FRONTEND_HOST
     link = f"{server_host}{settings.API_V1_STR[1:]}/verify-account?token={token}"
     await send_email(
+        db,
         email_to=email,
-        subject_template=subject,
-        html_template=template_str,
+        subject=subject,
+        template_name="account_verification.html",
         environment={
             "project_name": settings.PROJECT_NAME,
             "username": username,
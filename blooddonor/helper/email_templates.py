@@ -0,0 +1,50 @@
+from typing import Any
+
+from jinja2 import Environment, FileSystemLoader, Template
+
+from blooddonor.core.config import settings
+
+
+class EmailTemplates:
+    """
+    The email templates of `EMAIL_TEMPLATES_DIR`, compiled once by a shared Jinja
+    environment.
+
+    With `auto_reload` every render checks the template file's modification time
+    and recompiles a changed template, for editing the templates in development.
+    """
+
+    def __init__(self, directory: str, *, auto_reload: bool = False) -> None:
+        self.auto_reload = auto_reload
+        self.environment = Environment(
+            loader=FileSystemLoader(directory),
+            auto_reload=auto_reload,
+            # compiled templates are kept by `load`, not by the environment
+            cache_size=-1 if auto_reload else 0,
+        )
+        self._templates: dict[str, Template] = {}
+
+    def load(self) -> None:
+        """
+        Compile every template of the directory up front.
+        """
+        self._templates = {
+            name: self.environment.get_template(name)
+            for name in self.environment.list_templates(extensions=["html"])
+        }
+
+    def get(self, name: str) -> Template:
+        if self.auto_reload:
+            return self.environment.get_template(name)
+        template = self._templates.get(name)
+        if template is None:
+            template = self._templates[name] = self.environment.get_template(name)
+        return template
+
+    def render(self, name: str, **context: Any) -> str:
+        return self.get(name).render(**context)
+
+
+email_templates = EmailTemplates(
+    settings.EMAIL_TEMPLATES_DIR, auto_reload=settings.EMAIL_TEMPLATES_AUTO_RELOAD
+)
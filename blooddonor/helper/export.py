@@ -0,0 +1,81 @@
+import csv
+import io
+import json
+from collections.abc import AsyncIterator, Sequence
+from typing import Any
+
+from pydantic import BaseModel
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from blooddonor.core.config import settings
+
+NDJSON = "application/x-ndjson"
+CSV = "text/csv"
+EXPORT_MEDIA_TYPES = (NDJSON, CSV)
+
+
+def export_media_type(accept: str | None) -> str | None:
+    """
+    The streamed export format asked for in an `Accept` header, if any.
+    """
+    if not accept:
+        return None
+    for media_range in accept.split(","):
+        media_type = media_range.split(";")[0].strip().lower()
+        if media_type in EXPORT_MEDIA_TYPES:
+            return media_type
+    return None
+
+
+def _csv_header(schema: type[BaseModel]) -> list[str]:
+    return list(schema.model_fields)
+
+
+def _csv_row(item: BaseModel, header: Sequence[str]) -> list[Any]:
+    data = item.model_dump(mode="json")
+    # nested models (the donor profile) go into a single JSON encoded cell
+    return [
+        json.dumps(data[name]) if isinstance(data[name], dict | list) else data[name]
+        for name in header
+    ]
+
+
+def _encode_batch(
+    rows: Sequence[Any], schema: type[BaseModel], media_type: str
+) -> bytes:
+    items = [schema.model_validate(row, from_attributes=True) for row in rows]
+    if media_type == NDJSON:
+        return b"".join(item.model_dump_json().encode() + b"\n" for item in items)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header = _csv_header(schema)
+    writer.writerows(_csv_row(item, header) for item in items)
+    return buffer.getvalue().encode()
+
+
+async def stream_rows(
+    bind: AsyncEngine,
+    query: Select,
+    schema: type[BaseModel],
+    media_type: str,
+    *,
+    batch_size: int | None = None,
+) -> AsyncIterator[bytes]:
+    """
+    Encode the rows of `query` batch by batch from a server side cursor, so memory
+    is bounded by the batch size instead of the result size.
+
+    `query` selects the columns of `schema`. The generator runs after the endpoint
+    returned, so it opens its own session rather than borrowing the request one.
+    """
+    batch_size = batch_size or settings.EXPORT_BATCH_SIZE
+    if media_type == CSV:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(_csv_header(schema))
+        yield buffer.getvalue().encode()
+
+    async with AsyncSession(bind, expire_on_commit=False) as session:
+        result = await session.stream(query.execution_options(yield_per=batch_size))
+        async for rows in result.partitions():
+            yield _encode_batch(rows, schema, media_type)
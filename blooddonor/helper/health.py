@@ -0,0 +1,126 @@
+import asyncio
+import datetime
+import shutil
+import time
+from collections.abc import Awaitable, Callable
+
+from apscheduler.schedulers.base import BaseScheduler
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession as Session
+from sqlalchemy.pool import QueuePool
+
+from blooddonor.core.config import settings
+from blooddonor.helper import image
+from blooddonor.helper.scheduler import DONOR_AVAILABILITY_JOB
+from blooddonor.helper.storage import LocalStorage
+from blooddonor.schemas.health import DependencyCheck, Readiness
+
+
+async def _timed(check: Callable[[], Awaitable[str | None]]) -> DependencyCheck:
+    """
+    Run a check, which returns a detail or raises when the dependency fails.
+    """
+    start = time.perf_counter()
+    try:
+        detail = await check()
+        ok = True
+    except Exception as e:
+        detail = str(e) or type(e).__name__
+        ok = False
+    latency_ms = round((time.perf_counter() - start) * 1000, 2)
+    return DependencyCheck(ok=ok, latency_ms=latency_ms, detail=detail)
+
+
+class ReadinessProbe:
+    """
+    Whether this process can serve requests, by checking the database, its
+    connection pool, the job scheduler and the image storage.
+
+    A result is reused for `READINESS_CACHE_SECONDS` and concurrent probes wait
+    for the same check, so frequent load balancer probes don't add load to a
+    struggling instance.
+    """
+
+    def __init__(self) -> None:
+        self._result: Readiness | None = None
+        self._checked = 0.0
+        self._pending: asyncio.Task | None = None
+
+    async def check(self, db: Session, scheduler: BaseScheduler | None) -> Readiness:
+        if (
+            self._result is not None
+            and time.monotonic() - self._checked < settings.READINESS_CACHE_SECONDS
+        ):
+            return self._result
+        if self._pending is None:
+            self._pending = asyncio.create_task(self._check(db, scheduler))
+        pending = self._pending
+        try:
+            return await asyncio.shield(pending)
+        finally:
+            if self._pending is pending and pending.done():
+                self._pending = None
+
+    async def _check(self, db: Session, scheduler: BaseScheduler | None) -> Readiness:
+        checks = dict(
+            zip(
+                ("database", "db_pool", "scheduler", "image_storage"),
+                await asyncio.gather(
+                    _timed(lambda: self._check_database(db)),
+                    _timed(lambda: self._check_pool(db)),
+                    _timed(lambda: self._check_scheduler(scheduler)),
+                    _timed(self._check_image_storage),
+                ),
+                strict=True,
+            )
+        )
+        self._result = Readiness(
+            ready=all(check.ok for check in checks.values()),
+            checked_at=datetime.datetime.now(datetime.UTC),
+            checks=checks,
+        )
+        self._checked = time.monotonic()
+        return self._result
+
+    @staticmethod
+    async def _check_database(db: Session) -> None:
+        # the timeout covers waiting for a pooled connection as well
+        async with asyncio.timeout(settings.READINESS_DB_TIMEOUT_SECONDS):
+            await db.execute(text("SELECT 1"))
+
+    @staticmethod
+    async def _check_pool(db: Session) -> str:
+        pool = db.get_bind().pool
+        if not isinstance(pool, QueuePool):
+            return f"{type(pool).__name__} isn't limited"
+        limit = pool.size() + max(pool._max_overflow, 0)
+        checked_out = pool.checkedout()
+        if pool._max_overflow >= 0 and checked_out >= limit:
+            raise RuntimeError(f"All {limit} connections are checked out")
+        return f"{checked_out} of {limit} connections checked out"
+
+    @staticmethod
+    async def _check_scheduler(scheduler: BaseScheduler | None) -> str:
+        if scheduler is None or not scheduler.running:
+            raise RuntimeError("The scheduler isn't running")
+        job = scheduler.get_job(DONOR_AVAILABILITY_JOB)
+        if job is None or job.next_run_time is None:
+            raise RuntimeError(f"The {DONOR_AVAILABILITY_JOB} job isn't scheduled")
+        # a run may start up to the jitter late, give it a minute on top of that
+        grace = datetime.timedelta(seconds=settings.SCHEDULER_JITTER_SECONDS + 60)
+        if job.next_run_time < datetime.datetime.now(datetime.UTC) - grace:
+            raise RuntimeError(f"The {DONOR_AVAILABILITY_JOB} job is overdue")
+        return f"Next run at {job.next_run_time.isoformat()}"
+
+    @staticmethod
+    async def _check_image_storage() -> str:
+        storage = image.image_storage
+        if not isinstance(storage, LocalStorage):
+            return f"{type(storage).__name__} has no local disk"
+        usage = await asyncio.to_thread(shutil.disk_usage, storage.directory)
+        if usage.free < settings.READINESS_MIN_FREE_DISK_BYTES:
+            raise RuntimeError(f"Only {usage.free} bytes free for images")
+        return f"{usage.free} bytes free"
+
+
+readiness_probe = ReadinessProbe()
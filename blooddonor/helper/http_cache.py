@@ -0,0 +1,94 @@
+import hashlib
+from collections import defaultdict
+from typing import Any, NamedTuple
+
+from fastapi import Response, status
+
+from blooddonor.core.config import settings
+from blooddonor.helper.cache import TTLCache
+
+# responses whose URL changes with their content, e.g. images named by content hash
+IMMUTABLE = "public, max-age=31536000, immutable"
+# responses which may be stored but are revalidated with their ETag on every use
+REVALIDATE = "no-cache"
+
+
+def content_etag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Whether an `If-None-Match` header matches `etag`, by the weak comparison
+    used for GET requests.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in tags
+
+
+def not_modified(etag: str, cache_control: str, **headers: str) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": etag, "Cache-Control": cache_control, **headers},
+    )
+
+
+class ProfileValidator(NamedTuple):
+    # ETag of the read_profile response
+    etag: str
+    # content hash of the profile image variants
+    img_hash: str | None
+
+
+class ProfileValidators:
+    """
+    The validators of each donor's profile as last read from the database, so a
+    conditional request for an unchanged profile or profile image is answered
+    with 304 without touching the database.
+
+    Profile writes of this process bump the donor's version stamp, an entry is only
+    used while its stamp is current. Other workers see a write once the entry
+    expires after `PROFILE_VALIDATOR_TTL_SECONDS`.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self._cache = TTLCache(maxsize, ttl)
+        self._versions: defaultdict[str, int] = defaultdict(int)
+
+    def version(self, user_id: Any) -> int:
+        """
+        Take before reading the profile and pass to `set`, a write racing with the
+        read then keeps the validator out of the cache.
+        """
+        return self._versions[str(user_id)]
+
+    def get(self, user_id: Any) -> ProfileValidator | None:
+        key = str(user_id)
+        entry = self._cache.get(key)
+        if entry is None or entry[0] != self._versions[key]:
+            return None
+        return entry[1]
+
+    def set(self, user_id: Any, version: int, validator: ProfileValidator) -> None:
+        key = str(user_id)
+        if version == self._versions[key]:
+            self._cache.set(key, (version, validator))
+
+    def invalidate(self, *user_ids: Any) -> None:
+        for user_id in user_ids:
+            key = str(user_id)
+            self._versions[key] += 1
+            self._cache.pop(key)
+
+    def stats(self) -> dict[str, int]:
+        return self._cache.stats()
+
+
+profile_validators = ProfileValidators(
+    maxsize=settings.PROFILE_VALIDATOR_MAX_ENTRIES,
+    ttl=settings.PROFILE_VALIDATOR_TTL_SECONDS,
+)
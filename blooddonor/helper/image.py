@@ -1,10 +1,256 @@
-from PIL import Image
+import asyncio
+import hashlib
+import multiprocessing
+from collections.abc import Callable, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Any
+
+from fastapi import Response, UploadFile
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
+from PIL import Image, UnidentifiedImageError
+
+from blooddonor.core.config import settings
+from blooddonor.helper.http_cache import IMMUTABLE
+from blooddonor.helper.storage import Storage, create_storage
 
 STATIC_DIR = "./blooddonor/static"
 
+# the default image of donors without an uploaded one
+DEFAULT_PROFILE_IMG = "profile_img.png"
+
+# formats the profile images are stored in, best first, with their media types
+IMAGE_FORMATS = {"avif": "image/avif", "webp": "image/webp", "png": "image/png"}
+
+ENCODER_OPTIONS: dict[str, dict[str, Any]] = {
+    "avif": {"quality": 60},
+    "webp": {"quality": 80, "method": 4},
+    "png": {"optimize": False},
+}
+
+
+class InvalidImageError(ValueError):
+    pass
+
+
+class ImageTooLargeError(InvalidImageError):
+    pass
+
+
+def profile_image_name(img_hash: str, size: int, fmt: str) -> str:
+    return f"{img_hash}_{size}.{fmt}"
+
+
+def make_profile_images(
+    data: bytes, sizes: Sequence[int], formats: Sequence[str], max_pixels: int
+) -> tuple[str, dict[str, bytes]]:
+    """
+    Decode an uploaded image and encode a square-bounded variant of it for every
+    size and format. Returns the content hash of the upload and the variants by
+    file name. Runs in the image worker processes.
+    """
+    too_large = (
+        f"The image is larger than {max_pixels} pixels, pls upload a smaller one"
+    )
+    try:
+        # only reads the header, the pixels are decoded by draft/thumbnail
+        img = Image.open(BytesIO(data))
+    except UnidentifiedImageError as e:
+        raise InvalidImageError("The file is not a supported image") from e
+    except Image.DecompressionBombError as e:
+        # the header declares over twice Pillow's own pixel limit
+        raise ImageTooLargeError(too_large) from e
+    if img.width * img.height > max_pixels:
+        raise ImageTooLargeError(too_large)
+    img_hash = hashlib.sha256(data).hexdigest()[:32]
+
+    variants = {}
+    try:
+        # JPEGs are decoded at the smallest scale still larger than the thumbnails
+        img.draft("RGB", (max(sizes), max(sizes)))
+        img.load()
+        img = img.convert("RGBA" if img.has_transparency_data else "RGB")
+        # every size is shrunk from the previous, larger one
+        for size in sorted(sizes, reverse=True):
+            img.thumbnail((size, size))
+            for fmt in formats:
+                output = BytesIO()
+                img.save(output, format=fmt.upper(), **ENCODER_OPTIONS[fmt])
+                variants[profile_image_name(img_hash, size, fmt)] = output.getvalue()
+    except OSError as e:
+        raise InvalidImageError("The image is damaged or truncated") from e
+    return img_hash, variants
+
+
+class ImageProcessPool:
+    """
+    Worker processes decoding, resizing and encoding uploaded images, so a large
+    photo doesn't hold the event loop (or the GIL) for the whole decode.
+    At most `workers` images are processed at once, the others wait in the
+    executor queue. With 0 workers images are processed inline on the event loop.
+    """
+
+    def __init__(self, workers: int) -> None:
+        self.workers = workers
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._executor: ProcessPoolExecutor | None = None
+
+    @property
+    def queue_depth(self) -> int:
+        return max(self.in_flight - self.workers, 0)
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self.workers <= 0:
+            return func(*args)
+        if self._executor is None:
+            # spawned, forking would copy the app's threads and open connections
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self.in_flight -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "peak_in_flight": self.peak_in_flight,
+        }
+
+
+image_process_pool = ImageProcessPool(settings.IMAGE_PROCESS_WORKERS)
+
+image_storage: Storage = create_storage()
+
+
+async def read_upload(file: UploadFile) -> bytes:
+    """
+    Read an uploaded file, refusing it once it is over `IMAGE_MAX_UPLOAD_BYTES`.
+    """
+    data = await file.read(settings.IMAGE_MAX_UPLOAD_BYTES + 1)
+    if len(data) > settings.IMAGE_MAX_UPLOAD_BYTES:
+        raise ImageTooLargeError(
+            f"The image is larger than {settings.IMAGE_MAX_UPLOAD_BYTES} bytes, "
+            "pls upload a smaller one"
+        )
+    return data
+
+
+async def save_image(file: UploadFile) -> str:
+    """
+    Store the profile image variants of an upload, returns their content hash.
+    """
+    data = await read_upload(file)
+    # PNG is stored as well, for clients accepting none of the other formats
+    formats = list(dict.fromkeys([*settings.PROFILE_IMG_FORMATS, "png"]))
+    img_hash, variants = await image_process_pool.run(
+        make_profile_images,
+        data,
+        settings.PROFILE_IMG_SIZES,
+        formats,
+        settings.IMAGE_MAX_PIXELS,
+    )
+    await asyncio.gather(
+        *(
+            image_storage.write(name, content, IMAGE_FORMATS[name.rsplit(".", 1)[1]])
+            for name, content in variants.items()
+        )
+    )
+    return img_hash
+
+
+def _accept_qualities(accept: str | None) -> dict[str, float]:
+    """
+    The media ranges of an `Accept` header and their quality values.
+    """
+    qualities = {}
+    for media_range in (accept or "").split(","):
+        media_type, *params = media_range.split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[media_type.strip().lower()] = quality
+    return qualities
+
+
+def profile_image_variants(
+    img_hash: str | None, size: int, accept: str | None
+) -> list[tuple[str, str]]:
+    """
+    File names and media types of the variants of a profile image which may serve
+    a request for `size` pixels, best first. The files aren't checked.
+
+    AVIF and WebP are offered when `accept` names them with a quality above zero,
+    PNG always. Higher quality values come first, then the smaller formats.
+    """
+    if not img_hash or "." in img_hash:
+        return []
+    sizes = sorted(settings.PROFILE_IMG_SIZES)
+    # the smallest variant at least as large as asked for
+    size = next((s for s in sizes if s >= size), sizes[-1])
+    qualities = _accept_qualities(accept)
+    formats = [
+        (fmt, media_type)
+        for fmt, media_type in IMAGE_FORMATS.items()
+        if fmt == "png" or qualities.get(media_type, 0) > 0
+    ]
+    # a stable sort, ties keep the order of IMAGE_FORMATS
+    formats.sort(key=lambda item: -qualities.get(item[1], 0))
+    return [
+        (profile_image_name(img_hash, size, fmt), media_type)
+        for fmt, media_type in formats
+    ]
+
+
+async def find_profile_image(
+    img_hash: str | None, size: int, accept: str | None
+) -> tuple[str, str] | None:
+    """
+    The stored variant of a profile image closest to `size`, in the best format
+    `accept` allows. Returns its name and media type.
+    """
+    for name, media_type in profile_image_variants(img_hash, size, accept):
+        if await image_storage.exists(name):
+            return name, media_type
+    return None
+
 
-async def save_image(file, user_id: str):
-    output_size = (150, 150)
-    img = Image.open(file.file)
-    img.thumbnail(output_size)
-    img.save(f"{STATIC_DIR}/images/{user_id}.png")
+def stored_image_response(
+    name: str, media_type: str | None = None, headers: dict[str, str] | None = None
+) -> Response:
+    """
+    Send a stored image, or redirect to the storage with `IMAGE_STORAGE_REDIRECT`
+    so the image doesn't pass through the app.
+    """
+    headers = headers or {}
+    expires = settings.IMAGE_STORAGE_URL_EXPIRE_SECONDS
+    url = image_storage.url(name, expires)
+    if settings.IMAGE_STORAGE_REDIRECT and url:
+        if not image_storage.public_url and headers.get("Cache-Control") == IMMUTABLE:
+            # the presigned URL expires, the redirect mustn't outlive it
+            headers = {**headers, "Cache-Control": f"public, max-age={expires // 2}"}
+        return RedirectResponse(url, status_code=307, headers=headers)
+    path = image_storage.path(name)
+    if path:
+        return FileResponse(path, media_type=media_type, headers=headers)
+    return StreamingResponse(
+        image_storage.read(name), media_type=media_type, headers=headers
+    )
@@ -0,0 +1,514 @@
+import asyncio
+import bisect
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import time
+from collections import defaultdict
+from collections.abc import Callable, Sequence
+from pathlib import Path
+
+from sqlalchemy.pool import QueuePool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from blooddonor.core.config import settings
+from blooddonor.core.security import password_hash_pool
+from blooddonor.db.session import engine
+from blooddonor.helper.cache import search_cache
+from blooddonor.helper.http_cache import profile_validators
+from blooddonor.helper.image import image_process_pool
+from blooddonor.helper.principal_cache import principal_cache
+from blooddonor.helper.query_timing import route_template
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_HEADER = struct.Struct("<Q")
+_KEY_LENGTH = struct.Struct("<I")
+_VALUE = struct.Struct("<d")
+
+
+class _LocalValue:
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def get(self) -> float:
+        return self.value
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float) -> None:
+        self.value += amount
+
+
+class LocalValues:
+    """
+    The metric values of a single process app, plain floats updated by the event
+    loop without locking.
+    """
+
+    def __init__(self) -> None:
+        self._values: dict[str, _LocalValue] = {}
+
+    def value(self, key: str) -> _LocalValue:
+        value = self._values.get(key)
+        if value is None:
+            value = self._values[key] = _LocalValue()
+        return value
+
+    def collect(self) -> dict[str, float]:
+        return {key: value.get() for key, value in self._values.items()}
+
+
+class _MmapValue:
+    def __init__(self, values: "MmapValues", position: int) -> None:
+        self._values = values
+        self._position = position
+
+    def get(self) -> float:
+        return _VALUE.unpack_from(self._values.mmap, self._position)[0]
+
+    def set(self, value: float) -> None:
+        _VALUE.pack_into(self._values.mmap, self._position, value)
+
+    def inc(self, amount: float) -> None:
+        self.set(self.get() + amount)
+
+
+def _entries(data: bytes | mmap.mmap) -> dict[str, int]:
+    """
+    The keys of a metrics file and the positions of their values. The file has a
+    header holding the bytes in use, then every key length, key padded for its
+    value to align to 8 bytes, and value.
+    """
+    used = _HEADER.unpack_from(data, 0)[0]
+    entries = {}
+    position = _HEADER.size
+    while position < used:
+        length = _KEY_LENGTH.unpack_from(data, position)[0]
+        position += _KEY_LENGTH.size
+        key = bytes(data[position : position + length]).decode()
+        position += length + (-(_KEY_LENGTH.size + length) % 8)
+        entries[key] = position
+        position += _VALUE.size
+    return entries
+
+
+def _read_values(data: bytes | mmap.mmap) -> dict[str, float]:
+    return {
+        key: _VALUE.unpack_from(data, position)[0]
+        for key, position in _entries(data).items()
+    }
+
+
+class MmapValues:
+    """
+    The metric values of one app process in a memory mapped file of
+    `METRICS_MULTIPROC_DIR`, so the process serving a scrape can add up the
+    values of all of them. Only the owning process writes its file. The files
+    of earlier runs are removed before the workers start, see serve.py.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = Path(directory)
+        self.path = self.directory / f"{os.getpid()}.db"
+        self._file = open(self.path, "a+b")
+        size = os.fstat(self._file.fileno()).st_size
+        if size == 0:
+            size = 64 * 1024
+            self._file.truncate(size)
+        self.mmap = mmap.mmap(self._file.fileno(), size)
+        self._size = size
+        self._used = _HEADER.unpack_from(self.mmap, 0)[0] or _HEADER.size
+        # a file left by an earlier worker of this run with the same pid is carried
+        # on, its counters are part of the totals either way
+        self._values = {
+            key: _MmapValue(self, position)
+            for key, position in _entries(self.mmap).items()
+        }
+
+    def value(self, key: str) -> _MmapValue:
+        value = self._values.get(key)
+        if value is None:
+            encoded = key.encode()
+            padding = b" " * (-(_KEY_LENGTH.size + len(encoded)) % 8)
+            entry = (
+                _KEY_LENGTH.pack(len(encoded)) + encoded + padding + _VALUE.pack(0.0)
+            )
+            while self._used + len(entry) > self._size:
+                self._size *= 2
+                self._file.truncate(self._size)
+                previous, self.mmap = (
+                    self.mmap,
+                    mmap.mmap(self._file.fileno(), self._size),
+                )
+                previous.close()
+            self.mmap[self._used : self._used + len(entry)] = entry
+            self._used += len(entry)
+            # readers only look at complete entries
+            _HEADER.pack_into(self.mmap, 0, self._used)
+            value = self._values[key] = _MmapValue(self, self._used - _VALUE.size)
+        return value
+
+    def collect(self) -> dict[str, float]:
+        """
+        The values of all the processes, summed up. Gauges of processes which
+        are gone are left out.
+        """
+        totals: defaultdict[str, float] = defaultdict(float)
+        for path in self.directory.glob("*.db"):
+            pid = int(path.stem)
+            alive = _is_alive(pid)
+            data = self.mmap if path == self.path else path.read_bytes()
+            for key, value in _read_values(data).items():
+                if alive or registry.kind_of(key) != "gauge":
+                    totals[key] += value
+        return dict(totals)
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _key(name: str, labels: Sequence[tuple[str, str]]) -> str:
+    return json.dumps([name, labels])
+
+
+class _Child:
+    def __init__(self, metric: "Metric", labels: list[tuple[str, str]]) -> None:
+        self._value = registry.values.value(_key(metric.name, labels))
+
+    def inc(self, amount: float = 1) -> None:
+        self._value.inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self._value.inc(-amount)
+
+    def set(self, value: float) -> None:
+        self._value.set(value)
+
+
+class _HistogramChild:
+    def __init__(self, metric: "Histogram", labels: list[tuple[str, str]]) -> None:
+        values = registry.values
+        self._bounds = metric.buckets
+        # counted per bucket, made cumulative by the exposition
+        self._buckets = [
+            values.value(
+                _key(f"{metric.name}_bucket", [*labels, ("le", _format(bound))])
+            )
+            for bound in metric.buckets
+        ]
+        self._sum = values.value(_key(f"{metric.name}_sum", labels))
+        self._count = values.value(_key(f"{metric.name}_count", labels))
+
+    def observe(self, value: float) -> None:
+        self._buckets[bisect.bisect_left(self._bounds, value)].inc(1)
+        self._sum.inc(value)
+        self._count.inc(1)
+
+
+class Metric:
+    kind = ""
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], _Child | _HistogramChild] = {}
+        registry.register(self)
+
+    def labels(self, *values: str) -> _Child:
+        child = self._children.get(values)
+        if child is None:
+            labels = list(zip(self.labelnames, values, strict=True))
+            child = self._children[values] = self._child(labels)
+        return child
+
+    def _child(self, labels: list[tuple[str, str]]) -> _Child | _HistogramChild:
+        return _Child(self, labels)
+
+
+class Counter(Metric):
+    """
+    A total only ever going up. `set` is for totals counted elsewhere, e.g. the
+    hits of a cache.
+    """
+
+    kind = "counter"
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.buckets = (*sorted(buckets), math.inf)
+        super().__init__(name, documentation, labelnames)
+
+    def labels(self, *values: str) -> _HistogramChild:
+        return super().labels(*values)
+
+    def _child(self, labels: list[tuple[str, str]]) -> _HistogramChild:
+        return _HistogramChild(self, labels)
+
+
+def _format(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _sample(name: str, labels: Sequence[tuple[str, str]], value: float) -> str:
+    if labels:
+        pairs = ",".join(f'{label}="{_escape(val)}"' for label, val in labels)
+        return f"{name}{{{pairs}}} {_format(value)}"
+    return f"{name} {_format(value)}"
+
+
+class Registry:
+    """
+    The metrics of the app and their values, exposed in the Prometheus text
+    format.
+
+    Values are kept by the process updating them, without locks, in
+    `LocalValues` or, with `METRICS_MULTIPROC_DIR` set for several app processes,
+    in `MmapValues` adding up the values of every process on exposition.
+    Samplers copy the stats kept by the pools and caches into their metrics,
+    before every exposition and every `METRICS_SAMPLE_SECONDS` in the background
+    so the other processes' files stay current.
+    """
+
+    def __init__(self) -> None:
+        self.metrics: dict[str, Metric] = {}
+        self.values: LocalValues | MmapValues = (
+            MmapValues(settings.METRICS_MULTIPROC_DIR)
+            if settings.METRICS_MULTIPROC_DIR
+            else LocalValues()
+        )
+        self.samplers: list[Callable[[], None]] = []
+        self._task: asyncio.Task | None = None
+
+    def register(self, metric: Metric) -> None:
+        self.metrics[metric.name] = metric
+
+    def kind_of(self, key: str) -> str | None:
+        name = json.loads(key)[0]
+        metric = self.metrics.get(name) or self.metrics.get(name.rsplit("_", 1)[0])
+        return metric.kind if metric else None
+
+    def sample(self) -> None:
+        for sampler in self.samplers:
+            try:
+                sampler()
+            except Exception as e:
+                logger.error(f"Error sampling metrics: {str(e)}")
+
+    def render(self) -> str:
+        self.sample()
+        samples: defaultdict[str, list[tuple[str, list[list[str]], float]]] = (
+            defaultdict(list)
+        )
+        for key, value in sorted(self.values.collect().items()):
+            name, labels = json.loads(key)
+            metric = self.metrics.get(name) or self.metrics.get(name.rsplit("_", 1)[0])
+            if metric is not None:
+                samples[metric.name].append((name, labels, value))
+
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            if metric.kind == "histogram":
+                lines.extend(self._render_histogram(metric, samples[metric.name]))
+            else:
+                lines.extend(_sample(*sample) for sample in samples[metric.name])
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_histogram(
+        metric: Histogram, samples: list[tuple[str, list[list[str]], float]]
+    ) -> list[str]:
+        series: defaultdict[tuple, dict[str, float]] = defaultdict(dict)
+        for name, labels, value in samples:
+            le = next((val for label, val in labels if label == "le"), None)
+            labels = tuple((label, val) for label, val in labels if label != "le")
+            suffix = name.removeprefix(metric.name)
+            series[labels][le if suffix == "_bucket" else suffix] = value
+        lines = []
+        for labels, values in series.items():
+            cumulative = 0.0
+            for bound in metric.buckets:
+                cumulative += values.get(_format(bound), 0.0)
+                lines.append(
+                    _sample(
+                        f"{metric.name}_bucket",
+                        [*labels, ("le", _format(bound))],
+                        cumulative,
+                    )
+                )
+            lines.append(_sample(f"{metric.name}_sum", labels, values.get("_sum", 0)))
+            lines.append(
+                _sample(f"{metric.name}_count", labels, values.get("_count", 0))
+            )
+        return lines
+
+    def start(self) -> None:
+        if isinstance(self.values, MmapValues):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            self.sample()
+            await asyncio.sleep(settings.METRICS_SAMPLE_SECONDS)
+
+
+registry = Registry()
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "Requests answered, by route and status code",
+    ["method", "route", "status"],
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time taken to answer requests, by route",
+    ["method", "route"],
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests being answered", ["method"]
+)
+DB_POOL_SIZE = Gauge("db_pool_size", "Connections kept by the database pool")
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "Database connections in use by sessions"
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow", "Database connections open beyond the pool size"
+)
+WORKER_POOL_IN_FLIGHT = Gauge(
+    "worker_pool_in_flight",
+    "Tasks running or waiting in the password hashing and image worker pools",
+    ["pool"],
+)
+WORKER_POOL_QUEUE_DEPTH = Gauge(
+    "worker_pool_queue_depth",
+    "Tasks waiting for a worker of the password hashing and image pools",
+    ["pool"],
+)
+SCHEDULER_JOB_DURATION = Histogram(
+    "scheduler_job_duration_seconds",
+    "Time taken by the scheduler jobs, by outcome",
+    ["job", "status"],
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300, 900),
+)
+CACHE_HITS = Counter("cache_hits_total", "Lookups answered by a cache", ["cache"])
+CACHE_MISSES = Counter(
+    "cache_misses_total", "Lookups a cache couldn't answer", ["cache"]
+)
+
+
+def _sample_db_pool() -> None:
+    pool = engine.pool
+    if isinstance(pool, QueuePool):
+        DB_POOL_SIZE.labels().set(pool.size())
+        DB_POOL_CHECKED_OUT.labels().set(pool.checkedout())
+        DB_POOL_OVERFLOW.labels().set(max(pool.overflow(), 0))
+
+
+def _sample_worker_pools() -> None:
+    for name, pool in (
+        ("password_hash", password_hash_pool),
+        ("image_process", image_process_pool),
+    ):
+        WORKER_POOL_IN_FLIGHT.labels(name).set(pool.in_flight)
+        WORKER_POOL_QUEUE_DEPTH.labels(name).set(pool.queue_depth)
+
+
+def _sample_caches() -> None:
+    for name, cache in (
+        ("search", search_cache),
+        ("principal", principal_cache),
+        ("profile_validator", profile_validators),
+    ):
+        stats = cache.stats()
+        CACHE_HITS.labels(name).set(stats["hits"])
+        CACHE_MISSES.labels(name).set(stats["misses"])
+
+
+registry.samplers += [_sample_db_pool, _sample_worker_pools, _sample_caches]
+
+
+class MetricsMiddleware:
+    """
+    Records the latency, status and concurrency of every request.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(method)
+        in_flight.inc()
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            in_flight.dec()
+            # unmatched paths aren't labels of their own, they are unbounded
+            route = route_template(scope) or "unmatched"
+            HTTP_REQUEST_DURATION.labels(method, route).observe(
+                time.perf_counter() - start
+            )
+            HTTP_REQUESTS.labels(method, route, str(status_code)).inc()
@@ -0,0 +1,167 @@
+import re
+from collections.abc import Sequence
+
+from sqlalchemy import (
+    ColumnElement,
+    Select,
+    and_,
+    column,
+    false,
+    func,
+    literal_column,
+    select,
+    table,
+    text,
+)
+from sqlalchemy.ext.asyncio import AsyncSession as Session
+
+from blooddonor.core.config import settings
+from blooddonor.models.usermodel import DONOR_NAME_FTS_TABLE, DonorModel
+
+# SQLite FTS5 index of donor names, kept in sync by triggers on donormodel
+donor_name_fts = table(
+    DONOR_NAME_FTS_TABLE, column("rowid"), column("full_name"), column("rank")
+)
+# index entries share the rowid of their donor
+donor_rowid = literal_column(f"{DonorModel.__tablename__}.rowid")
+
+# the trigram tokenizer can't match terms shorter than a trigram
+MIN_TERM_LENGTH = 3
+
+
+def _terms(name: str) -> list[str]:
+    return re.findall(r"\w+", name.lower())
+
+
+def _quote(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _trigrams(term: str) -> set[str]:
+    return {term[i : i + 3] for i in range(len(term) - 2)}
+
+
+def similarity(a: str, b: str) -> float:
+    """
+    Trigram similarity of two names, computed like `pg_trgm.similarity`.
+    """
+
+    def padded_trigrams(text: str) -> set[str]:
+        grams = set()
+        for word in _terms(text):
+            grams |= _trigrams(f"  {word} ")
+        return grams
+
+    a_grams, b_grams = padded_trigrams(a), padded_trigrams(b)
+    if not a_grams or not b_grams:
+        return 0.0
+    return len(a_grams & b_grams) / len(a_grams | b_grams)
+
+
+def _fts_query(name: str, *, fuzzy: bool) -> str | None:
+    terms = [term for term in _terms(name) if len(term) >= MIN_TERM_LENGTH]
+    if not terms:
+        return None
+    if fuzzy:
+        # any shared trigram makes a candidate, bm25 ranks those sharing the most
+        grams = set().union(*(_trigrams(term) for term in terms))
+        return " OR ".join(_quote(gram) for gram in sorted(grams))
+    # every term must appear as a substring of the name, which includes prefixes
+    return " AND ".join(_quote(term) for term in terms)
+
+
+def _fts_match(query: str) -> Select:
+    return select(donor_name_fts.c.rowid, donor_name_fts.c.rank).where(
+        literal_column(DONOR_NAME_FTS_TABLE).op("MATCH")(query)
+    )
+
+
+def _short_term_conditions(name: str) -> list[ColumnElement[bool]]:
+    return [
+        DonorModel.full_name.icontains(term, autoescape=True)
+        for term in _terms(name)
+        if len(term) < MIN_TERM_LENGTH
+    ]
+
+
+def name_condition(dialect_name: str, name: str) -> ColumnElement[bool]:
+    """
+    Index backed replacement of `full_name ILIKE '%name%'` usable as a where clause.
+    On Postgres the ILIKE itself is served by the gin_trgm_ops index on full_name.
+    """
+    query = _fts_query(name, fuzzy=False) if dialect_name == "sqlite" else None
+    if query is None:
+        return DonorModel.full_name.icontains(name, autoescape=True)
+    matches = _fts_match(query).with_only_columns(donor_name_fts.c.rowid)
+    return and_(donor_rowid.in_(matches), *_short_term_conditions(name))
+
+
+def ranked_name_search(
+    query: Select, dialect_name: str, name: str, *, fuzzy: bool = False
+) -> Select:
+    """
+    Restrict a select of DonorModel to donors matching `name`, best matches first.
+    Names starting with the query rank above the other matches. Fuzzy searches
+    return only the `NAME_SEARCH_FUZZY_CANDIDATES` best ranked candidates.
+    """
+    query = _ranked_name_search(query, dialect_name, name, fuzzy=fuzzy)
+    if fuzzy:
+        # ranked in the database, only the best candidates are compared in Python
+        query = query.limit(settings.NAME_SEARCH_FUZZY_CANDIDATES)
+    return query
+
+
+def _ranked_name_search(
+    query: Select, dialect_name: str, name: str, *, fuzzy: bool
+) -> Select:
+    starts_with = DonorModel.full_name.istartswith(name, autoescape=True)
+    if dialect_name == "postgresql":
+        condition = (
+            DonorModel.full_name.op("%")(name)
+            if fuzzy
+            else DonorModel.full_name.icontains(name, autoescape=True)
+        )
+        return query.where(condition).order_by(
+            starts_with.desc(), func.similarity(DonorModel.full_name, name).desc()
+        )
+
+    fts_query = _fts_query(name, fuzzy=fuzzy) if dialect_name == "sqlite" else None
+    if fts_query is None:
+        if fuzzy:
+            return query.where(false())
+        return query.where(name_condition(dialect_name, name)).order_by(
+            starts_with.desc(), DonorModel.full_name
+        )
+
+    matches = _fts_match(fts_query).subquery()
+    query = query.join(matches, matches.c.rowid == donor_rowid)
+    if not fuzzy:
+        query = query.where(*_short_term_conditions(name))
+    return query.order_by(starts_with.desc(), matches.c.rank)
+
+
+async def rebuild_name_index(db: Session) -> None:
+    """
+    Rebuild the SQLite FTS5 name index from donormodel. Its entries are keyed by
+    the donor rowids, which a VACUUM may renumber.
+    """
+    if db.bind.dialect.name != "sqlite":
+        return
+    await db.execute(
+        text(
+            f"INSERT INTO {DONOR_NAME_FTS_TABLE} ({DONOR_NAME_FTS_TABLE}) "
+            "VALUES ('rebuild')"
+        )
+    )
+    await db.commit()
+
+
+def filter_similar(donors: Sequence[DonorModel], name: str) -> list[DonorModel]:
+    """
+    Drop fuzzy candidates below the configured similarity, keeping the rank order.
+    """
+    return [
+        donor
+        for donor in donors
+        if similarity(donor.full_name, name) >= settings.NAME_SEARCH_SIMILARITY
+    ]
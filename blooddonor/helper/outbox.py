@@ -0,0 +1,303 @@
+import asyncio
+import datetime
+import logging
+import smtplib
+import time
+from email.message import EmailMessage
+from email.utils import formataddr
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession as Session
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm.attributes import set_committed_value
+
+from blooddonor.core.config import settings
+from blooddonor.models.outboxmodel import EmailOutboxModel
+
+logger = logging.getLogger(__name__)
+
+# a claimed email is left to its worker for this long before others may retry it,
+# the claim is renewed right before the email is sent
+CLAIM_TIMEOUT = datetime.timedelta(minutes=5)
+
+
+def _open_connection() -> smtplib.SMTP:
+    conn = smtplib.SMTP(
+        settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT_SECONDS
+    )
+    if settings.SMTP_TLS:
+        conn.starttls()
+    if settings.SMTP_USER:
+        conn.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+    return conn
+
+
+def _close_connection(conn: smtplib.SMTP) -> None:
+    try:
+        conn.quit()
+    except (smtplib.SMTPException, OSError):
+        conn.close()
+
+
+def _is_alive(conn: smtplib.SMTP) -> bool:
+    try:
+        return conn.noop()[0] == 250
+    except (smtplib.SMTPException, OSError):
+        return False
+
+
+class SMTPPool:
+    """
+    Persistent SMTP connections shared by the outbox deliveries.
+
+    smtplib blocks, so every SMTP command runs in a worker thread. A connection
+    is used by one delivery lane at a time, then kept open for the next batch
+    until it has been idle for `SMTP_IDLE_TIMEOUT_SECONDS`.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.opened = 0
+        self.reused = 0
+        self._idle: list[tuple[float, smtplib.SMTP]] = []
+        self._slots: asyncio.Semaphore | None = None
+
+    async def checkout(self) -> smtplib.SMTP:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+        await self._slots.acquire()
+        try:
+            while self._idle:
+                idle_since, conn = self._idle.pop()
+                fresh = (
+                    time.monotonic() - idle_since < settings.SMTP_IDLE_TIMEOUT_SECONDS
+                )
+                if fresh and await asyncio.to_thread(_is_alive, conn):
+                    self.reused += 1
+                    return conn
+                await asyncio.to_thread(_close_connection, conn)
+            conn = await asyncio.to_thread(_open_connection)
+            self.opened += 1
+            return conn
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def checkin(self, conn: smtplib.SMTP) -> None:
+        self._idle.append((time.monotonic(), conn))
+        self._slots.release()
+
+    async def discard(self, conn: smtplib.SMTP) -> None:
+        self._slots.release()
+        await asyncio.to_thread(_close_connection, conn)
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, []
+        for _, conn in idle:
+            await asyncio.to_thread(_close_connection, conn)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": self.size,
+            "idle": len(self._idle),
+            "opened": self.opened,
+            "reused": self.reused,
+        }
+
+
+def _message(email: EmailOutboxModel) -> EmailMessage:
+    message = EmailMessage()
+    message["Subject"] = email.subject
+    message["From"] = formataddr(
+        (settings.EMAILS_FROM_NAME, settings.EMAILS_FROM_EMAIL)
+    )
+    message["To"] = email.email_to
+    message.set_content(email.html, subtype="html")
+    return message
+
+
+class OutboxWorker:
+    """
+    Delivers the emails queued in `EmailOutboxModel`.
+
+    Every drain claims up to `EMAIL_OUTBOX_BATCH_SIZE` due emails and spreads them
+    over the pooled SMTP connections, each connection sending its share one after
+    the other. Failed deliveries are retried with exponential backoff until
+    `EMAIL_OUTBOX_MAX_ATTEMPTS` is reached. Several processes may drain the same
+    outbox, claiming an email pushes its next attempt past `CLAIM_TIMEOUT`.
+    Each email is claimed again just before it is sent, an email whose claim ran
+    out while its lane was busy and which another process took over is skipped.
+
+    Delivery is at least once: an email is sent again when its send outlasts
+    the claim, or when the process dies before recording that it was sent.
+    """
+
+    def __init__(self, pool: SMTPPool) -> None:
+        self.pool = pool
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.skipped = 0
+        self.batches = 0
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def drain(self, db: Session) -> int:
+        """
+        Deliver one batch of due emails, returns the number of emails claimed.
+        """
+        now = datetime.datetime.now(datetime.UTC)
+        due = (
+            EmailOutboxModel.status == "pending",
+            EmailOutboxModel.next_attempt_at <= now,
+        )
+        ids = (
+            await db.scalars(
+                select(EmailOutboxModel.id)
+                .where(*due)
+                .order_by(EmailOutboxModel.next_attempt_at)
+                .limit(settings.EMAIL_OUTBOX_BATCH_SIZE)
+            )
+        ).all()
+        if not ids:
+            return 0
+        emails = (
+            await db.scalars(
+                update(EmailOutboxModel)
+                .where(EmailOutboxModel.id.in_(ids), *due)
+                .values(next_attempt_at=now + CLAIM_TIMEOUT)
+                .returning(EmailOutboxModel)
+                .execution_options(synchronize_session=False)
+            )
+        ).all()
+        await db.commit()
+
+        # the lanes share the session, one of them uses it at a time
+        db_lock = asyncio.Lock()
+        lanes = [emails[i :: self.pool.size] for i in range(self.pool.size)]
+        await asyncio.gather(
+            *(self._deliver(db, db_lock, lane) for lane in lanes if lane)
+        )
+        self.batches += 1
+        return len(emails)
+
+    @staticmethod
+    async def _renew_claim(db: Session, email: EmailOutboxModel) -> bool:
+        """
+        Extend the claim on an email about to be sent. False when the claim ran
+        out and another process has claimed the email since.
+        """
+        claim = datetime.datetime.now(datetime.UTC) + CLAIM_TIMEOUT
+        result = await db.execute(
+            update(EmailOutboxModel)
+            .where(
+                EmailOutboxModel.id == email.id,
+                EmailOutboxModel.status == "pending",
+                # the claim time of this process tells its claim apart
+                EmailOutboxModel.next_attempt_at == email.next_attempt_at,
+            )
+            .values(next_attempt_at=claim)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        if result.rowcount != 1:
+            return False
+        set_committed_value(email, "next_attempt_at", claim)
+        return True
+
+    async def _deliver(
+        self, db: Session, db_lock: asyncio.Lock, emails: list[EmailOutboxModel]
+    ) -> None:
+        conn = None
+        try:
+            for email in emails:
+                async with db_lock:
+                    if not await self._renew_claim(db, email):
+                        self.skipped += 1
+                        continue
+                try:
+                    if conn is None:
+                        conn = await self.pool.checkout()
+                    await asyncio.to_thread(conn.send_message, _message(email))
+                except (smtplib.SMTPException, OSError) as e:
+                    self._record_failure(email, e)
+                    # the connection itself is broken, reconnect for the next email
+                    if conn is not None and (
+                        isinstance(e, smtplib.SMTPServerDisconnected)
+                        or not isinstance(e, smtplib.SMTPException)
+                    ):
+                        await self.pool.discard(conn)
+                        conn = None
+                else:
+                    email.attempts += 1
+                    email.status = "sent"
+                    email.sent_on = datetime.datetime.now(datetime.UTC)
+                    email.last_error = None
+                    self.sent += 1
+                # recorded at once, a crash would send it again otherwise
+                async with db_lock:
+                    await db.commit()
+        finally:
+            if conn is not None:
+                self.pool.checkin(conn)
+
+    def _record_failure(self, email: EmailOutboxModel, error: Exception) -> None:
+        email.attempts += 1
+        email.last_error = str(error)
+        if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+            email.status = "failed"
+            self.failed += 1
+            logger.error(f"Giving up on email {email.id} to {email.email_to}: {error}")
+            return
+        backoff = settings.EMAIL_OUTBOX_RETRY_SECONDS * 2 ** (email.attempts - 1)
+        email.next_attempt_at = datetime.datetime.now(
+            datetime.UTC
+        ) + datetime.timedelta(seconds=backoff)
+        self.retried += 1
+
+    def start(self, session_factory: async_sessionmaker[Session]) -> None:
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(session_factory))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.pool.close()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "batches": self.batches,
+            **{f"connections_{key}": val for key, val in self.pool.stats().items()},
+        }
+
+    async def _run(self, session_factory: async_sessionmaker[Session]) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                async with session_factory() as db:
+                    while await self.drain(db):
+                        pass
+            except Exception as e:
+                logger.error(f"Error draining the email outbox: {str(e)}")
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), timeout=settings.EMAIL_OUTBOX_POLL_SECONDS
+                )
+            except TimeoutError:
+                pass
+
+
+outbox_worker = OutboxWorker(SMTPPool(settings.SMTP_POOL_SIZE))
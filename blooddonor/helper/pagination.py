@@ -0,0 +1,25 @@
+import base64
+import binascii
+import datetime
+import json
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(created_on: datetime.datetime, donor_id: str) -> str:
+    """
+    Encode the keyset position (created_on, id) of the last row of a page into an opaque token.
+    """
+    payload = json.dumps([created_on.isoformat(), str(donor_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime, str]:
+    padding = "=" * (-len(cursor) % 4)
+    try:
+        created_on, donor_id = json.loads(base64.urlsafe_b64decode(cursor + padding))
+        return datetime.datetime.fromisoformat(created_on), str(donor_id)
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise InvalidCursorError("The provided cursor is not valid.") from e
@@ -0,0 +1,89 @@
+from collections import defaultdict
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from sqlalchemy.ext.asyncio import AsyncSession as Session
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from blooddonor.core.config import settings
+from blooddonor.helper.cache import TTLCache
+from blooddonor.models.usermodel import DonorModel, ProfileModel
+
+
+def _columns(obj: Any) -> dict[str, Any]:
+    return {attr.key: getattr(obj, attr.key) for attr in obj.__mapper__.column_attrs}
+
+
+class PrincipalCache:
+    """
+    Authenticated donors keyed by the token subject, so requests of the same session
+    skip loading the donor and its profile.
+
+    Every donor has a version stamp which writes to the donor or its profile bump
+    (password, activation, privileges, removal ...), an entry is only used while its
+    stamp is current. Stamps are per process, other workers see a write once the
+    entry expires after `PRINCIPAL_CACHE_TTL_SECONDS`.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self._cache = TTLCache(maxsize, ttl)
+        self._versions: defaultdict[str, int] = defaultdict(int)
+
+    async def get_or_load(
+        self,
+        db: Session,
+        user_id: Any,
+        load: Callable[[], Awaitable[DonorModel | None]],
+    ) -> DonorModel | None:
+        key = str(user_id)
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] == self._versions[key]:
+            # every request gets its own instance attached to its own session
+            return await db.merge(self._restore(entry[1]), load=False)
+
+        # taken before loading, a write racing with it leaves the entry stale
+        version = self._versions[key]
+        donor = await load()
+        if donor is not None:
+            self._cache.set(key, (version, self._snapshot(donor)))
+        return donor
+
+    def invalidate(self, *user_ids: Any) -> None:
+        for user_id in user_ids:
+            key = str(user_id)
+            self._versions[key] += 1
+            self._cache.pop(key)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict[str, int]:
+        return self._cache.stats()
+
+    @staticmethod
+    def _snapshot(
+        donor: DonorModel,
+    ) -> tuple[dict[str, Any], dict[str, Any] | None]:
+        profile = donor.profile
+        return _columns(donor), _columns(profile) if profile is not None else None
+
+    @staticmethod
+    def _restore(
+        snapshot: tuple[dict[str, Any], dict[str, Any] | None],
+    ) -> DonorModel:
+        donor_columns, profile_columns = snapshot
+        donor = DonorModel(**donor_columns)
+        make_transient_to_detached(donor)
+        profile = None
+        if profile_columns is not None:
+            profile = ProfileModel(**profile_columns)
+            make_transient_to_detached(profile)
+        set_committed_value(donor, "profile", profile)
+        return donor
+
+
+principal_cache = PrincipalCache(
+    maxsize=settings.PRINCIPAL_CACHE_MAX_ENTRIES,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,159 @@
+import logging
+import re
+import time
+from contextvars import ContextVar
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.routing import Mount
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from blooddonor.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def route_template(scope: Scope) -> str | None:
+    """
+    The path template of the route a request was matched to, e.g.
+    `/api/v1/users/read_user/{user_email}`, or None before it is matched.
+    """
+    # set by the router once the request is matched to a route
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path is None:
+        return None
+    if isinstance(route, Mount):
+        return f"{path}/{{path}}"
+    if ":path}" in path:
+        return path
+    # newer FastAPI versions leave out the prefixes of included routers
+    prefix = scope["path"].split("/")[: -path.count("/")]
+    return "/".join(prefix) + path
+
+
+class RequestQueries:
+    """
+    The SQL statements executed while handling one request.
+    """
+
+    def __init__(self, scope: Scope) -> None:
+        self.scope = scope
+        self.count = 0
+        self.duration = 0.0
+
+    @property
+    def route(self) -> str:
+        return route_template(self.scope) or self.scope["path"]
+
+
+_request_queries: ContextVar[RequestQueries | None] = ContextVar(
+    "request_queries", default=None
+)
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+def normalize_sql(statement: str) -> str:
+    """
+    The statement on one line with its literals replaced by `?` and lists of
+    placeholders collapsed, so executions differing in values read the same.
+    """
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    statement = _STRING.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    return _PLACEHOLDER_LIST.sub("(...)", statement)
+
+
+def _before_cursor_execute(conn: Connection, *args: Any) -> None:  # noqa: ARG001
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(
+    conn: Connection,
+    cursor: Any,  # noqa: ARG001
+    statement: str,
+    *args: Any,  # noqa: ARG001
+) -> None:
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    queries = _request_queries.get()
+    if queries is not None:
+        queries.count += 1
+        queries.duration += elapsed
+    if elapsed * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+        route = queries.route if queries is not None else None
+        sql = normalize_sql(statement)
+        logger.warning(
+            f"Slow query ({elapsed * 1000:.1f} ms) on {route or 'no request'}: {sql}",
+            extra={"route": route, "duration_ms": round(elapsed * 1000, 2), "sql": sql},
+        )
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """
+    Time every statement the engine executes, for the request it runs in and
+    the slow query log.
+    """
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryTimingMiddleware:
+    """
+    Counts the SQL statements of every request and the time spent in them.
+    They are reported in a `Server-Timing` header, as far as they ran before
+    the response started, and logged in full once the response is sent.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries(scope)
+        token = _request_queries.set(queries)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if settings.SERVER_TIMING_ENABLED:
+                    total = (time.perf_counter() - start) * 1000
+                    timing = (
+                        f'db;desc="{queries.count} queries";'
+                        f"dur={queries.duration * 1000:.2f}, app;dur={total:.2f}"
+                    )
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        (b"server-timing", timing.encode()),
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timing)
+        finally:
+            _request_queries.reset(token)
+            duration = (time.perf_counter() - start) * 1000
+            logger.info(
+                f"{scope['method']} {queries.route} {status_code} "
+                f"{duration:.1f} ms, {queries.count} queries "
+                f"{queries.duration * 1000:.1f} ms",
+                extra={
+                    "method": scope["method"],
+                    "route": queries.route,
+                    "status": status_code,
+                    "duration_ms": round(duration, 2),
+                    "db_queries": queries.count,
+                    "db_duration_ms": round(queries.duration * 1000, 2),
+                },
+            )
@@ -1,44 +1,194 @@
 import datetime
 import logging
+import os
+import socket
+import time
+import uuid
+from collections import deque
 
-from sqlalchemy import update
+from sqlalchemy import delete, false, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession as Session
 
+from blooddonor.core.config import settings
+from blooddonor.helper.donor_stats import donor_stats
+from blooddonor.helper.eligibility import DONATION_INTERVAL, enable_donors
+from blooddonor.helper.metrics import SCHEDULER_JOB_DURATION
+from blooddonor.models.schedulermodel import SchedulerLockModel
 from blooddonor.models.usermodel import DonorModel
+from blooddonor.schemas.scheduler import SchedulerRun, SchedulerStats
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DONOR_AVAILABILITY_JOB = "donor_availability"
 
-async def update_donor_availability(db: Session):
+# identifies this process as the holder of a job lease
+LEASE_OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+async def update_donor_availability(
+    db: Session, *, batch_size: int | None = None
+) -> list[int]:
     """
     Update 'is_available' to True for donors who donated more than 3 months ago and are not already available.
+
+    The donors are updated in batches of `batch_size`, oldest donation first, each in
+    its own short transaction so searches aren't blocked behind one long write lock.
+    Returns the number of donors updated by each batch.
     """
+    batch_size = batch_size or settings.SCHEDULER_BATCH_SIZE
+    cutoff = datetime.datetime.now(datetime.UTC) - DONATION_INTERVAL
+    # served by ix_donormodel_is_available_donated_on
+    due = (
+        DonorModel.is_available == false(),
+        DonorModel.donated_on < cutoff,
+    )
+    batches: list[int] = []
     try:
-        three_months_ago = datetime.datetime.now(datetime.UTC) - datetime.timedelta(
-            days=90
-        )
+        while True:
+            ids = (
+                await db.scalars(
+                    select(DonorModel.id)
+                    .where(*due)
+                    .order_by(DonorModel.donated_on)
+                    .limit(batch_size)
+                )
+            ).all()
+            if not ids:
+                break
+            updated = await enable_donors(db, DonorModel.id.in_(ids), *due)
+            batches.append(updated)
+            logger.info(
+                f"Donor availability batch {len(batches)} updated {updated} donors."
+            )
+            # the donors were updated by someone else in the meantime
+            if not updated:
+                break
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Error updating donor availability: {str(e)}")
+        raise
+    finally:
+        # reconcile the /users/counts counters with the database on every run, they
+        # drift with the writes of other workers and direct SQL
+        await donor_stats.reload(db)
+
+    logger.info(
+        f"Donor availability updated for {sum(batches)} donors in {len(batches)} batches."
+    )
+    return batches
 
-        # Perform a bulk update using a single query for efficiency
-        result = await db.execute(
-            update(DonorModel)
-            .where(DonorModel.donated_on < three_months_ago)
-            .where(
-                DonorModel.is_available is False
-            )  # Only update if is_available is False
-            .values(is_available=True)
+
+async def acquire_lease(db: Session, name: str, duration: datetime.timedelta) -> bool:
+    """
+    Take the lease on a job unless another process holds an unexpired one.
+    """
+    now = datetime.datetime.now(datetime.UTC)
+    result = await db.execute(
+        update(SchedulerLockModel)
+        .where(SchedulerLockModel.name == name)
+        .where(
+            or_(
+                SchedulerLockModel.expires_at < now,
+                SchedulerLockModel.owner == LEASE_OWNER,
+            )
         )
+        .values(owner=LEASE_OWNER, expires_at=now + duration)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 1:
+        await db.commit()
+        return True
 
-        # Commit the transaction to persist the changes
+    # nobody took this lease before, the primary key settles concurrent inserts
+    try:
+        await db.execute(
+            insert(SchedulerLockModel).values(
+                name=name, owner=LEASE_OWNER, expires_at=now + duration
+            )
+        )
         await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return False
+    return True
+
+
+async def release_lease(db: Session, name: str) -> None:
+    await db.execute(
+        delete(SchedulerLockModel).where(
+            SchedulerLockModel.name == name, SchedulerLockModel.owner == LEASE_OWNER
+        )
+    )
+    await db.commit()
 
-        # Log the number of rows updated
-        logger.info(f"Donor availability updated for {result.rowcount} donors.")
 
+class SchedulerHistory:
+    """
+    The latest scheduler runs of this process and run counters.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self._history: deque[SchedulerRun] = deque(maxlen=size)
+
+    def record(self, run: SchedulerRun) -> SchedulerRun:
+        if run.status == "skipped":
+            self.skipped += 1
+        else:
+            self.runs += 1
+            self.failures += run.status == "failed"
+        self._history.append(run)
+        SCHEDULER_JOB_DURATION.labels(run.job, run.status).observe(run.duration_seconds)
+        return run
+
+    def stats(self) -> SchedulerStats:
+        return SchedulerStats(
+            runs=self.runs,
+            failures=self.failures,
+            skipped=self.skipped,
+            history=list(reversed(self._history)),
+        )
+
+
+scheduler_history = SchedulerHistory(settings.SCHEDULER_HISTORY_SIZE)
+
+
+async def run_donor_availability(
+    db: Session, *, trigger: str = "scheduled"
+) -> SchedulerRun:
+    """
+    Run `update_donor_availability` and record the run.
+
+    Scheduled runs first take the job lease for half the rerun interval, the other
+    app processes skip their run of the same period. Manual runs skip the lease.
+    """
+    run = SchedulerRun(
+        job=DONOR_AVAILABILITY_JOB,
+        trigger=trigger,
+        status="success",
+        started_at=datetime.datetime.now(datetime.UTC),
+    )
+    lease = datetime.timedelta(hours=settings.SCHEDULER_RERUN_TIME_IN_HOURS) / 2
+    if trigger == "scheduled" and not await acquire_lease(
+        db, DONOR_AVAILABILITY_JOB, lease
+    ):
+        run.status = "skipped"
+        return scheduler_history.record(run)
+
+    start = time.perf_counter()
+    try:
+        run.batches = await update_donor_availability(db)
+        run.updated = sum(run.batches)
     except Exception as e:
-        await db.rollback()
-        logger.error(f"Error updating donor availability: {str(e)}")
-        raise
-    finally:
-        await db.aclose()
+        run.status = "failed"
+        run.error = str(e)
+        if trigger == "scheduled":
+            # let another process retry
+            await release_lease(db, DONOR_AVAILABILITY_JOB)
+    run.duration_seconds = time.perf_counter() - start
+    return scheduler_history.record(run)
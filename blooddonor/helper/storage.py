@@ -0,0 +1,452 @@
+import abc
+import asyncio
+import datetime
+import hashlib
+import hmac
+import os
+import tempfile
+from collections.abc import AsyncIterable, AsyncIterator
+from pathlib import Path
+from urllib.parse import quote
+from xml.etree import ElementTree
+
+import httpx
+
+from blooddonor.core.config import settings
+
+# bytes read or yielded at a time by the streaming reads
+CHUNK_SIZE = 64 * 1024
+
+
+class ObjectNotFoundError(LookupError):
+    pass
+
+
+class Storage(abc.ABC):
+    """
+    Where the uploaded files are kept, by key.
+
+    Objects are written whole, from bytes or from a stream of chunks, and read
+    back as a stream of chunks. `url` gives an address clients may fetch an
+    object from directly, bypassing the app servers, when the backend has one.
+    """
+
+    # base URL the objects are publicly served under, e.g. by a CDN
+    public_url: str | None = None
+
+    @abc.abstractmethod
+    async def write(
+        self,
+        key: str,
+        data: bytes | AsyncIterable[bytes],
+        content_type: str | None = None,
+    ) -> None: ...
+
+    @abc.abstractmethod
+    def read(self, key: str) -> AsyncIterator[bytes]:
+        """
+        The object's content in chunks, raises `ObjectNotFoundError` on the
+        first iteration when there is no such object.
+        """
+
+    @abc.abstractmethod
+    async def exists(self, key: str) -> bool: ...
+
+    @abc.abstractmethod
+    async def delete(self, key: str) -> None: ...
+
+    def path(self, key: str) -> str | None:  # noqa: ARG002
+        """
+        The object's file, for backends keeping objects on the local disk.
+        """
+        return None
+
+    def url(self, key: str, expires: int) -> str | None:  # noqa: ARG002
+        """
+        A URL clients may fetch the object from for at least `expires` seconds.
+        """
+        if self.public_url:
+            return f"{self.public_url.rstrip('/')}/{quote(key)}"
+        return None
+
+    async def close(self) -> None:  # noqa: B027
+        pass
+
+
+async def _chunks(data: bytes | AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    if isinstance(data, bytes):
+        yield data
+        return
+    async for chunk in data:
+        yield chunk
+
+
+class LocalStorage(Storage):
+    """
+    Objects as files of a directory. Files are written to a temporary file
+    first and moved in place, so readers never see a partial object.
+    """
+
+    def __init__(self, directory: str, *, public_url: str | None = None) -> None:
+        self.directory = Path(directory)
+        self.public_url = public_url
+
+    def _path(self, key: str) -> Path:
+        path = self.directory / key
+        if not key or path.parent != self.directory or key.startswith("."):
+            raise ValueError(f"Invalid storage key: {key!r}")
+        return path
+
+    async def write(
+        self,
+        key: str,
+        data: bytes | AsyncIterable[bytes],
+        content_type: str | None = None,  # noqa: ARG002
+    ) -> None:
+        path = self._path(key)
+        fd, tmp = await asyncio.to_thread(
+            tempfile.mkstemp, dir=self.directory, prefix=".tmp-"
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async for chunk in _chunks(data):
+                    await asyncio.to_thread(f.write, chunk)
+            await asyncio.to_thread(os.replace, tmp, path)
+        except BaseException:
+            await asyncio.to_thread(Path(tmp).unlink, missing_ok=True)
+            raise
+
+    async def read(self, key: str) -> AsyncIterator[bytes]:
+        try:
+            f = await asyncio.to_thread(self._path(key).open, "rb")
+        except FileNotFoundError:
+            raise ObjectNotFoundError(key)
+        with f:
+            while chunk := await asyncio.to_thread(f.read, CHUNK_SIZE):
+                yield chunk
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(self._path(key).is_file)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._path(key).unlink, missing_ok=True)
+
+    def path(self, key: str) -> str | None:
+        return str(self._path(key))
+
+
+class MemoryStorage(Storage):
+    """
+    Objects kept in a dict of this process, for tests.
+    """
+
+    def __init__(self) -> None:
+        self.objects: dict[str, tuple[bytes, str | None]] = {}
+
+    async def write(
+        self,
+        key: str,
+        data: bytes | AsyncIterable[bytes],
+        content_type: str | None = None,
+    ) -> None:
+        self.objects[key] = (b"".join([c async for c in _chunks(data)]), content_type)
+
+    async def read(self, key: str) -> AsyncIterator[bytes]:
+        if key not in self.objects:
+            raise ObjectNotFoundError(key)
+        content = self.objects[key][0]
+        for start in range(0, len(content), CHUNK_SIZE):
+            yield content[start : start + CHUNK_SIZE]
+
+    async def exists(self, key: str) -> bool:
+        return key in self.objects
+
+    async def delete(self, key: str) -> None:
+        self.objects.pop(key, None)
+
+
+def _hmac(key: bytes, msg: str) -> bytes:
+    return hmac.new(key, msg.encode(), hashlib.sha256).digest()
+
+
+def _canonical_query(params: dict[str, str]) -> str:
+    return "&".join(
+        f"{quote(k, safe='-_.~')}={quote(v, safe='-_.~')}"
+        for k, v in sorted(params.items())
+    )
+
+
+class S3Storage(Storage):
+    """
+    Objects of a bucket of Amazon S3 or any S3 compatible service, e.g. MinIO.
+
+    Requests are signed with AWS Signature Version 4. Streamed writes are
+    uploaded in parts of `part_size` bytes once they outgrow a single part, and
+    `url` gives presigned GET URLs unless the bucket has a `public_url`.
+    """
+
+    def __init__(
+        self,
+        endpoint_url: str,
+        bucket: str,
+        *,
+        access_key_id: str,
+        secret_access_key: str,
+        region: str = "us-east-1",
+        virtual_host_style: bool = False,
+        public_url: str | None = None,
+        part_size: int = 8 * 1024 * 1024,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        endpoint = httpx.URL(endpoint_url)
+        host = endpoint.netloc.decode()
+        if virtual_host_style:
+            self._host, self._prefix = f"{bucket}.{host}", ""
+        else:
+            self._host, self._prefix = host, f"/{bucket}"
+        self._origin = f"{endpoint.scheme}://{self._host}"
+        self.bucket = bucket
+        self.access_key_id = access_key_id
+        self.secret_access_key = secret_access_key
+        self.region = region
+        self.public_url = public_url
+        self.part_size = part_size
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(transport=self._transport, timeout=30)
+        return self._client
+
+    def _key_path(self, key: str) -> str:
+        return f"{self._prefix}/{quote(key, safe='/~')}"
+
+    def _signature(
+        self,
+        method: str,
+        path: str,
+        params: dict[str, str],
+        headers: dict[str, str],
+        payload_hash: str,
+        amz_date: str,
+    ) -> str:
+        date = amz_date[:8]
+        canonical_request = "\n".join(
+            [
+                method,
+                path,
+                _canonical_query(params),
+                "".join(f"{name}:{headers[name].strip()}\n" for name in headers),
+                ";".join(headers),
+                payload_hash,
+            ]
+        )
+        string_to_sign = "\n".join(
+            [
+                "AWS4-HMAC-SHA256",
+                amz_date,
+                f"{date}/{self.region}/s3/aws4_request",
+                hashlib.sha256(canonical_request.encode()).hexdigest(),
+            ]
+        )
+        signing_key = _hmac(f"AWS4{self.secret_access_key}".encode(), date)
+        for part in (self.region, "s3", "aws4_request"):
+            signing_key = _hmac(signing_key, part)
+        return hmac.new(
+            signing_key, string_to_sign.encode(), hashlib.sha256
+        ).hexdigest()
+
+    def _credential(self, amz_date: str) -> str:
+        return f"{self.access_key_id}/{amz_date[:8]}/{self.region}/s3/aws4_request"
+
+    def presigned_url(
+        self,
+        key: str,
+        expires: int,
+        *,
+        method: str = "GET",
+        now: datetime.datetime | None = None,
+    ) -> str:
+        now = now or datetime.datetime.now(datetime.UTC)
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        path = self._key_path(key)
+        params = {
+            "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+            "X-Amz-Credential": self._credential(amz_date),
+            "X-Amz-Date": amz_date,
+            "X-Amz-Expires": str(expires),
+            "X-Amz-SignedHeaders": "host",
+        }
+        params["X-Amz-Signature"] = self._signature(
+            method, path, params, {"host": self._host}, "UNSIGNED-PAYLOAD", amz_date
+        )
+        return f"{self._origin}{path}?{_canonical_query(params)}"
+
+    def url(self, key: str, expires: int) -> str | None:
+        return super().url(key, expires) or self.presigned_url(key, expires)
+
+    async def _request(
+        self,
+        method: str,
+        key: str,
+        *,
+        params: dict[str, str] | None = None,
+        content: bytes = b"",
+        headers: dict[str, str] | None = None,
+        stream: bool = False,
+    ) -> httpx.Response:
+        params = params or {}
+        path = self._key_path(key)
+        amz_date = datetime.datetime.now(datetime.UTC).strftime("%Y%m%dT%H%M%SZ")
+        signed = {
+            "host": self._host,
+            "x-amz-content-sha256": hashlib.sha256(content).hexdigest(),
+            "x-amz-date": amz_date,
+        }
+        signature = self._signature(
+            method, path, params, signed, signed["x-amz-content-sha256"], amz_date
+        )
+        authorization = (
+            f"AWS4-HMAC-SHA256 Credential={self._credential(amz_date)}, "
+            f"SignedHeaders={';'.join(signed)}, Signature={signature}"
+        )
+        query = f"?{_canonical_query(params)}" if params else ""
+        request = self.client.build_request(
+            method,
+            f"{self._origin}{path}{query}",
+            content=content,
+            headers={**signed, **(headers or {}), "Authorization": authorization},
+        )
+        return await self.client.send(request, stream=stream)
+
+    async def write(
+        self,
+        key: str,
+        data: bytes | AsyncIterable[bytes],
+        content_type: str | None = None,
+    ) -> None:
+        headers = {"Content-Type": content_type} if content_type else {}
+        if isinstance(data, bytes):
+            response = await self._request("PUT", key, content=data, headers=headers)
+            response.raise_for_status()
+            return
+
+        buffer = bytearray()
+        upload_id = None
+        parts: list[str] = []
+        try:
+            async for chunk in data:
+                buffer += chunk
+                while len(buffer) >= self.part_size:
+                    if upload_id is None:
+                        upload_id = await self._create_upload(key, headers)
+                    part, buffer = buffer[: self.part_size], buffer[self.part_size :]
+                    parts.append(await self._upload_part(key, upload_id, parts, part))
+            if upload_id is None:
+                response = await self._request(
+                    "PUT", key, content=bytes(buffer), headers=headers
+                )
+                response.raise_for_status()
+                return
+            if buffer:
+                parts.append(await self._upload_part(key, upload_id, parts, buffer))
+            await self._complete_upload(key, upload_id, parts)
+        except BaseException:
+            if upload_id is not None:
+                await self._request("DELETE", key, params={"uploadId": upload_id})
+            raise
+
+    async def _create_upload(self, key: str, headers: dict[str, str]) -> str:
+        response = await self._request(
+            "POST", key, params={"uploads": ""}, headers=headers
+        )
+        response.raise_for_status()
+        return ElementTree.fromstring(response.content).findtext("{*}UploadId")
+
+    async def _upload_part(
+        self, key: str, upload_id: str, parts: list[str], content: bytes
+    ) -> str:
+        response = await self._request(
+            "PUT",
+            key,
+            params={"partNumber": str(len(parts) + 1), "uploadId": upload_id},
+            content=bytes(content),
+        )
+        response.raise_for_status()
+        return response.headers["ETag"]
+
+    async def _complete_upload(
+        self, key: str, upload_id: str, parts: list[str]
+    ) -> None:
+        body = "".join(
+            f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+            for number, etag in enumerate(parts, start=1)
+        )
+        response = await self._request(
+            "POST",
+            key,
+            params={"uploadId": upload_id},
+            content=f"<CompleteMultipartUpload>{body}</CompleteMultipartUpload>".encode(),
+        )
+        response.raise_for_status()
+        # failures after the upload started are reported with status 200
+        if ElementTree.fromstring(response.content).tag.endswith("Error"):
+            raise httpx.HTTPStatusError(
+                f"Completing the upload of {key} failed: {response.text}",
+                request=response.request,
+                response=response,
+            )
+
+    async def read(self, key: str) -> AsyncIterator[bytes]:
+        response = await self._request("GET", key, stream=True)
+        try:
+            if response.status_code == 404:
+                raise ObjectNotFoundError(key)
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                yield chunk
+        finally:
+            await response.aclose()
+
+    async def exists(self, key: str) -> bool:
+        response = await self._request("HEAD", key)
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        return True
+
+    async def delete(self, key: str) -> None:
+        response = await self._request("DELETE", key)
+        if response.status_code != 404:
+            response.raise_for_status()
+
+    async def close(self) -> None:  # noqa: B027
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def create_storage() -> Storage:
+    """
+    The storage configured by `IMAGE_STORAGE_BACKEND`.
+    """
+    backend = settings.IMAGE_STORAGE_BACKEND
+    if backend == "local":
+        return LocalStorage(
+            settings.IMAGE_STORAGE_DIR, public_url=settings.IMAGE_STORAGE_PUBLIC_URL
+        )
+    if backend == "memory":
+        return MemoryStorage()
+    if backend == "s3":
+        return S3Storage(
+            settings.S3_ENDPOINT_URL,
+            settings.S3_BUCKET,
+            access_key_id=settings.S3_ACCESS_KEY_ID,
+            secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+            region=settings.S3_REGION,
+            virtual_host_style=settings.S3_VIRTUAL_HOST_STYLE,
+            public_url=settings.IMAGE_STORAGE_PUBLIC_URL,
+        )
+    raise ValueError(f"Unknown IMAGE_STORAGE_BACKEND: {backend!r}")
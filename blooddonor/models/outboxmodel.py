@@ -0,0 +1,36 @@
+import datetime
+import uuid
+from uuid import UUID
+
+from sqlalchemy import Index, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from blooddonor.db.base_class import Base
+
+
+# email waiting for the outbox worker, kept after delivery as a send log
+class EmailOutboxModel(Base):
+    __table_args__ = (
+        # the worker claims the pending emails that are due, oldest first
+        Index(
+            "ix_emailoutboxmodel_status_next_attempt_at", "status", "next_attempt_at"
+        ),
+    )
+
+    id: Mapped[UUID] = mapped_column(
+        String, default=lambda: str(uuid.uuid4()), primary_key=True
+    )
+    email_to: Mapped[str] = mapped_column(nullable=False)
+    subject: Mapped[str] = mapped_column(nullable=False)
+    html: Mapped[str] = mapped_column(Text, nullable=False)
+    # "pending", "sent" or "failed" once the attempts are used up
+    status: Mapped[str] = mapped_column(default="pending")
+    attempts: Mapped[int] = mapped_column(default=0)
+    last_error: Mapped[str] = mapped_column(nullable=True, default=None)
+    created_on: Mapped[datetime.datetime] = mapped_column(
+        default=lambda: datetime.datetime.now(datetime.UTC)
+    )
+    next_attempt_at: Mapped[datetime.datetime] = mapped_column(
+        default=lambda: datetime.datetime.now(datetime.UTC)
+    )
+    sent_on: Mapped[datetime.datetime] = mapped_column(nullable=True, default=None)
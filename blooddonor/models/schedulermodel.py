@@ -0,0 +1,21 @@
+import datetime
+
+from sqlalchemy import ForeignKey, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from blooddonor.db.base_class import Base
+
+
+# lease on a scheduled job, so only one of several app processes runs it
+class SchedulerLockModel(Base):
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    owner: Mapped[str] = mapped_column(nullable=False)
+    expires_at: Mapped[datetime.datetime] = mapped_column(nullable=False)
+
+
+# time an unavailable donor becomes eligible to donate again
+class DonorEligibilityModel(Base):
+    donor_id: Mapped[str] = mapped_column(
+        ForeignKey("donormodel.id", ondelete="CASCADE"), primary_key=True
+    )
+    eligible_at: Mapped[datetime.datetime] = mapped_column(nullable=False, index=True)
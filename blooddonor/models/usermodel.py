@@ -1,75 +1,213 @@
-import datetime
-import uuid
-from uuid import UUID
-
-from sqlalchemy import ForeignKey, String
-from sqlalchemy.orm import Mapped, mapped_column, relationship
-
-from blooddonor.db.base_class import Base
-from blooddonor.schemas.user import (
-    AcademicYearEnum,
-    BloodGroupEnum,
-    DepartmentsEnum,
-    DistrictEnum,
-    EmploymentStatusEnum,
-    GenderEnum,
-)
-
-
-class DonorModel(Base):
-    id: Mapped[UUID] = mapped_column(
-        String, default=lambda: str(uuid.uuid4()), primary_key=True
-    )
-
-    # personal details
-    full_name: Mapped[str] = mapped_column(nullable=False, index=True)
-    email: Mapped[str] = mapped_column(index=True, default=None, unique=True)
-    mobile: Mapped[str] = mapped_column(unique=True, index=True, nullable=False)
-    department: Mapped[DepartmentsEnum] = mapped_column(index=True, nullable=False)
-    student_id: Mapped[str] = mapped_column(unique=True, nullable=False, index=True)
-    gender: Mapped[GenderEnum] = mapped_column(nullable=False, index=True)
-    district: Mapped[DistrictEnum] = mapped_column(nullable=False, index=True)
-    blood_group: Mapped[BloodGroupEnum] = mapped_column(nullable=False, index=True)
-    academic_year: Mapped[AcademicYearEnum] = mapped_column(nullable=False, index=True)
-    is_available: Mapped[bool] = mapped_column(default=True)
-    # relationship
-    profile: Mapped["ProfileModel"] = relationship(
-        "ProfileModel",
-        back_populates="donor",
-        uselist=False,
-        cascade="all, delete",
-        lazy="selectin",
-    )
-
-    # credentials
-    hashed_password: Mapped[str] = mapped_column(nullable=False)
-
-    # permissions
-    is_active: Mapped[bool] = mapped_column(default=True)
-    is_admin: Mapped[bool] = mapped_column(default=False)
-    is_superuser: Mapped[bool] = mapped_column(default=False)
-    created_on: Mapped[datetime.datetime] = mapped_column(
-        default=datetime.datetime.now(datetime.UTC)
-    )
-    donated_on: Mapped[datetime.datetime] = mapped_column(
-        default=datetime.datetime.now(datetime.UTC)
-    )
-
-
-class ProfileModel(Base):
-    id: Mapped[UUID] = mapped_column(
-        String, default=lambda: str(uuid.uuid4()), primary_key=True
-    )
-    profile_img: Mapped[str] = mapped_column(nullable=True, default="profile_img.png")
-    facebook: Mapped[str] = mapped_column(nullable=True, default=None)
-    instagram: Mapped[str] = mapped_column(nullable=True, default=None)
-    linkedin: Mapped[str] = mapped_column(nullable=True, default=None)
-    website: Mapped[str] = mapped_column(nullable=True, default=None)
-    employment_status: Mapped[EmploymentStatusEnum] = mapped_column(
-        default=EmploymentStatusEnum.STUDENT
-    )
-    # relationship
-    donor_id: Mapped[UUID] = mapped_column(
-        ForeignKey("donormodel.id", ondelete="CASCADE")
-    )
-    donor: Mapped["DonorModel"] = relationship("DonorModel", back_populates="profile")
+import datetime
+import uuid
+from uuid import UUID
+
+from sqlalchemy import DDL, ForeignKey, Index, String, event
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from blooddonor.db.base_class import Base
+from blooddonor.schemas.user import (
+    AcademicYearEnum,
+    BloodGroupEnum,
+    DepartmentsEnum,
+    DistrictEnum,
+    EmploymentStatusEnum,
+    GenderEnum,
+)
+
+
+class DonorModel(Base):
+    __table_args__ = (
+        # keyset pagination of search results ordered by (created_on, id)
+        Index("ix_donormodel_created_on_id", "created_on", "id"),
+        # donors the availability job re-enables, oldest donation first
+        Index("ix_donormodel_is_available_donated_on", "is_available", "donated_on"),
+    )
+
+    id: Mapped[UUID] = mapped_column(
+        String, default=lambda: str(uuid.uuid4()), primary_key=True
+    )
+
+    # personal details
+    full_name: Mapped[str] = mapped_column(nullable=False, index=True)
+    email: Mapped[str] = mapped_column(index=True, default=None, unique=True)
+    mobile: Mapped[str] = mapped_column(unique=True, index=True, nullable=False)
+    department: Mapped[DepartmentsEnum] = mapped_column(index=True, nullable=False)
+    student_id: Mapped[str] = mapped_column(unique=True, nullable=False, index=True)
+    gender: Mapped[GenderEnum] = mapped_column(nullable=False, index=True)
+    district: Mapped[DistrictEnum] = mapped_column(nullable=False, index=True)
+    blood_group: Mapped[BloodGroupEnum] = mapped_column(nullable=False, index=True)
+    academic_year: Mapped[AcademicYearEnum] = mapped_column(nullable=False, index=True)
+    is_available: Mapped[bool] = mapped_column(default=True)
+    # relationship
+    profile: Mapped["ProfileModel"] = relationship(
+        "ProfileModel",
+        back_populates="donor",
+        uselist=False,
+        cascade="all, delete",
+        lazy="selectin",
+    )
+
+    # credentials
+    hashed_password: Mapped[str] = mapped_column(nullable=False)
+
+    # permissions
+    is_active: Mapped[bool] = mapped_column(default=True)
+    is_admin: Mapped[bool] = mapped_column(default=False)
+    is_superuser: Mapped[bool] = mapped_column(default=False)
+    created_on: Mapped[datetime.datetime] = mapped_column(
+        default=lambda: datetime.datetime.now(datetime.UTC)
+    )
+    donated_on: Mapped[datetime.datetime] = mapped_column(
+        default=lambda: datetime.datetime.now(datetime.UTC)
+    )
+
+
+class ProfileModel(Base):
+    id: Mapped[UUID] = mapped_column(
+        String, default=lambda: str(uuid.uuid4()), primary_key=True
+    )
+    profile_img: Mapped[str] = mapped_column(nullable=True, default="profile_img.png")
+    facebook: Mapped[str] = mapped_column(nullable=True, default=None)
+    instagram: Mapped[str] = mapped_column(nullable=True, default=None)
+    linkedin: Mapped[str] = mapped_column(nullable=True, default=None)
+    website: Mapped[str] = mapped_column(nullable=True, default=None)
+    employment_status: Mapped[EmploymentStatusEnum] = mapped_column(
+        default=EmploymentStatusEnum.STUDENT
+    )
+    # relationship
+    donor_id: Mapped[UUID] = mapped_column(
+        ForeignKey("donormodel.id", ondelete="CASCADE")
+    )
+    donor: Mapped["DonorModel"] = relationship("DonorModel", back_populates="profile")
+
+
+# Name search shadow tables, see blooddonor.helper.name_search
+DONOR_NAME_FTS_TABLE = "donor_name_fts"
+
+# SQLite: FTS5 trigram index over donormodel.full_name, an external content table
+# keyed by the donor rowid so the triggers find its entries without a scan. A
+# VACUUM may renumber the rowids of donormodel, the app rebuilds the index when
+# it starts, see blooddonor.helper.name_search.rebuild_name_index
+for statement in (
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {DONOR_NAME_FTS_TABLE}
+    USING fts5(full_name, content='donormodel', content_rowid='rowid',
+               tokenize='trigram')
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS donormodel_name_fts_insert
+    AFTER INSERT ON donormodel BEGIN
+        INSERT INTO {DONOR_NAME_FTS_TABLE} (rowid, full_name)
+        VALUES (new.rowid, new.full_name);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS donormodel_name_fts_delete
+    AFTER DELETE ON donormodel BEGIN
+        INSERT INTO {DONOR_NAME_FTS_TABLE} ({DONOR_NAME_FTS_TABLE}, rowid, full_name)
+        VALUES ('delete', old.rowid, old.full_name);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS donormodel_name_fts_update
+    AFTER UPDATE OF full_name ON donormodel BEGIN
+        INSERT INTO {DONOR_NAME_FTS_TABLE} ({DONOR_NAME_FTS_TABLE}, rowid, full_name)
+        VALUES ('delete', old.rowid, old.full_name);
+        INSERT INTO {DONOR_NAME_FTS_TABLE} (rowid, full_name)
+        VALUES (new.rowid, new.full_name);
+    END
+    """,
+):
+    event.listen(
+        DonorModel.__table__,
+        "after_create",
+        DDL(statement).execute_if(dialect="sqlite"),
+    )
+event.listen(
+    DonorModel.__table__,
+    "before_drop",
+    DDL(f"DROP TABLE IF EXISTS {DONOR_NAME_FTS_TABLE}").execute_if(dialect="sqlite"),
+)
+
+# Postgres: trigram index serving ILIKE and similarity searches on full_name
+for statement in (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_donormodel_full_name_trgm "
+    "ON donormodel USING gin (full_name gin_trgm_ops)",
+):
+    event.listen(
+        DonorModel.__table__,
+        "after_create",
+        DDL(statement).execute_if(dialect="postgresql"),
+    )
+
+
+# Donor change log, see blooddonor.helper.bitmap_index
+# entries kept, processes lagging further behind rebuild their index
+DONOR_CHANGE_LOG_SIZE = 10_000
+
+# donor columns the bitmap index holds
+DONOR_INDEXED_COLUMNS = (
+    "is_available, gender, district, blood_group, academic_year, department"
+)
+
+
+# a donor row inserted, deleted or updated in an indexed column, by any process
+class DonorChangeModel(Base):
+    # never reuse the seq of trimmed entries
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq: Mapped[int] = mapped_column(primary_key=True)
+    donor_id: Mapped[str] = mapped_column(nullable=False)
+
+
+# SQLite: one trigger per kind of write, writers are serialized by the database
+for name, event_name, donor in (
+    ("insert", "INSERT", "new"),
+    ("delete", "DELETE", "old"),
+    ("update", f"UPDATE OF {DONOR_INDEXED_COLUMNS}", "new"),
+):
+    event.listen(
+        DonorModel.__table__,
+        "after_create",
+        DDL(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS donormodel_change_{name}
+            AFTER {event_name} ON donormodel BEGIN
+                INSERT INTO donorchangemodel (donor_id) VALUES ({donor}.id);
+                DELETE FROM donorchangemodel WHERE seq <= (
+                    SELECT max(seq) FROM donorchangemodel
+                ) - {DONOR_CHANGE_LOG_SIZE};
+            END
+            """
+        ).execute_if(dialect="sqlite"),
+    )
+
+# Postgres: the transaction level lock serializes donor writers until they commit,
+# so the entries become visible in seq order
+for statement in (
+    f"""
+    CREATE OR REPLACE FUNCTION donormodel_log_change() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_advisory_xact_lock(hashtext('donorchangemodel'));
+        INSERT INTO donorchangemodel (donor_id)
+        VALUES (CASE TG_OP WHEN 'DELETE' THEN OLD.id ELSE NEW.id END);
+        DELETE FROM donorchangemodel WHERE seq <= (
+            SELECT max(seq) FROM donorchangemodel
+        ) - {DONOR_CHANGE_LOG_SIZE};
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f"""
+    CREATE OR REPLACE TRIGGER donormodel_log_change
+    AFTER INSERT OR DELETE OR UPDATE OF {DONOR_INDEXED_COLUMNS} ON donormodel
+    FOR EACH ROW EXECUTE FUNCTION donormodel_log_change()
+    """,
+):
+    event.listen(
+        DonorModel.__table__,
+        "after_create",
+        DDL(statement).execute_if(dialect="postgresql"),
+    )
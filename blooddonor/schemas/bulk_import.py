@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+
+
+class ImportRowError(BaseModel):
+    # 1-based row number in the file, the header is not counted
+    row: int
+    errors: list[str]
+
+
+class ImportReport(BaseModel):
+    imported: int = 0
+    failed: int = 0
+    errors: list[ImportRowError] = []
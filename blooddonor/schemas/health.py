@@ -0,0 +1,16 @@
+import datetime
+
+from pydantic import BaseModel
+
+
+class DependencyCheck(BaseModel):
+    ok: bool
+    latency_ms: float
+    detail: str | None = None
+
+
+class Readiness(BaseModel):
+    ready: bool
+    checked_at: datetime.datetime
+    # "database", "db_pool", "scheduler" and "image_storage"
+    checks: dict[str, DependencyCheck]
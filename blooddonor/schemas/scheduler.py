@@ -0,0 +1,24 @@
+import datetime
+
+from pydantic import BaseModel
+
+
+class SchedulerRun(BaseModel):
+    job: str
+    # "scheduled" or "manual"
+    trigger: str
+    # "success", "failed" or "skipped" when another process holds the job lease
+    status: str
+    started_at: datetime.datetime
+    duration_seconds: float = 0
+    updated: int | None = None
+    # donors updated by each batch
+    batches: list[int] = []
+    error: str | None = None
+
+
+class SchedulerStats(BaseModel):
+    runs: int = 0
+    failures: int = 0
+    skipped: int = 0
+    history: list[SchedulerRun] = []
@@ -1,14 +1,14 @@
-from pydantic import BaseModel
-
-
-class Token(BaseModel):
-    access_token: str
-    token_type: str
-
-
-class AccountVerifyToken(BaseModel):
-    token: str
-
-
-class TokenPayload(BaseModel):
-    sub: str | None = None
+from pydantic import BaseModel
+
+
+class Token(BaseModel):
+    access_token: str
+    token_type: str
+
+
+class AccountVerifyToken(BaseModel):
+    token: str
+
+
+class TokenPayload(BaseModel):
+    sub: str | None = None
@@ -294,6 +294,31 @@ class UserApi(UserInDBBase):
     pass
 
 
+# donor lists leave out the profile, it is read per donor with read_profile
+class UserListApi(BaseModel, CommonFieldValidationMixin):
+    id: uuid.UUID | None = None
+    full_name: str
+    email: EmailStr
+    mobile: str
+    department: DepartmentsEnum
+    student_id: str
+    gender: GenderEnum
+    district: DistrictEnum
+    blood_group: BloodGroupEnum
+    academic_year: AcademicYearEnum
+    is_available: bool = True
+    is_active: bool = True
+    is_admin: bool = False
+    is_superuser: bool = False
+    created_on: datetime.datetime | None = None
+    donated_on: datetime.datetime | None = None
+    model_config = ConfigDict(from_attributes=True)
+
+
+# the DonorModel columns selected for UserListApi
+USER_LIST_COLUMNS = tuple(UserListApi.model_fields)
+
+
 class UserInDB(UserInDBBase):
     hashed_password: str = Field(exclude=True)
 
@@ -335,3 +360,8 @@ class DonorFilterSchema(BaseModel):
     academic_year: AcademicYearEnum | None = None
     department: DepartmentsEnum | None = None
     model_config = ConfigDict(from_attributes=True)
+
+
+class DonorPage(BaseModel):
+    items: list[UserListApi]
+    next_cursor: str | None = None
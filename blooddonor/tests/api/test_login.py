@@ -1,6 +1,15 @@
+import datetime
+import os
+
 import pytest
+from sqlalchemy import select, update
 
 from blooddonor.core.config import settings
+from blooddonor.helper.email_templates import EmailTemplates
+from blooddonor.helper.outbox import CLAIM_TIMEOUT, outbox_worker
+from blooddonor.models.outboxmodel import EmailOutboxModel
+from blooddonor.tests.utility.db import TestingSessionLocal
+from blooddonor.tests.utility.smtp import LocalSMTPServer
 
 
 @pytest.mark.asyncio
@@ -38,6 +47,108 @@ async def test_user_change_password(client):
     assert res["msg"] == "Password updated successfully"
 
 
+@pytest.mark.asyncio
+async def test_password_recovery_outbox(client, db, monkeypatch):
+    email = settings.FIRST_SUPERUSER_EMAIL
+    async with LocalSMTPServer() as smtp:
+        monkeypatch.setattr(settings, "EMAILS_ENABLED", True)
+        monkeypatch.setattr(settings, "SMTP_TLS", False)
+        monkeypatch.setattr(settings, "SMTP_HOST", smtp.host)
+        monkeypatch.setattr(settings, "SMTP_PORT", smtp.port)
+        monkeypatch.setattr(settings, "EMAILS_FROM_EMAIL", "noreply@example.com")
+        try:
+            for _ in range(2):
+                r = await client.post(f"/password-recovery/{email}")
+                assert r.json()["msg"] == "Password recovery email sent"
+                assert await outbox_worker.drain(db) == 1
+            assert [message["To"] for message in smtp.messages] == [email, email]
+            assert "Password recovery" in smtp.messages[0]["Subject"]
+            # both emails went through the same pooled connection
+            assert smtp.connections == 1
+
+            smtp.refuse.add(email)
+            await client.post(f"/password-recovery/{email}")
+            assert await outbox_worker.drain(db) == 1
+            assert len(smtp.messages) == 2
+        finally:
+            await outbox_worker.pool.close()
+
+    emails = (
+        await db.scalars(
+            select(EmailOutboxModel)
+            .where(EmailOutboxModel.email_to == email)
+            .order_by(EmailOutboxModel.created_on)
+        )
+    ).all()
+    assert [row.status for row in emails] == ["sent", "sent", "pending"]
+    assert emails[-1].attempts == 1
+    assert emails[-1].last_error
+    # retried later, not by the next drain
+    assert await outbox_worker.drain(db) == 0
+
+
+@pytest.mark.asyncio
+async def test_outbox_skips_email_claimed_elsewhere(client, db, monkeypatch):
+    email = settings.FIRST_SUPERUSER_EMAIL
+    renew_claim = outbox_worker._renew_claim
+    claimed = datetime.datetime.now(datetime.UTC) + 2 * CLAIM_TIMEOUT
+
+    async def claimed_elsewhere(session, outbox_email):
+        # the claim ran out while the lane was busy and another worker took over
+        async with TestingSessionLocal() as other:
+            await other.execute(
+                update(EmailOutboxModel)
+                .where(EmailOutboxModel.id == outbox_email.id)
+                .values(next_attempt_at=claimed)
+            )
+            await other.commit()
+        return await renew_claim(session, outbox_email)
+
+    async with LocalSMTPServer() as smtp:
+        monkeypatch.setattr(settings, "EMAILS_ENABLED", True)
+        monkeypatch.setattr(settings, "SMTP_TLS", False)
+        monkeypatch.setattr(settings, "SMTP_HOST", smtp.host)
+        monkeypatch.setattr(settings, "SMTP_PORT", smtp.port)
+        monkeypatch.setattr(settings, "EMAILS_FROM_EMAIL", "noreply@example.com")
+        monkeypatch.setattr(outbox_worker, "_renew_claim", claimed_elsewhere)
+        skipped = outbox_worker.stats()["skipped"]
+        try:
+            await client.post(f"/password-recovery/{email}")
+            assert await outbox_worker.drain(db) == 1
+        finally:
+            await outbox_worker.pool.close()
+        assert smtp.messages == []
+        assert outbox_worker.stats()["skipped"] == skipped + 1
+
+    row = await db.scalar(
+        select(EmailOutboxModel)
+        .where(EmailOutboxModel.email_to == email)
+        .order_by(EmailOutboxModel.created_on.desc())
+        .limit(1)
+    )
+    await db.refresh(row)
+    # left as the other worker claimed it
+    assert (row.status, row.attempts) == ("pending", 0)
+
+
+def test_email_templates(tmp_path):
+    templates = EmailTemplates(settings.EMAIL_TEMPLATES_DIR)
+    templates.load()
+    html = templates.render(
+        "reset_password.html", username="Donor", link="https://example.com/reset"
+    )
+    assert "Dear <strong>Donor</strong>" in html
+    assert templates.get("reset_password.html") is templates.get("reset_password.html")
+
+    (tmp_path / "note.html").write_text("Hello {{ username }}")
+    templates = EmailTemplates(str(tmp_path), auto_reload=True)
+    templates.load()
+    assert templates.render("note.html", username="Donor") == "Hello Donor"
+    (tmp_path / "note.html").write_text("Bye {{ username }}")
+    # jinja compares the modification times in whole seconds
+    os.utime(tmp_path / "note.html", (0, 0))
+    assert templates.render("note.html", username="Donor") == "Bye Donor"
+
+
 # TODO LIST
-# test for password-recovery
 # test for reset-password
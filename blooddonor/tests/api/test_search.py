@@ -1,6 +1,35 @@
+import asyncio
+import csv
+import io
+import json
+
 import pytest
+from sqlalchemy import delete, text
 
 from blooddonor.core.config import settings
+from blooddonor.crud import crud_utility
+from blooddonor.crud.crud_utility import user
+from blooddonor.helper.bitmap_index import DonorBitmapIndex, donor_index
+from blooddonor.helper.cache import search_cache
+from blooddonor.helper.compatibility import COMPATIBLE_DONORS
+from blooddonor.helper.name_search import rebuild_name_index
+from blooddonor.models.usermodel import DONOR_NAME_FTS_TABLE, DonorChangeModel
+from blooddonor.schemas.user import UserCreateBase
+from blooddonor.tests.utility.data import data_for_search_user
+from blooddonor.tests.utility.db import TestingSessionLocal
+
+
+async def collect_pages(client, params):
+    ids = []
+    params = {**params, "page_size": 1}
+    while True:
+        r = await client.get("/search/filter_donors_paginated", params=params)
+        assert r.status_code == 200
+        res = r.json()
+        ids.extend(donor["id"] for donor in res["items"])
+        if not res["next_cursor"]:
+            return ids
+        params["cursor"] = res["next_cursor"]
 
 
 @pytest.mark.asyncio
@@ -19,3 +48,289 @@ async def test_search_filter(client):
         r = await client.get("/search/filter_donors", params={key: val})
         res = r.json()
         assert key in str(res)
+
+
+@pytest.mark.asyncio
+async def test_search_filter_streamed(client):
+    params = {"blood_group": settings.FIRST_SUPERUSER_BLOOD_GROUP}
+    expected = (await client.get("/search/filter_donors", params=params)).json()
+
+    r = await client.get(
+        "/search/filter_donors",
+        params=params,
+        headers={"Accept": "application/x-ndjson"},
+    )
+    assert r.status_code == 200
+    assert [json.loads(line) for line in r.text.splitlines()] == expected
+
+    r = await client.get(
+        "/search/filter_donors", params=params, headers={"Accept": "text/csv"}
+    )
+    assert r.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(r.text)))
+    assert [row["email"] for row in rows] == [donor["email"] for donor in expected]
+
+
+@pytest.mark.asyncio
+async def test_search_filter_paginated(client):
+    r = await client.get("/search/filter_donors")
+    all_ids = {donor["id"] for donor in r.json()}
+
+    seen_ids = await collect_pages(client, {})
+    assert len(seen_ids) == len(set(seen_ids))
+    assert set(seen_ids) == all_ids
+
+
+@pytest.mark.asyncio
+async def test_search_filter_paginated_invalid_cursor(client):
+    r = await client.get(
+        "/search/filter_donors_paginated", params={"cursor": "not-a-cursor"}
+    )
+    assert r.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_search_filter_paginated_bitmap_index(client, db, monkeypatch):
+    params = {"blood_group": settings.FIRST_SUPERUSER_BLOOD_GROUP}
+    expected = await collect_pages(client, params)
+
+    monkeypatch.setattr(settings, "SEARCH_BITMAP_INDEX_ENABLED", True)
+    await donor_index.rebuild(db)
+    try:
+        assert await collect_pages(client, params) == expected
+
+        # writes through CRUDUser keep the index in sync
+        donor = await user.create(db, obj_in=UserCreateBase(**data_for_search_user))
+        params = {"blood_group": data_for_search_user["blood_group"]}
+        assert str(donor.id) in await collect_pages(client, params)
+        await user.remove(db, id=donor.id)
+        assert str(donor.id) not in await collect_pages(client, params)
+
+        # a donor removed by another process before this index caught up
+        kept = await user.create(db, obj_in=UserCreateBase(**data_for_search_user))
+        other = {
+            **data_for_search_user,
+            "email": "search_user_2@example.com",
+            "mobile": "01511111120",
+            "student_id": "20204020",
+        }
+        removed = await user.create(db, obj_in=UserCreateBase(**other))
+
+        async def lagging_sync():
+            pass
+
+        monkeypatch.setattr(donor_index, "sync", lagging_sync)
+        with monkeypatch.context() as m:
+            m.setattr(crud_utility, "donor_index", DonorBitmapIndex())
+            await user.remove(db, id=removed.id)
+        try:
+            expected = await collect_pages(client, {})
+            r = await client.get(
+                "/search/filter_donors_paginated", params={"page_size": 2}
+            )
+            # filled up past the removed donor
+            assert [donor["id"] for donor in r.json()["items"]] == expected[:2]
+            assert expected[0] == str(kept.id)
+        finally:
+            await user.remove(db, id=kept.id)
+    finally:
+        donor_index.ready = False
+
+
+@pytest.mark.asyncio
+async def test_bitmap_index_sees_other_processes(client, db, monkeypatch):
+    monkeypatch.setattr(settings, "SEARCH_CACHE_ENABLED", False)
+    params = {"blood_group": data_for_search_user["blood_group"]}
+
+    async def emails():
+        r = await client.get("/search/filter_donors", params=params)
+        return [donor["email"] for donor in r.json()]
+
+    async def other_process(write, *args, **kwargs):
+        # the index hooks of another worker, this process' index never sees them
+        with monkeypatch.context() as m:
+            m.setattr(crud_utility, "donor_index", DonorBitmapIndex())
+            return await write(db, *args, **kwargs)
+
+    expected = await emails()
+    monkeypatch.setattr(settings, "SEARCH_BITMAP_INDEX_ENABLED", True)
+    await donor_index.rebuild(db)
+    try:
+        assert await emails() == expected
+
+        donor = await other_process(
+            user.create, obj_in=UserCreateBase(**data_for_search_user)
+        )
+        assert await emails() == [data_for_search_user["email"], *expected]
+        assert str(donor.id) in await collect_pages(client, params)
+
+        await other_process(user.update, db_obj=donor, obj_in={"blood_group": "a+"})
+        assert await emails() == expected
+
+        # entries trimmed from the log before this process saw them
+        await other_process(user.update, db_obj=donor, obj_in={"blood_group": "o-"})
+        await db.execute(delete(DonorChangeModel))
+        await db.commit()
+        await other_process(user.update, db_obj=donor, obj_in={"is_available": False})
+        rebuilds = []
+        rebuild = donor_index.rebuild
+
+        async def counted_rebuild(db):
+            rebuilds.append(db)
+            await rebuild(db)
+
+        monkeypatch.setattr(donor_index, "rebuild", counted_rebuild)
+        assert await emails() == [data_for_search_user["email"], *expected]
+        assert len(rebuilds) == 1
+
+        await other_process(user.remove, id=donor.id)
+        assert await emails() == expected
+    finally:
+        donor_index.ready = False
+
+
+@pytest.mark.asyncio
+async def test_bitmap_index_sync_outlives_its_caller(db, monkeypatch):
+    await donor_index.rebuild(db)
+    sessions = []
+
+    def session_factory():
+        sessions.append(TestingSessionLocal())
+        return sessions[-1]
+
+    monkeypatch.setattr(donor_index, "session_factory", session_factory)
+    with monkeypatch.context() as m:
+        m.setattr(crud_utility, "donor_index", DonorBitmapIndex())
+        donor = await user.create(db, obj_in=UserCreateBase(**data_for_search_user))
+    try:
+        first = asyncio.create_task(donor_index.sync())
+        await asyncio.sleep(0)
+        second = asyncio.create_task(donor_index.sync())
+        await asyncio.sleep(0)
+        # e.g. the client of the first request went away
+        first.cancel()
+        await second
+        assert donor_index.ordinal_of(donor.id) is not None
+        assert len(sessions) == 1
+    finally:
+        donor_index.ready = False
+        await user.remove(db, id=donor.id)
+
+
+@pytest.mark.asyncio
+async def test_search_cache(client, db, superuser_token_headers):
+    params = {"blood_group": data_for_search_user["blood_group"]}
+    await client.get("/search/filter_donors", params=params)
+    hits = search_cache.stats()["hits"]
+    r = await client.get("/search/filter_donors", params=params)
+    assert search_cache.stats()["hits"] == hits + 1
+    assert data_for_search_user["email"] not in [d["email"] for d in r.json()]
+
+    # a write to a donor of the searched blood group invalidates the entry
+    donor = await user.create(db, obj_in=UserCreateBase(**data_for_search_user))
+    try:
+        r = await client.get("/search/filter_donors", params=params)
+        assert data_for_search_user["email"] in [d["email"] for d in r.json()]
+    finally:
+        await user.remove(db, id=donor.id)
+    r = await client.get("/search/filter_donors", params=params)
+    assert data_for_search_user["email"] not in [d["email"] for d in r.json()]
+
+    r = await client.get("/utils/search-cache-stats/", headers=superuser_token_headers)
+    assert r.status_code == 200
+    assert r.json() == search_cache.stats()
+
+
+@pytest.mark.asyncio
+async def test_search_filter_by_name(client, db, monkeypatch):
+    name = settings.FIRST_SUPERUSER
+    queries = {
+        "prefix": name[:3],
+        "case insensitive": name.upper(),
+        "typo": name[:-2] + name[-1],
+    }
+    for query in queries.values():
+        r = await client.get("/search/filter_donors", params={"full_name": query})
+        res = r.json()
+        assert r.status_code == 200
+        assert res[0]["full_name"] == name
+
+    r = await client.get("/search/filter_donors", params={"full_name": "zzzzqqqq"})
+    assert r.json() == []
+
+    monkeypatch.setattr(settings, "SEARCH_CACHE_ENABLED", False)
+
+    async def names(query):
+        r = await client.get("/search/filter_donors", params={"full_name": query})
+        return [donor["full_name"] for donor in r.json()]
+
+    donor = await user.create(db, obj_in=UserCreateBase(**data_for_search_user))
+    await user.update(db, db_obj=donor, obj_in={"full_name": "Qwerty Renamed"})
+    assert await names("qwerty") == ["Qwerty Renamed"]
+    assert await names(data_for_search_user["full_name"]) == []
+
+    other_data = {
+        **data_for_search_user,
+        "full_name": "Qwerty Renamer",
+        "email": "search_user_3@example.com",
+        "mobile": "01511111121",
+        "student_id": "20204021",
+    }
+    other = await user.create(db, obj_in=UserCreateBase(**other_data))
+    # fuzzy candidates are limited in the database
+    assert len(await names("qwerty renamd")) == 2
+    monkeypatch.setattr(settings, "NAME_SEARCH_FUZZY_CANDIDATES", 1)
+    assert len(await names("qwerty renamd")) == 1
+
+    # rowids renumbered behind the index, as a VACUUM may do
+    await db.execute(
+        text("UPDATE donormodel SET rowid = rowid + 100000 WHERE id = :id"),
+        {"id": donor.id},
+    )
+    await db.commit()
+    assert await names("qwerty") == ["Qwerty Renamer"]
+    await rebuild_name_index(db)
+    assert sorted(await names("qwerty")) == ["Qwerty Renamed", "Qwerty Renamer"]
+
+    await user.remove(db, id=donor.id)
+    await user.remove(db, id=other.id)
+    assert await names("qwerty") == []
+    # the index entries agree with the names in donormodel
+    table = DONOR_NAME_FTS_TABLE
+    await db.execute(
+        text(f"INSERT INTO {table} ({table}, rank) VALUES ('integrity-check', 1)")
+    )
+
+
+@pytest.mark.asyncio
+async def test_compatible_donors(client, db, monkeypatch):
+    for recipient, donor_groups in COMPATIBLE_DONORS.items():
+        r = await client.get(
+            "/search/compatible_donors", params={"recipient": recipient.value}
+        )
+        assert r.status_code == 200
+        res = r.json()
+        ranks = [donor_groups.index(donor["blood_group"]) for donor in res]
+        assert ranks == sorted(ranks)
+        assert all(donor["is_available"] for donor in res)
+
+        monkeypatch.setattr(settings, "SEARCH_BITMAP_INDEX_ENABLED", True)
+        await donor_index.rebuild(db)
+        try:
+            r = await client.get(
+                "/search/compatible_donors", params={"recipient": recipient.value}
+            )
+            assert r.json() == res
+        finally:
+            donor_index.ready = False
+            monkeypatch.setattr(settings, "SEARCH_BITMAP_INDEX_ENABLED", False)
+
+    r = await client.get(
+        "/search/compatible_donors",
+        params={
+            "recipient": "ab+",
+            "blood_group": settings.FIRST_SUPERUSER_BLOOD_GROUP,
+        },
+    )
+    emails = [donor["email"] for donor in r.json()]
+    assert settings.FIRST_SUPERUSER_EMAIL in emails
@@ -1,4 +1,32 @@
+import asyncio
+import datetime
+import logging
+import re
+import subprocess
+
 import pytest
+from sqlalchemy import event, func, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from blooddonor.core.config import settings
+from blooddonor.crud.crud_utility import user
+from blooddonor.db.session import engine_options, set_sqlite_pragmas
+from blooddonor.helper.donor_stats import donor_stats
+from blooddonor.helper.eligibility import eligibility_scheduler
+from blooddonor.helper.metrics import MmapValues
+from blooddonor.helper.scheduler import (
+    DONOR_AVAILABILITY_JOB,
+    acquire_lease,
+    release_lease,
+    run_donor_availability,
+    update_donor_availability,
+)
+from blooddonor.models.schedulermodel import DonorEligibilityModel, SchedulerLockModel
+from blooddonor.models.usermodel import DonorModel
+from blooddonor.schemas.user import UserCreateBase
+from blooddonor.tests.utility.data import data_for_search_user
+from blooddonor.tests.utility.db import TestingSessionLocal
+from main import scheduler
 
 
 @pytest.mark.asyncio
@@ -6,3 +34,246 @@ async def test_health_check(client):
     res = await client.get("/utils/health-check/")
     assert res.status_code == 200
     assert res.json() is True
+
+
+@pytest.mark.asyncio
+async def test_readiness(client, monkeypatch):
+    r = await client.get("/utils/liveness/")
+    assert r.json() == {"status": "alive"}
+
+    # the scheduler is started by the app lifespan, which the test client skips
+    r = await client.get("/utils/readiness/")
+    assert r.status_code == 503
+    res = r.json()
+    assert not res["ready"]
+    assert res["checks"]["database"]["ok"]
+    assert res["checks"]["image_storage"]["ok"]
+    assert res["checks"]["scheduler"]["detail"] == "The scheduler isn't running"
+    assert all(check["latency_ms"] >= 0 for check in res["checks"].values())
+
+    scheduler.start()
+    try:
+        # the result is reused for a second
+        r = await client.get("/utils/readiness/")
+        assert r.json()["checked_at"] == res["checked_at"]
+
+        monkeypatch.setattr(settings, "READINESS_CACHE_SECONDS", 0)
+        r = await client.get("/utils/readiness/")
+        assert r.status_code == 200
+        assert r.json()["ready"]
+
+        monkeypatch.setattr(settings, "READINESS_DB_TIMEOUT_SECONDS", 0)
+        r = await client.get("/utils/readiness/")
+        assert r.status_code == 503
+        assert r.json()["checks"]["database"]["detail"] == "TimeoutError"
+    finally:
+        scheduler.shutdown(wait=False)
+
+
+@pytest.mark.asyncio
+async def test_query_timing(client, superuser_token_headers, monkeypatch, caplog):
+    url = f"/users/read_user/{settings.FIRST_SUPERUSER_EMAIL}"
+    r = await client.get(url, headers=superuser_token_headers)
+    assert re.fullmatch(
+        r'db;desc="[1-9]\d* queries";dur=[\d.]+, app;dur=[\d.]+',
+        r.headers["server-timing"],
+    )
+
+    monkeypatch.setattr(settings, "SLOW_QUERY_THRESHOLD_MS", 0)
+    with caplog.at_level(logging.INFO, logger="blooddonor.helper.query_timing"):
+        await client.get(url, headers=superuser_token_headers)
+    slow = [rec for rec in caplog.records if rec.levelno == logging.WARNING]
+    assert slow[0].route == "/api/v1/users/read_user/{user_email}"
+    assert "= ?" in slow[0].sql
+    assert "\n" not in slow[0].sql
+    request_log = caplog.records[-1]
+    assert request_log.status == 200
+    assert request_log.db_queries == len(slow)
+
+
+@pytest.mark.asyncio
+async def test_metrics(client):
+    await client.get("/utils/health-check/")
+    r = await client.get("/utils/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    samples = dict(
+        line.rsplit(" ", 1) for line in r.text.splitlines() if not line.startswith("#")
+    )
+    route = 'method="GET",route="/api/v1/utils/health-check/"'
+    assert float(samples[f'http_requests_total{{{route},status="200"}}']) >= 1
+    count = samples[f"http_request_duration_seconds_count{{{route}}}"]
+    assert (
+        samples[f'http_request_duration_seconds_bucket{{{route},le="+Inf"}}'] == count
+    )
+    # the scrape itself
+    assert samples['http_requests_in_flight{method="GET"}'] == "1.0"
+    assert 'worker_pool_queue_depth{pool="password_hash"}' in samples
+    assert 'cache_hits_total{cache="search"}' in samples
+    assert "# TYPE scheduler_job_duration_seconds histogram" in r.text
+
+
+def test_metrics_multiprocess(tmp_path, monkeypatch):
+    values = MmapValues(str(tmp_path))
+    # the file of a worker process which has exited since
+    process = subprocess.Popen(["true"])
+    process.wait()
+    monkeypatch.setattr("os.getpid", lambda: process.pid)
+    exited = MmapValues(str(tmp_path))
+    monkeypatch.undo()
+
+    counter = '["cache_hits_total", [["cache", "search"]]]'
+    gauge = '["http_requests_in_flight", [["method", "GET"]]]'
+    values.value(counter).inc(2)
+    exited.value(counter).inc(3)
+    values.value(gauge).set(1)
+    exited.value(gauge).set(5)
+    # the file grows past its initial size
+    for i in range(2000):
+        values.value(f'["cache_misses_total", [["cache", "{i}"]]]').inc(i)
+
+    totals = values.collect()
+    assert totals[counter] == 5
+    assert totals[gauge] == 1
+    assert totals['["cache_misses_total", [["cache", "1999"]]]'] == 1999
+    # a process reusing the pid carries on with the values
+    assert MmapValues(str(tmp_path)).value(counter).get() == 2
+
+
+@pytest.mark.asyncio
+async def test_sqlite_pragmas(tmp_path):
+    assert "pool_size" not in engine_options("sqlite+aiosqlite:///:memory:")
+    url = f"sqlite+aiosqlite:///{tmp_path}/blood_donor_db.db"
+    options = engine_options(url)
+    assert options["pool_size"] == settings.DB_POOL_SIZE
+
+    engine = create_async_engine(url, **options)
+    event.listen(engine.sync_engine, "connect", set_sqlite_pragmas)
+    try:
+        async with engine.connect() as conn:
+            pragma = (await conn.execute(text("PRAGMA journal_mode"))).scalar()
+            assert pragma == settings.SQLITE_JOURNAL_MODE
+            # 1 is NORMAL
+            assert (await conn.execute(text("PRAGMA synchronous"))).scalar() == 1
+            # 2 is MEMORY
+            assert (await conn.execute(text("PRAGMA temp_store"))).scalar() == 2
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_run_donor_availability(client, superuser_token_headers):
+    r = await client.post(
+        "/utils/run-donor-availability/", headers=superuser_token_headers
+    )
+    assert r.status_code == 200
+    assert r.json()["status"] == "success"
+    assert r.json()["trigger"] == "manual"
+
+    r = await client.get("/utils/scheduler-stats/", headers=superuser_token_headers)
+    res = r.json()
+    assert res["runs"] >= 1
+    assert res["history"][0]["trigger"] == "manual"
+
+
+@pytest.mark.asyncio
+async def test_scheduled_run_lease(db):
+    run = await run_donor_availability(db)
+    assert run.status == "success"
+    # the lease outlives the run, the same period isn't run again elsewhere
+    lock = await db.get(SchedulerLockModel, DONOR_AVAILABILITY_JOB)
+    lock.owner = "another-process"
+    await db.commit()
+    run = await run_donor_availability(db)
+    assert run.status == "skipped"
+
+    await db.delete(lock)
+    await db.commit()
+    assert await acquire_lease(
+        db, DONOR_AVAILABILITY_JOB, run.started_at - run.started_at
+    )
+    await release_lease(db, DONOR_AVAILABILITY_JOB)
+
+
+@pytest.mark.asyncio
+async def test_update_donor_availability_batches(db):
+    donated_on = datetime.datetime.now(datetime.UTC) - datetime.timedelta(days=100)
+    donors = [
+        await user.create(
+            db,
+            obj_in=UserCreateBase(
+                **{
+                    **data_for_search_user,
+                    "mobile": f"0199999900{i}",
+                    "email": f"availability{i}@example.com",
+                    "student_id": f"2020409{i}",
+                }
+            ),
+        )
+        for i in range(3)
+    ]
+    try:
+        for i, donor in enumerate(donors):
+            await user.update(
+                db,
+                db_obj=donor,
+                obj_in={
+                    "is_available": False,
+                    "donated_on": donated_on - datetime.timedelta(days=i),
+                },
+            )
+        # a recent donor stays unavailable
+        await user.update(
+            db,
+            db_obj=donors[0],
+            obj_in={"donated_on": datetime.datetime.now(datetime.UTC)},
+        )
+
+        assert await update_donor_availability(db, batch_size=1) == [1, 1]
+        for donor in donors:
+            await db.refresh(donor)
+        assert [donor.is_available for donor in donors] == [False, True, True]
+        assert await update_donor_availability(db) == []
+
+        # counters drifted by writes this process never saw, nothing to update
+        donor_stats.available += 5
+        donor_stats.total -= 1
+        assert await update_donor_availability(db) == []
+        available = select(func.count()).where(DonorModel.is_available == True)  # noqa
+        assert donor_stats.available == await db.scalar(available)
+        assert donor_stats.total == await db.scalar(select(func.count(DonorModel.id)))
+    finally:
+        for donor in donors:
+            await user.remove(db, id=donor.id)
+
+
+@pytest.mark.asyncio
+async def test_eligibility_scheduler_wakes_when_due(db):
+    donor = await user.create(db, obj_in=UserCreateBase(**data_for_search_user))
+    due = datetime.datetime.now(datetime.UTC) + datetime.timedelta(seconds=1)
+    await eligibility_scheduler.schedule(db, donor.id, due)
+    # committed together with the donor
+    await user.update(db, db_obj=donor, obj_in={"is_available": False})
+    eligibility_scheduler.start(TestingSessionLocal)
+    try:
+        assert eligibility_scheduler.next_due() == due
+
+        checked_before_due = False
+        for _ in range(50):
+            await db.refresh(donor)
+            # the refresh read the donor no later than this
+            seen_at = datetime.datetime.now(datetime.UTC)
+            if seen_at < due:
+                assert not donor.is_available
+                checked_before_due = True
+            elif donor.is_available:
+                break
+            await asyncio.sleep(0.1)
+        assert checked_before_due
+        assert donor.is_available
+        db.expunge_all()
+        assert await db.get(DonorEligibilityModel, donor.id) is None
+        assert eligibility_scheduler.stats()["enabled"] >= 1
+    finally:
+        await eligibility_scheduler.stop()
+        await user.remove(db, id=donor.id)
@@ -8,6 +8,7 @@ from blooddonor.api.deps import get_db
 from blooddonor.core.config import settings
 from blooddonor.db.base import Base
 from blooddonor.db.init_db import init_db
+from blooddonor.helper.bitmap_index import donor_index
 from blooddonor.tests.utility.data import data_for_random_user
 from blooddonor.tests.utility.db import TestingSessionLocal, test_engine
 from blooddonor.tests.utility.utils import get_superuser_token_header
@@ -34,6 +35,8 @@ async def client(db):  # noqa
             yield session
 
     app.dependency_overrides[get_db] = override_get_db
+    # the bitmap index catches up in sessions of its own
+    donor_index.session_factory = TestingSessionLocal
 
     async with AsyncClient(
         transport=ASGITransport(app=app), base_url=TEST_URL
@@ -41,6 +44,7 @@ async def client(db):  # noqa
         yield test_client
 
     app.dependency_overrides.clear()
+    del donor_index.session_factory
 
 
 @pytest_asyncio.fixture
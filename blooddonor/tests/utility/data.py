@@ -63,3 +63,17 @@ data_for_random_user = {
     "academic_year": "2019-2020",
     "password": "admin",
 }
+
+
+data_for_search_user = {
+    "full_name": "Search User",
+    "email": "search_user@example.com",
+    "mobile": "01511111115",
+    "department": "204",
+    "student_id": "20204010",
+    "gender": "female",
+    "district": "chattogram",
+    "blood_group": "o-",
+    "academic_year": "2019-2020",
+    "password": "admin",
+}
@@ -9,6 +9,8 @@ from sqlalchemy.ext.asyncio import (
     create_async_engine,
 )
 
+from blooddonor.helper.query_timing import instrument_engine
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -23,6 +25,7 @@ test_engine = create_async_engine(
     },
     poolclass=StaticPool,
 )
+instrument_engine(test_engine)
 TestingSessionLocal = async_sessionmaker(
     test_engine, expire_on_commit=False, class_=Session
 )
@@ -0,0 +1,82 @@
+import uuid
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+
+class LocalS3Server:
+    """
+    Minimal S3 compatible object store standing in for a MinIO or S3 bucket in
+    tests, served in process through `transport`. Keeps the stored objects by key
+    in `objects` and counts the requests. Unsigned requests are refused, the
+    signatures themselves aren't checked.
+    """
+
+    def __init__(self, bucket: str) -> None:
+        self.bucket = bucket
+        self.objects: dict[str, tuple[bytes, str | None]] = {}
+        self.requests = 0
+        self._uploads: dict[str, dict[int, bytes]] = {}
+        self.app = Starlette(
+            routes=[
+                Route(
+                    "/{bucket}/{key:path}",
+                    self._handle,
+                    methods=["GET", "HEAD", "PUT", "POST", "DELETE"],
+                )
+            ]
+        )
+
+    @property
+    def transport(self) -> httpx.ASGITransport:
+        return httpx.ASGITransport(app=self.app)
+
+    async def _handle(self, request: Request) -> Response:
+        self.requests += 1
+        params = request.query_params
+        signed = "authorization" in request.headers or "X-Amz-Signature" in params
+        if not signed:
+            return Response("<Error><Code>AccessDenied</Code></Error>", 403)
+        if request.path_params["bucket"] != self.bucket:
+            return Response("<Error><Code>NoSuchBucket</Code></Error>", 404)
+        key = request.path_params["key"]
+
+        if request.method == "POST" and "uploads" in params:
+            upload_id = uuid.uuid4().hex
+            self._uploads[upload_id] = {}
+            return Response(
+                "<InitiateMultipartUploadResult><UploadId>"
+                f"{upload_id}</UploadId></InitiateMultipartUploadResult>"
+            )
+        if request.method == "PUT" and "uploadId" in params:
+            parts = self._uploads[params["uploadId"]]
+            parts[int(params["partNumber"])] = await request.body()
+            return Response(headers={"ETag": f'"{params["partNumber"]}"'})
+        if request.method == "POST" and "uploadId" in params:
+            parts = self._uploads.pop(params["uploadId"])
+            content = b"".join(parts[number] for number in sorted(parts))
+            self.objects[key] = (content, None)
+            return Response("<CompleteMultipartUploadResult/>")
+        if request.method == "DELETE" and "uploadId" in params:
+            self._uploads.pop(params["uploadId"], None)
+            return Response(status_code=204)
+
+        if request.method == "PUT":
+            body = await request.body()
+            self.objects[key] = (body, request.headers.get("content-type"))
+            return Response()
+        if request.method == "DELETE":
+            self.objects.pop(key, None)
+            return Response(status_code=204)
+        if key not in self.objects:
+            return Response("<Error><Code>NoSuchKey</Code></Error>", 404)
+        content, content_type = self.objects[key]
+        if request.method == "HEAD":
+            return Response(
+                headers={"Content-Length": str(len(content))},
+                media_type=content_type,
+            )
+        return Response(content, media_type=content_type)
@@ -0,0 +1,68 @@
+import asyncio
+from email import message_from_bytes
+from email.message import Message
+
+
+class LocalSMTPServer:
+    """
+    Minimal SMTP server on localhost standing in for the mail relay in tests.
+    Keeps the received messages in `messages` and counts the client connections.
+    Recipients listed in `refuse` are rejected.
+    """
+
+    def __init__(self, refuse: set[str] | None = None) -> None:
+        self.messages: list[Message] = []
+        self.connections = 0
+        self.refuse = refuse or set()
+        self.host = "127.0.0.1"
+        self.port = 0
+        self._server: asyncio.Server | None = None
+
+    async def __aenter__(self) -> "LocalSMTPServer":
+        self._server = await asyncio.start_server(self._handle, self.host, 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.connections += 1
+
+        async def reply(line: str) -> None:
+            writer.write(f"{line}\r\n".encode())
+            await writer.drain()
+
+        await reply("220 localhost ESMTP")
+        rcpt_ok = False
+        while line := await reader.readline():
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb in ("HELO", "EHLO"):
+                await reply("250 localhost")
+            elif verb == "MAIL":
+                rcpt_ok = False
+                await reply("250 OK")
+            elif verb == "RCPT":
+                address = command.split(":", 1)[1].strip("<> ")
+                if address in self.refuse:
+                    await reply("550 No such user")
+                else:
+                    rcpt_ok = True
+                    await reply("250 OK")
+            elif verb == "DATA" and rcpt_ok:
+                await reply("354 End data with <CR><LF>.<CR><LF>")
+                data = await reader.readuntil(b"\r\n.\r\n")
+                self.messages.append(message_from_bytes(data[:-5]))
+                await reply("250 OK")
+            elif verb in ("NOOP", "RSET"):
+                await reply("250 OK")
+            elif verb == "QUIT":
+                await reply("221 Bye")
+                break
+            else:
+                await reply("503 Bad sequence of commands")
+        writer.close()
@@ -0,0 +1,30 @@
+import argparse
+import asyncio
+import logging
+
+from blooddonor.db.session import SessionLocal
+from blooddonor.helper.bulk_import import import_donors, import_format, read_rows
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def main(path: str, chunk_size: int | None) -> None:
+    logger.info(f"Importing donors from {path}")
+    with open(path, "rb") as file:
+        rows = read_rows(file, import_format(path))
+        async with SessionLocal() as session:
+            report = await import_donors(session, rows, chunk_size=chunk_size)
+    for error in report.errors:
+        logger.warning(f"Row {error.row}: {'; '.join(error.errors)}")
+    logger.info(f"Imported {report.imported} donors, {report.failed} rows failed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Bulk import donors from a .csv, .xlsx or .ndjson file"
+    )
+    parser.add_argument("path")
+    parser.add_argument("--chunk-size", type=int, default=None)
+    args = parser.parse_args()
+    asyncio.run(main(args.path, args.chunk_size))
@@ -1,23 +1,23 @@
-import asyncio
-import logging
-
-from blooddonor.db.init_db import init_db
-from blooddonor.db.session import SessionLocal
-
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-
-async def init() -> None:
-    async with SessionLocal() as session:
-        await init_db(session)
-
-
-async def main() -> None:
-    logger.info("Creating initial data")
-    await init()
-    logger.info("Initial data created")
-
-
-if __name__ == "__main__":
-    asyncio.run(main())
+import asyncio
+import logging
+
+from blooddonor.db.init_db import init_db
+from blooddonor.db.session import SessionLocal
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def init() -> None:
+    async with SessionLocal() as session:
+        await init_db(session)
+
+
+async def main() -> None:
+    logger.info("Creating initial data")
+    await init()
+    logger.info("Initial data created")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,83 +1,117 @@
-import asyncio
-from contextlib import asynccontextmanager
-
-from apscheduler.schedulers.background import BackgroundScheduler
-from fastapi import FastAPI, Request, status
-from fastapi.exceptions import RequestValidationError
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
-
-from blooddonor.api.api_v1.api import api_router
-from blooddonor.core.config import settings
-from blooddonor.db.session import SessionLocal
-from blooddonor.helper.scheduler import update_donor_availability
-
-DOCS_URL = settings.DOCS_URL if settings.DOCS_URL == "/docs" else None
-REDOC_URL = settings.REDOC_URL if settings.REDOC_URL == "/redoc" else None
-
-scheduler = BackgroundScheduler()
-
-
-def scheduled_tasks():
-    db = SessionLocal()
-    asyncio.run(update_donor_availability(db))
-
-
-scheduler.add_job(
-    scheduled_tasks, trigger="interval", hours=settings.SCHEDULER_RERUN_TIME_IN_HOURS
-)
-
-
-@asynccontextmanager
-async def lifespan(app: FastAPI):  # noqa
-    scheduler.start()
-    yield
-    scheduler.shutdown()
-
-
-app = FastAPI(
-    title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json",
-    swagger_ui_parameters={"persistAuthorization": True},
-    docs_url=DOCS_URL,
-    redoc_url=REDOC_URL,
-    lifespan=lifespan,
-)
-
-
-@app.exception_handler(RequestValidationError)
-async def validation_exception_handler_fastapi(
-    request: Request,  # noqa
-    exc: RequestValidationError,
-):
-    errors = exc.errors()
-    formatted_errors = []
-    for error in errors:
-        formatted_errors.append(
-            {
-                "field": error["loc"][-1],
-                "message": error.get("msg"),
-            }
-        )
-
-    return JSONResponse(
-        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-        content={"detail": formatted_errors},
-    )
-
-
-app.mount("/static", StaticFiles(directory="./blooddonor/static"), name="static")
-
-
-# Set all CORS enabled origins
-if settings.all_cors_origins:
-    app.add_middleware(
-        CORSMiddleware,  # noqa
-        allow_origins=settings.all_cors_origins,
-        allow_credentials=True,
-        allow_methods=["*"],
-        allow_headers=["*"],
-    )
-
-app.include_router(api_router, prefix=settings.API_V1_STR)
+from contextlib import asynccontextmanager
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from fastapi import FastAPI, Request, status
+from fastapi.exceptions import RequestValidationError
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from fastapi.staticfiles import StaticFiles
+
+from blooddonor.api.api_v1.api import api_router
+from blooddonor.core.config import settings
+from blooddonor.db.session import SessionLocal
+from blooddonor.helper.bitmap_index import donor_index
+from blooddonor.helper.eligibility import eligibility_scheduler
+from blooddonor.helper.email_templates import email_templates
+from blooddonor.helper.image import image_process_pool, image_storage
+from blooddonor.helper.metrics import MetricsMiddleware, registry
+from blooddonor.helper.name_search import rebuild_name_index
+from blooddonor.helper.outbox import outbox_worker
+from blooddonor.helper.query_timing import QueryTimingMiddleware
+from blooddonor.helper.scheduler import DONOR_AVAILABILITY_JOB, run_donor_availability
+
+DOCS_URL = settings.DOCS_URL if settings.DOCS_URL == "/docs" else None
+REDOC_URL = settings.REDOC_URL if settings.REDOC_URL == "/redoc" else None
+
+# runs the jobs on the app's own event loop
+scheduler = AsyncIOScheduler()
+
+
+async def scheduled_tasks():
+    async with SessionLocal() as db:
+        await run_donor_availability(db)
+
+
+scheduler.add_job(
+    scheduled_tasks,
+    id=DONOR_AVAILABILITY_JOB,
+    trigger="interval",
+    hours=settings.SCHEDULER_RERUN_TIME_IN_HOURS,
+    jitter=settings.SCHEDULER_JITTER_SECONDS,
+    max_instances=1,
+    coalesce=True,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):  # noqa
+    async with SessionLocal() as db:
+        await rebuild_name_index(db)
+    if settings.SEARCH_BITMAP_INDEX_ENABLED:
+        async with SessionLocal() as db:
+            await donor_index.rebuild(db)
+    scheduler.start()
+    eligibility_scheduler.start(SessionLocal)
+    registry.start()
+    if settings.EMAILS_ENABLED:
+        email_templates.load()
+        outbox_worker.start(SessionLocal)
+    yield
+    await outbox_worker.stop()
+    await eligibility_scheduler.stop()
+    await registry.stop()
+    image_process_pool.shutdown()
+    await image_storage.close()
+    scheduler.shutdown()
+
+
+app = FastAPI(
+    title=settings.PROJECT_NAME,
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    swagger_ui_parameters={"persistAuthorization": True},
+    docs_url=DOCS_URL,
+    redoc_url=REDOC_URL,
+    lifespan=lifespan,
+)
+# checked by the readiness probe
+app.state.scheduler = scheduler
+
+
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler_fastapi(
+    request: Request,  # noqa
+    exc: RequestValidationError,
+):
+    errors = exc.errors()
+    formatted_errors = []
+    for error in errors:
+        formatted_errors.append(
+            {
+                "field": error["loc"][-1],
+                "message": error.get("msg"),
+            }
+        )
+
+    return JSONResponse(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        content={"detail": formatted_errors},
+    )
+
+
+app.mount("/static", StaticFiles(directory="./blooddonor/static"), name="static")
+
+
+# Set all CORS enabled origins
+if settings.all_cors_origins:
+    app.add_middleware(
+        CORSMiddleware,  # noqa
+        allow_origins=settings.all_cors_origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+app.add_middleware(QueryTimingMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+app.include_router(api_router, prefix=settings.API_V1_STR)
@@ -0,0 +1,33 @@
+import argparse
+import logging
+from pathlib import Path
+
+import uvicorn
+
+from blooddonor.core.config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def clear_metrics_dir(directory: str) -> None:
+    # files of an earlier run would be added to the values of the new workers
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    for file in path.glob("*.db"):
+        file.unlink()
+    logger.info(f"Emptied the metrics directory {directory}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run the app in several worker processes sharing their metrics"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+    # once, before the workers start writing their files
+    if settings.METRICS_MULTIPROC_DIR:
+        clear_metrics_dir(settings.METRICS_MULTIPROC_DIR)
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)